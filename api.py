@@ -30,6 +30,8 @@ from core.session import get_current_session, get_session_dir, load_config, OUTP
 from core.auth.api_auth_endpoints import auth_router
 from core.helpers.helper_endpoints import helper_router
 from core.logs.logs_api import logs_router
+from core.template_service import preload_templates
+from core.lookup_resolver import resolve_exceptions
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -166,6 +168,8 @@ def setup_static_files_and_routes(app: FastAPI):
 async def lifespan(app: FastAPI):
     # Code to run on startup
     logger.info("FastAPI application starting up...")
+    # Compile document, log and report templates once so API-triggered renders skip it
+    preload_templates()
     yield
     # Code to run on shutdown
     logger.info("FastAPI application shutting down...")
@@ -213,6 +217,15 @@ class ErrorResponse(BaseModel):
     error: str
     detail: Optional[str] = None
 
+class ExceptionResolution(BaseModel):
+    exception_id: int
+    accept: bool
+    lookup_value: Optional[str] = None
+
+class ExceptionResolutionRequest(BaseModel):
+    session_hash: Optional[str] = None
+    resolutions: List[ExceptionResolution]
+
 # --- API Endpoint Implementations ---
 
 @main_router.get("/status", response_model=Dict[str, Any])
@@ -411,6 +424,21 @@ async def api_report_list(api_key: str = Header(None, alias="X-API-Key")):
         logger.error(f"Error listing reports: {e}", exc_info=True)
         return CommandResponse(success=False, command="report_list", error=str(e))
 
+# --- Lookup endpoints ---
+@main_router.post("/lookups/exceptions/resolve", response_model=CommandResponse)
+async def api_resolve_exceptions(request: ExceptionResolutionRequest, api_key: str = Header(None, alias="X-API-Key")):
+    """Resolve many lookup exceptions in one transaction; the result has an outcome per entry."""
+    if not _check_api_auth(api_key):
+        raise HTTPException(status_code=401, detail="Invalid or missing API key")
+    try:
+        result = resolve_exceptions(request.session_hash, [entry.model_dump() for entry in request.resolutions])
+        if result["status"] != "success":
+            return CommandResponse(success=False, command="resolve_exceptions", result=result, error=result.get("message"))
+        return CommandResponse(success=True, command="resolve_exceptions", result=result)
+    except Exception as e:
+        logger.error(f"Error resolving lookup exceptions: {e}", exc_info=True)
+        return CommandResponse(success=False, command="resolve_exceptions", error=str(e))
+
 # Helper function to find report path (used by report file endpoints)
 def _find_report_dir(report_id: str) -> Optional[Path]:
     """Finds the directory for a given report ID."""
@@ -337,16 +337,22 @@ def generate_mapping():
 
 
 @app.command("html")
-def generate_html():
+def generate_html(
+    rows: Optional[str] = typer.Option(None, "--rows", "-r", help="Only regenerate these rows, e.g. '1-100,205'"),
+    where: Optional[str] = typer.Option(None, "--where", "-w", help="Only regenerate rows matching an SQL filter on mapped fields"),
+    profile: bool = typer.Option(False, "--profile", help="Dump cProfile stats for the run to the session logs folder")
+):
     """
     Generate HTML files from the mapped data.
     """
     try:
         console.print("[bold blue]Generating HTML files...[/bold blue]")
-        result = run_command("html")
+        result = run_command("html", rows=rows, where=where, profile=profile)
         
         if result:
             console.print(f"[bold green]{CHECK_MARK} HTML files generated![/bold green]")
+            if result.get("targeted_rows") is not None:
+                console.print(f"Targeted {result['targeted_rows']} rows")
             console.print(f"Generated {result['num_files']} HTML files")
             console.print(f"Output directory: {result['output_dir']}")
             
@@ -361,17 +367,34 @@ def generate_html():
 
 
 @app.command("pdf")
-def generate_pdf():
+def generate_pdf(
+    incremental: Optional[bool] = typer.Option(None, "--incremental/--full", "-i",
+                                               help="Only convert new, changed or previously failed HTML files (default: pdf.incremental in config)"),
+    resume: Optional[bool] = typer.Option(None, "--resume/--no-resume",
+                                          help="Continue an interrupted run instead of starting over (default: pdf.resume in config)"),
+    bundle: Optional[bool] = typer.Option(None, "--bundle/--no-bundle",
+                                          help="Also append the PDFs to print bundles in pdf/bundles (default: pdf.bundle.enabled in config)")
+):
     """
     Generate PDF files from HTML files.
     """
     try:
         console.print("[bold blue]Generating PDF files...[/bold blue]")
-        result = run_command("pdf")
+        result = run_command("pdf", incremental=incremental, resume=resume, bundle=bundle)
         
         if result:
             console.print(f"[bold green]{CHECK_MARK} PDF files generated![/bold green]")
             console.print(f"Generated {result['num_files']} PDF files")
+            if result.get("resumed"):
+                console.print("Resumed the previous, interrupted run")
+            if result.get("incremental"):
+                console.print(f"{result.get('up_to_date', 0)} PDF files were already up to date")
+            if result.get("retried"):
+                console.print(f"{result['retried']} conversions were retried after transient failures")
+            if result.get("bundles"):
+                bundles = result["bundles"]
+                console.print(f"Bundled {bundles['num_documents']} PDFs into {len(bundles['bundles'])} files "
+                              f"(manifest: {bundles['manifest']})")
             
             if result["errors"]:
                 console.print(f"[bold yellow]⚠ {len(result['errors'])} errors occurred during generation[/bold yellow]")
@@ -383,6 +406,33 @@ def generate_pdf():
         raise typer.Exit(code=1)
 
 
+@app.command("html-pdf")
+def generate_html_pdf(
+    rows: Optional[str] = typer.Option(None, "--rows", "-r", help="Only regenerate these rows, e.g. '1-100,205'"),
+    where: Optional[str] = typer.Option(None, "--where", "-w", help="Only regenerate rows matching an SQL filter on mapped fields")
+):
+    """
+    Generate HTML and PDF files in one pass, converting documents as they are rendered.
+    """
+    try:
+        console.print("[bold blue]Generating HTML and PDF files...[/bold blue]")
+        result = run_command("html_pdf", rows=rows, where=where)
+
+        if result:
+            console.print(f"[bold green]{CHECK_MARK} HTML and PDF files generated![/bold green]")
+            console.print(f"Generated {result['html']['num_files']} HTML files and {result['pdf']['num_files']} PDF files in {result['wall_time']:.1f}s")
+
+            errors = result["html"]["errors"] + result["pdf"]["errors"]
+            if errors:
+                console.print(f"[bold yellow]⚠ {len(errors)} errors occurred during generation[/bold yellow]")
+
+            return result
+
+    except Exception as e:
+        console.print(f"[bold red]Error generating HTML and PDFs:[/bold red] {str(e)}")
+        raise typer.Exit(code=1)
+
+
 @app.command("all")
 def run_all_steps(
     file_path: str = typer.Argument(..., help="Path to the CSV or Excel file to import")
@@ -407,12 +457,12 @@ def run_all_steps(
             return
         
         # Generate HTML
-        html_result = generate_html()
+        html_result = generate_html(rows=None, where=None, profile=False)
         if not html_result:
             return
         
         # Generate PDF
-        pdf_result = generate_pdf()
+        pdf_result = generate_pdf(incremental=None, resume=None, bundle=None)
         if not pdf_result:
             return
         
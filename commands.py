@@ -15,6 +15,7 @@ from core.validator import validate_data
 from core.mapper import generate_mapping_file, delete_mapping_file, update_mapping
 from core.html_generator import generate_html_files
 from core.pdf_generator import generate_pdfs
+from core.pipeline import generate_html_and_pdfs
 from core.session import create_output_dir, get_current_session, update_session_status, get_sessions_data, perform_session_activation
 
 # Import user management functions
@@ -25,6 +26,7 @@ from core.auth.auth_db_manager import (
 
 # Import lookup resolver function
 from core.lookup_resolver import resolve_lookups as core_resolve_lookups
+from core.lookup_cache import clear_lookup_cache
 
 # Import reporting system functions
 from core.reporter import generate_all_reports, rerun_report, list_reports
@@ -94,13 +96,18 @@ COMMANDS = {
     },
     "html": {
         "func": generate_html_files,
-        "args": [],
-        "description": "Generate HTML files from mapped, validated data."
+        "args": ["rows", "where", "profile"],
+        "description": "Generate HTML files from mapped, validated data (optionally only selected rows)."
     },
     "pdf": {
         "func": generate_pdfs,
-        "args": [],
-        "description": "Generate PDFs from HTML templates."
+        "args": ["incremental", "resume", "bundle"],
+        "description": "Generate PDFs from HTML templates (optionally only for changed HTML files)."
+    },
+    "html_pdf": {
+        "func": generate_html_and_pdfs,
+        "args": ["rows", "where"],
+        "description": "Generate HTML and convert each document to PDF as soon as it is rendered."
     },
     "table_data": {
         "func": get_table_data_command,
@@ -143,9 +150,14 @@ COMMANDS = {
     },
     "resolve_lookups": {
         "func": core_resolve_lookups,
-        "args": ["session"],
+        "args": ["session", "bulk", "concurrent", "audit"],
         "description": "Resolve lookups for generated documents"
     },
+    "lookup_cache_clear": {
+        "func": clear_lookup_cache,
+        "args": ["connection", "table"],
+        "description": "Drop cached lookups after a tenant table was reloaded"
+    },
     # ADD REPORTING COMMANDS
     "report_generate": {
         "func": generate_all_reports,
@@ -196,7 +208,7 @@ def run_command(command_name: str, **kwargs) -> Any:
     func = command["func"]
 
     # Special case for user management commands - they don't need a session
-    if not command_name.startswith("user_") and command_name != "resolve_lookups":
+    if not command_name.startswith("user_") and command_name not in ("resolve_lookups", "lookup_cache_clear"):
         # Ensure output directory exists for all commands except import
         if command_name != "import":
             session_hash = get_current_session()
@@ -265,7 +277,13 @@ def list_commands() -> Dict[str, Dict]:
 
 @click.command()
 @click.option('--session', help='Session hash to use. If not provided, uses the current session.')
-def resolve_lookups(session):
+@click.option('--bulk/--per-record', default=None,
+              help='Resolve each mapping for all records with one query (default: lookups.bulk in config).')
+@click.option('--concurrent/--sequential', default=None,
+              help='Run the lookups of all mappings concurrently (default: lookups.concurrent in config).')
+@click.option('--audit', type=click.Choice(['full', 'compact']), default=None,
+              help='Log every attempt (full) or one coded row per record (compact) (default: lookups.audit in config).')
+def resolve_lookups(session, bulk, concurrent, audit):
     """
     Phase 2: Resolve lookups for generated documents.
 
@@ -275,13 +293,27 @@ def resolve_lookups(session):
     click.echo("Starting lookup resolution (Phase 2)...")
 
     try:
-        result = core_resolve_lookups(session)
+        result = core_resolve_lookups(session, bulk=bulk, concurrent=concurrent, audit=audit)
 
         if result["status"] == "success":
             click.echo(f"Lookup resolution completed successfully:")
             click.echo(f"  - Records processed: {result['records_processed']}")
             click.echo(f"  - Successful lookups: {result['successful_lookups']}")
             click.echo(f"  - Exceptions: {result['exceptions']}")
+            for invalid in result.get("invalid_mappings", []):
+                click.echo(f"  ! Skipped invalid mapping '{invalid['mapping']}': {invalid['error']}")
+            for index in result.get("lookup_indexes", []):
+                status = "index hit" if index["index_hit"] else "NO INDEX"
+                click.echo(f"  - {index['table']}.{index['column']}: {status} ({'; '.join(index['query_plan'])})")
+                if index["recommendation"]:
+                    click.echo(f"    Recommended: {index['recommendation']}")
+            for name, stats in result.get("backends", {}).items():
+                click.echo(f"  - {name}: {stats['values']} values in {stats['queries']} queries "
+                           f"over {stats['connections']} connections, {stats['cached']} from cache")
+            if result.get("cache"):
+                cache = result["cache"]
+                click.echo(f"  - Lookup cache: {cache['hits']} hits, {cache['misses']} misses "
+                           f"({cache['hit_rate']:.0%}), {cache['evicted']} evicted")
 
             if result["exceptions"] > 0:
                 click.echo("\nSome lookups resulted in exceptions.")
@@ -295,6 +327,17 @@ def resolve_lookups(session):
 
     return 0
 
+@click.command("lookup_cache_clear")
+@click.option('--connection', help='Only drop lookups of this tenant connection.')
+@click.option('--table', help='Only drop lookups of this destination table.')
+def lookup_cache_clear_command(connection, table):
+    """Drop cached lookups after a tenant table was reloaded."""
+    try:
+        result = run_command("lookup_cache_clear", connection=connection, table=table)
+        click.echo(f"✅ Dropped {result['deleted']} cached lookups from {result['path']}")
+    except Exception as e:
+        click.echo(f"❌ Error clearing the lookup cache: {e}")
+
 @click.command("report_generate")
 def report_generate_command():
     """Generate all reports for the current session."""
@@ -359,6 +402,7 @@ def activate_session_command(session_hash: str):
 
 cli = click.Group()
 cli.add_command(resolve_lookups)
+cli.add_command(lookup_cache_clear_command)
 cli.add_command(report_generate_command)
 cli.add_command(report_rerun_command)
 cli.add_command(report_list_command)
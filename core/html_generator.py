@@ -6,9 +6,11 @@ import base64
 from pathlib import Path
 import os
 import json
+import time
+import cProfile
 import logging
 import sqlite3
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Iterator
 from datetime import datetime
 import re
 
@@ -18,13 +20,16 @@ from core.session import get_current_session, get_session_dir, update_session_st
 from core.importer import get_table_data
 from core.mapper import load_mapping
 from core.logger import HTMLLogger
+from core.template_service import TEMPLATE_DIRS, get_template_env, render_to_file
+from core.metrics import StageProfiler, write_metrics_file, dump_cprofile
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Set up Jinja2 environment for document templates
-template_loader = jinja2.FileSystemLoader(searchpath="templates/html")
-jinja_env = jinja2.Environment(loader=template_loader)
+PROJECT_ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# Maps generated HTML filenames to their source rows (kept in the html output directory)
+HTML_MANIFEST_FILE = "manifest.json"
 
 
 def get_image_as_base64(image_path: str) -> str:
@@ -57,11 +62,25 @@ def get_image_as_base64(image_path: str) -> str:
         logger.warning(f"Error encoding image {image_path} to base64: {e}")
         return ""
 
-def generate_html_files() -> Dict[str, Any]:
+def generate_html_files(rows: Optional[Any] = None, where: Optional[str] = None,
+                        profile: bool = False) -> Dict[str, Any]:
     """
     Generate HTML files from the current session data and mapping.
     Handles duplicate filenames by appending sequence numbers.
 
+    Without arguments every row is (re)generated. With ``rows`` and/or ``where``
+    only the selected rows are regenerated: their previous files and
+    ``generated_<hash>`` HTML entries are replaced and everything else is left alone.
+
+    Per-phase timings (record building, filename, render, disk write, DB) and
+    counters are collected for every run, added to the generation log and
+    written to ``logs/html_metrics_<execution_id>.json``.
+
+    Args:
+        rows: Row numbers to generate, e.g. "1-100,205" or a list of numbers/ranges
+        where: SQL filter on mapped fields, e.g. "PAYMENT_REFERENCE = '2000075137631'"
+        profile: Also run the row loop under cProfile and dump the stats to ``logs/``
+
     Returns:
         Dict containing generation results
 
@@ -69,6 +88,74 @@ def generate_html_files() -> Dict[str, Any]:
         ValueError: If session, document type, or mapping not found
         TemplateError: If template loading or rendering fails
     """
+    run = prepare_html_run(rows=rows, where=where)
+
+    cprofile = cProfile.Profile() if profile else None
+    if cprofile is not None:
+        cprofile.enable()
+
+    for _ in render_html_rows(run):
+        pass
+
+    if cprofile is not None:
+        cprofile.disable()
+
+    return finish_html_run(run, cprofile)
+
+
+class HtmlRun:
+    """
+    Everything an HTML generation run needs once setup is done.
+
+    Created by prepare_html_run(), consumed by render_html_rows() and
+    closed by finish_html_run().
+    """
+
+    def __init__(self, session_hash: str, document_type: str, input_file: str,
+                 template: jinja2.Template, data: List[Dict[str, Any]], output_dir: str,
+                 db_conn: sqlite3.Connection, generated_table_name: str,
+                 reverse_mapping: Dict[str, str], target_rows: Optional[set],
+                 manifest: Dict[str, Dict[str, Any]], filename_template: "FilenameTemplate",
+                 filename_allocator: "UniqueFilenameAllocator", profiler: StageProfiler,
+                 replaced_files: Optional[List[str]] = None):
+        self.session_hash = session_hash
+        self.document_type = document_type
+        self.input_file = input_file
+        self.template = template
+        self.data = data
+        self.output_dir = output_dir
+        self.db_conn = db_conn
+        self.generated_table_name = generated_table_name
+        self.reverse_mapping = reverse_mapping
+        self.target_rows = target_rows
+        self.manifest = manifest
+        self.filename_template = filename_template
+        self.filename_allocator = filename_allocator
+        self.profiler = profiler
+        self.replaced_files = replaced_files or []  # Files removed for a targeted run
+        self.html_files: List[str] = []
+        self.errors: List[Dict[str, Any]] = []
+
+
+def prepare_html_run(rows: Optional[Any] = None, where: Optional[str] = None,
+                     check_same_thread: bool = True) -> HtmlRun:
+    """
+    Load session, mapping, schema, template and data and clean up previous output.
+
+    Args:
+        rows: Row selection (see generate_html_files)
+        where: SQL filter on mapped fields (see generate_html_files)
+        check_same_thread: Passed to sqlite3.connect; set to False when rows
+            are rendered from a different thread than the one preparing the run
+
+    Returns:
+        HtmlRun ready for render_html_rows()
+
+    Raises:
+        ValueError: If session, document type, or mapping not found
+    """
+    profiler = StageProfiler("html")
+
     # Get current session
     session_hash = get_current_session()
     if not session_hash:
@@ -82,8 +169,7 @@ def generate_html_files() -> Dict[str, Any]:
     schema_for_doc = None # Store the matched schema
     try:
         # Find status.json relative to the project structure
-        project_root_dir = Path(__file__).resolve().parent.parent
-        status_file_path = project_root_dir / "status.json"
+        status_file_path = PROJECT_ROOT_DIR / "status.json"
 
         if not status_file_path.exists():
             raise FileNotFoundError(f"status.json not found at {status_file_path}")
@@ -128,8 +214,7 @@ def generate_html_files() -> Dict[str, Any]:
     schemas_dir = "schemas"
     template_name = None
     try:
-        project_root_dir = Path(__file__).resolve().parent.parent
-        schema_dir_path = project_root_dir / schemas_dir
+        schema_dir_path = PROJECT_ROOT_DIR / schemas_dir
         if not schema_dir_path.is_dir():
             raise FileNotFoundError(f"Schemas directory not found at {schema_dir_path}")
 
@@ -162,16 +247,13 @@ def generate_html_files() -> Dict[str, Any]:
 
     logger.info(f"Using template: {template_name}")
 
-    # Load template with error handling
+    # Load template with error handling (shared environment, compiled once per process)
     try:
-        # Assume templates/html is relative to project root
-        project_root_dir = Path(__file__).resolve().parent.parent
-        template_dir_path = project_root_dir / "templates" / "html"
+        template_dir_path = TEMPLATE_DIRS["html"]
         if not template_dir_path.is_dir():
              raise FileNotFoundError(f"Template directory not found: {template_dir_path}")
-        template_loader = jinja2.FileSystemLoader(searchpath=str(template_dir_path))
-        jinja_env = jinja2.Environment(loader=template_loader, autoescape=jinja2.select_autoescape(['html', 'xml']))
-        template = jinja_env.get_template(template_name)
+        with profiler.phase("template_load"):  # Includes image inlining on first load
+            template = get_template_env("html").get_template(template_name)
     except jinja2.exceptions.TemplateNotFound:
         raise ValueError(f"Template not found: {template_dir_path / template_name}")
     except jinja2.exceptions.TemplateError as e:
@@ -180,36 +262,10 @@ def generate_html_files() -> Dict[str, Any]:
          raise ValueError(f"Template directory error: {e}")
 
 
-    # Load images from template directory and convert to base64
-    template_dir_path_str = str(template_dir_path) # For os.path functions
-    images = {}
-    if os.path.isdir(template_dir_path_str):
-        for img_ext in [".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp"]:
-            for img_file in os.listdir(template_dir_path_str):
-                if img_file.lower().endswith(img_ext):
-                    img_path = os.path.join(template_dir_path_str, img_file)
-                    try:
-                        with open(img_path, "rb") as image_file:
-                            encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
-
-                        ext = os.path.splitext(img_file)[1].lower()
-                        mime_type_map = {
-                            '.png': 'image/png', '.jpg': 'image/jpeg', '.jpeg': 'image/jpeg',
-                            '.gif': 'image/gif', '.svg': 'image/svg+xml', '.webp': 'image/webp'
-                        }
-                        mime_type = mime_type_map.get(ext, 'application/octet-stream')
-
-                        images[img_file] = f"data:{mime_type};base64,{encoded_string}"
-                        logger.debug(f"Loaded image {img_file} as base64")
-                    except Exception as e:
-                        logger.warning(f"Error encoding image {img_path} to base64: {e}")
-    else:
-         logger.warning(f"Template image directory not found: {template_dir_path_str}")
-
-
     # Get data from database
     try:
-        table_hash, columns, data = get_table_data(session_hash)
+        with profiler.phase("data_load"):
+            table_hash, columns, data = get_table_data(session_hash)
     except Exception as e:
         logger.error(f"Failed to get data from database for session {session_hash}: {e}", exc_info=True)
         raise RuntimeError(f"Failed to get data from database: {e}")
@@ -224,28 +280,12 @@ def generate_html_files() -> Dict[str, Any]:
         raise RuntimeError(f"Failed to create HTML output directory: {e}")
 
 
-    # Delete all existing HTML files in the output directory
-    logger.info(f"Cleaning up existing HTML files in {output_dir}")
-    deleted_count = 0
-    try:
-        for file in os.listdir(output_dir):
-            if file.lower().endswith(".html"):
-                try:
-                    os.remove(os.path.join(output_dir, file))
-                    deleted_count += 1
-                except Exception as e:
-                    logger.warning(f"Error removing existing HTML file {file}: {e}")
-        logger.info(f"Removed {deleted_count} existing HTML files from {output_dir}")
-    except OSError as e:
-         logger.error(f"Error cleaning HTML directory {output_dir}: {e}")
-
-
     # --- Database Setup ---
     db_conn = None
     generated_table_name = f"generated_{table_hash}"
     try:
         db_path = os.path.join(session_dir, "data.db")
-        db_conn = sqlite3.connect(db_path, timeout=10)
+        db_conn = sqlite3.connect(db_path, timeout=10, check_same_thread=check_same_thread)
         cursor = db_conn.cursor()
 
         # Create generated_{table_hash} table if not exists
@@ -261,6 +301,7 @@ def generate_html_files() -> Dict[str, Any]:
             created_at DATETIME DEFAULT CURRENT_TIMESTAMP
         )
         ''')
+        create_generated_indexes(cursor, generated_table_name)
         db_conn.commit() # Commit table creation separately
     except sqlite3.Error as e:
         logger.error(f"Failed to connect or setup table {generated_table_name} in {db_path}: {e}")
@@ -279,14 +320,106 @@ def generate_html_files() -> Dict[str, Any]:
     logger.info(f"Created reverse mapping with {len(reverse_mapping)} entries.")
 
 
-    # --- Generate HTML for each row ---
-    html_files = []
-    errors = []
-    generated_filenames_in_run = set() # Track filenames used in THIS run
+    # --- Select target rows and clean up their previous output ---
+    targeted = bool(rows) or bool(where)
+    target_rows = None
+    replaced_files = []
+    manifest = load_html_manifest(output_dir) if targeted else {}
+    if targeted and not manifest:
+        # Sessions generated before the manifest existed: find the files from generated_<hash>
+        manifest = _manifest_from_generated(output_dir, db_conn, generated_table_name, input_file,
+                                            schema_for_doc, document_type)
+    if targeted:
+        try:
+            target_rows = select_target_rows(len(data), rows=rows, where=where,
+                                             db_path=db_path, table_name=table_hash,
+                                             reverse_mapping=reverse_mapping)
+        except ValueError:
+            db_conn.close()
+            raise
+        logger.info(f"Targeted HTML generation for {len(target_rows)} of {len(data)} rows")
+        with profiler.phase("cleanup"):
+            replaced_files = _remove_row_output(output_dir, manifest, target_rows, db_conn,
+                                                generated_table_name, input_file)
+    else:
+        # Delete all existing HTML files in the output directory
+        logger.info(f"Cleaning up existing HTML files in {output_dir}")
+        deleted_count = 0
+        cleanup_start = time.perf_counter()
+        try:
+            for file in os.listdir(output_dir):
+                if file.lower().endswith(".html"):
+                    try:
+                        os.remove(os.path.join(output_dir, file))
+                        deleted_count += 1
+                    except Exception as e:
+                        logger.warning(f"Error removing existing HTML file {file}: {e}")
+            logger.info(f"Removed {deleted_count} existing HTML files from {output_dir}")
+        except OSError as e:
+             logger.error(f"Error cleaning HTML directory {output_dir}: {e}")
+        profiler.add_timing("cleanup", (time.perf_counter() - cleanup_start) * 1000.0)
+
+
+    # Compile the filename pattern once and snapshot the (cleaned) output directory
+    filename_template = FilenameTemplate.from_schema(schema_for_doc, document_type)
+    filename_allocator = UniqueFilenameAllocator(output_dir)
+
+    return HtmlRun(
+        session_hash=session_hash,
+        document_type=document_type,
+        input_file=input_file,
+        template=template,
+        data=data,
+        output_dir=output_dir,
+        db_conn=db_conn,
+        generated_table_name=generated_table_name,
+        reverse_mapping=reverse_mapping,
+        target_rows=target_rows,
+        manifest=manifest,
+        filename_template=filename_template,
+        filename_allocator=filename_allocator,
+        profiler=profiler,
+        replaced_files=replaced_files,
+    )
+
+
+def render_html_rows(run: HtmlRun) -> Iterator[Dict[str, Any]]:
+    """
+    Render the run's rows one by one, recording each in ``generated_<hash>``.
+
+    Yields as soon as a document is on disk and recorded, so callers can start
+    working on it (e.g. PDF conversion) while later rows are still rendering.
+    Failed rows are added to ``run.errors`` and not yielded.
+
+    Yields:
+        Dict with "row", "html_file", "file_path" and "generated_id"
+    """
+    data = run.data
+    target_rows = run.target_rows
+    reverse_mapping = run.reverse_mapping
+    document_type = run.document_type
+    input_file = run.input_file
+    template = run.template
+    output_dir = run.output_dir
+    generated_table_name = run.generated_table_name
+    filename_template = run.filename_template
+    filename_allocator = run.filename_allocator
+    profiler = run.profiler
+    manifest = run.manifest
+    html_files = run.html_files
+    errors = run.errors
+    db_conn = run.db_conn
+    cursor = db_conn.cursor()
+
+    clock = time.perf_counter
+    render_stats: Dict[str, float] = {}
 
     for i, row in enumerate(data):
         row_num_display = i + 1 # For logging and DB
+        if target_rows is not None and row_num_display not in target_rows:
+            continue
         try:
+            phase_start = clock()
             # Create record for Jinja template (Schema Keys) and DB logging (Mapped Data)
             record_for_template = {}
             db_record_data = {}
@@ -301,67 +434,43 @@ def generate_html_files() -> Dict[str, Any]:
             if i == 0:
                  logger.debug(f"Record keys for template rendering (row 1): {list(record_for_template.keys())}")
 
-            # Generate HTML
-            try:
-                html = template.render(record=record_for_template) # Pass the constructed record
-            except jinja2.exceptions.TemplateError as e:
-                error = f"Template rendering error for row {row_num_display}: {e}"
-                logger.error(error)
-                errors.append({"row": row_num_display, "error": error})
-                continue # Skip this row
-
-            # Replace image src attributes
-            for img_file, img_data in images.items():
-                if img_data:
-                    img_pattern = re.compile(rf'src\s*=\s*["\']?{re.escape(img_file)}["\']?')
-                    img_replace = f'src="{img_data}"'
-                    html = img_pattern.sub(img_replace, html)
+            profiler.add_timing("record", (clock() - phase_start) * 1000.0)
 
             # Create unique filename
+            phase_start = clock()
             try:
-                # Pass schema_for_doc which might be None
-                base_filename = create_filename(record_for_template, document_type, row_num_display, schema_for_doc)
+                base_filename = filename_template.format(record_for_template, row_num_display)
             except Exception as e:
                 logger.warning(f"Error creating base filename for row {row_num_display}: {e}. Using default.")
                 base_filename = f"{document_type}_{row_num_display:04d}.html"
 
-            filename = base_filename
+            filename = filename_allocator.claim(base_filename)
             file_path = os.path.join(output_dir, filename)
-            counter = 1
-            base_name, extension = os.path.splitext(base_filename)
-
-            while filename in generated_filenames_in_run or os.path.exists(file_path):
-                logger.warning(f"Filename '{filename}' already exists or used in this run. Generating unique name.")
-                filename = f"{base_name}_{counter}{extension}"
-                file_path = os.path.join(output_dir, filename)
-                counter += 1
-                if counter > 100:
-                    logger.error(f"Could not generate a unique filename for base '{base_name}' after 100 attempts.")
-                    # Fallback to a name less likely to collide
-                    filename = f"{base_name}_DUPLICATE_{row_num_display}_{int(time.time())}{extension}"
-                    file_path = os.path.join(output_dir, filename)
-                    if filename in generated_filenames_in_run or os.path.exists(file_path):
-                         # Extremely unlikely, but log an error and skip DB insert?
-                         error = f"FATAL: Could not generate ANY unique filename for row {row_num_display}"
-                         logger.error(error)
-                         errors.append({"row": row_num_display, "error": error})
-                         continue # Skip writing file and DB insert for this row
-                    break
+            profiler.add_timing("filename", (clock() - phase_start) * 1000.0)
 
-            generated_filenames_in_run.add(filename)
-
-            # Write the unique file
+            # Render straight into the unique file (images are already inlined in the template)
             try:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(html)
+                bytes_written = render_to_file(template, file_path, render_stats, record=record_for_template)
+            except jinja2.exceptions.TemplateError as e:
+                error = f"Template rendering error for row {row_num_display}: {e}"
+                logger.error(error)
+                errors.append({"row": row_num_display, "error": error})
+                profiler.count("template_errors")
+                filename_allocator.release(filename)
+                continue # Skip this row
             except OSError as e:
                  error = f"Failed to write HTML file {filename} for row {row_num_display}: {e}"
                  logger.error(error)
                  errors.append({"row": row_num_display, "error": error})
-                 generated_filenames_in_run.remove(filename) # Remove from set if write failed
+                 profiler.count("write_errors")
+                 filename_allocator.release(filename) # Name can be reused if write failed
                  continue # Skip DB insert
+            profiler.add_timing("render", render_stats["total_ms"] - render_stats["write_ms"])
+            profiler.add_timing("disk_write", render_stats["write_ms"])
+            profiler.sample("bytes_written", bytes_written)
 
             # Save document metadata to database
+            phase_start = clock()
             try:
                 cursor.execute(
                     f"INSERT INTO {generated_table_name} (document_type, mime_type, input_file, row, data) VALUES (?, ?, ?, ?, ?)",
@@ -375,11 +484,16 @@ def generate_html_files() -> Dict[str, Any]:
                 )
                 # Commit per row or in batches? Per row is safer but slower.
                 db_conn.commit()
+                profiler.add_timing("db", (clock() - phase_start) * 1000.0)
+                manifest[filename] = {"row": row_num_display, "generated_id": cursor.lastrowid}
                 html_files.append(filename)
-                logger.info(f"Generated unique HTML file: {filename}")
+                logger.debug(f"Generated unique HTML file: {filename}")
+                yield {"row": row_num_display, "html_file": filename, "file_path": file_path,
+                       "generated_id": cursor.lastrowid}
             except sqlite3.Error as e:
                 logger.error(f"Database error saving metadata for row {row_num_display} (file: {filename}): {e}")
                 errors.append({"row": row_num_display, "error": f"Database error: {e}"})
+                profiler.count("db_errors")
                 # Don't rollback if previous commits were successful, just log error for this row
                 # db_conn.rollback() # Only if committing at end
 
@@ -387,11 +501,45 @@ def generate_html_files() -> Dict[str, Any]:
             logger.error(f"General error generating HTML for row {row_num_display}: {e}", exc_info=True)
             errors.append({"row": row_num_display, "error": str(e)})
 
+
+
+def finish_html_run(run: HtmlRun, cprofile: Optional[cProfile.Profile] = None) -> Dict[str, Any]:
+    """
+    Close the database, write the manifest, update the session and write the logs.
+
+    Args:
+        run: The HtmlRun after render_html_rows() has been consumed
+        cprofile: Finished profiler to dump to the session logs, if any
+
+    Returns:
+        Dict containing generation results
+    """
+    session_hash = run.session_hash
+    html_files = run.html_files
+    errors = run.errors
+    output_dir = run.output_dir
+    profiler = run.profiler
+    db_conn = run.db_conn
+    input_file = run.input_file
+    document_type = run.document_type
+    target_rows = run.target_rows
+
+    profiler.count("documents", len(html_files))
+    profiler.count("errors", len(errors))
+    profiler.count("collisions", run.filename_allocator.collisions)
+
     # --- Cleanup and Final Steps ---
     if db_conn:
         db_conn.close()
         logger.debug("Database connection closed.")
 
+    # Record which file belongs to which source row
+    try:
+        with profiler.phase("manifest"):
+            save_html_manifest(output_dir, run.manifest)
+    except OSError as e:
+        logger.error(f"Failed to write HTML manifest in {output_dir}: {e}")
+
     # Update session status
     try:
         update_session_status(
@@ -406,16 +554,30 @@ def generate_html_files() -> Dict[str, Any]:
 
     # Log HTML generation summary
     log_file = None
+    metrics_file = None
+    metrics = profiler.summary()
     try:
         html_logger = HTMLLogger(session_hash)
+        metrics_file = write_metrics_file(
+            metrics, os.path.join(html_logger.logs_dir, f"html_metrics_{html_logger.execution_id}.json")
+        )
+        if cprofile is not None:
+            dump_cprofile(cprofile, os.path.join(html_logger.logs_dir, f"html_profile_{html_logger.execution_id}.prof"))
         log_file = html_logger.log_html_generation(
             num_files=len(html_files),
             file_list=html_files,
-            errors=errors
+            errors=errors,
+            metrics=metrics
         )
     except Exception as e:
          logger.error(f"Failed to generate HTML summary log: {e}")
 
+    phases = metrics["phases_ms"]
+    logger.info(
+        "HTML phase timings (p50/p95 ms): "
+        + ", ".join(f"{name} {stats['p50']}/{stats['p95']}" for name, stats in phases.items() if stats["count"] > 1)
+    )
+
 
     logger.info(f"HTML generation complete for session {session_hash}. Success: {len(html_files)}, Errors: {len(errors)}.")
 
@@ -424,97 +586,454 @@ def generate_html_files() -> Dict[str, Any]:
         "html_files": html_files,
         "errors": errors,
         "output_dir": output_dir,
-        "log_file": log_file
+        "log_file": log_file,
+        "metrics_file": metrics_file,
+        "metrics": metrics,
+        "targeted_rows": len(target_rows) if target_rows is not None else None
     }
 
-def create_filename(record: Dict[str, Any], document_type: str, row_number: int, schema: Optional[Dict[str, Any]] = None) -> str:
+def parse_row_spec(rows: Any, max_row: Optional[int] = None) -> set:
     """
-    Create a filename for the HTML file based on record data and schema pattern.
+    Parse a row selection into a set of 1-based row numbers.
+
+    Accepts a string such as "1-100, 205, 310-312" or a list whose items are
+    row numbers or range strings.
 
     Args:
-        record: Record data (keys are schema field names)
-        document_type: Type of document
-        row_number: Row number for fallback
-        schema: The loaded schema dictionary (optional)
+        rows: The row selection
+        max_row: Last row of the table; ranges are cut off there, so a
+            selection like "1-2000000000" stays as small as the table
+
+    Raises:
+        ValueError: If the specification is malformed
+    """
+    if isinstance(rows, int):
+        rows = [rows]
+    if isinstance(rows, (list, tuple, set)):
+        rows = ",".join(str(item) for item in rows)
+
+    selected = set()
+    for part in str(rows).split(","):
+        part = part.strip()
+        if not part:
+            continue
+        try:
+            if "-" in part:
+                start_str, end_str = part.split("-", 1)
+                start, end = int(start_str), int(end_str)
+                if start < 1 or end < start:
+                    raise ValueError
+                if max_row is not None:
+                    end = min(end, max_row)
+                selected.update(range(start, end + 1))
+            else:
+                row_number = int(part)
+                if row_number < 1:
+                    raise ValueError
+                selected.add(row_number)
+        except ValueError:
+            raise ValueError(f"Invalid row selection '{part}'. Use row numbers and ranges like '1-100,205'.")
+    return selected
+
+
+def select_target_rows(total_rows: int, rows: Any = None, where: Optional[str] = None,
+                       db_path: Optional[str] = None, table_name: Optional[str] = None,
+                       reverse_mapping: Optional[Dict[str, str]] = None) -> set:
+    """
+    Resolve the row numbers selected by a row spec and/or a filter.
+
+    When both are given only rows matching both are selected. Rows beyond
+    the end of the table are ignored.
+
+    Raises:
+        ValueError: If the row spec or the filter is invalid
+    """
+    selected = set(range(1, total_rows + 1))
+    if rows:
+        selected &= parse_row_spec(rows, max_row=total_rows)
+    if where:
+        selected &= _select_rows_by_filter(db_path, table_name, reverse_mapping or {}, where)
+    return selected
+
+
+def _select_rows_by_filter(db_path: str, table_name: str, reverse_mapping: Dict[str, str], where: str) -> set:
+    """
+    Evaluate an SQL filter against the imported table and return matching row numbers.
+
+    Mapped schema field names (e.g. PAYMENT_REFERENCE) and the original column
+    names can both be used. The filter runs on a read-only connection that only
+    permits reads, and a second statement after the filter is rejected by
+    sqlite3 itself (``;`` inside string literals is fine).
+    """
+    def quote(name: str) -> str:
+        return '"' + name.replace('"', '""') + '"'
+
+    select_columns = ["ROW_NUMBER() OVER (ORDER BY rowid) AS __row_number"]
+    field_names = set()
+    for column, field in reverse_mapping.items():
+        if field not in field_names:
+            field_names.add(field)
+            select_columns.append(f"{quote(column)} AS {quote(field)}")
+
+    conn = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        cursor = conn.cursor()
+        cursor.execute(f"PRAGMA table_info({quote(table_name)})")
+        for column_info in cursor.fetchall():
+            if column_info[1] not in field_names:
+                select_columns.append(quote(column_info[1]))
+
+        # Only allow reading from the imported table
+        def authorizer(action, arg1, arg2, db_name, trigger):
+            if action in (sqlite3.SQLITE_SELECT, sqlite3.SQLITE_FUNCTION):
+                return sqlite3.SQLITE_OK
+            if action == sqlite3.SQLITE_READ and arg1 == table_name:
+                return sqlite3.SQLITE_OK
+            return sqlite3.SQLITE_DENY
+
+        conn.set_authorizer(authorizer)
+
+        query = (f"SELECT __row_number FROM (SELECT {', '.join(select_columns)} FROM {quote(table_name)}) "
+                 f"WHERE {where}")
+        try:
+            cursor.execute(query)
+            return {row[0] for row in cursor.fetchall()}
+        except sqlite3.Error as e:
+            raise ValueError(f"Invalid row filter '{where}': {e}")
+    finally:
+        conn.close()
+
+
+def _remove_row_output(output_dir: str, manifest: Dict[str, Dict[str, Any]], target_rows: set,
+                       db_conn: sqlite3.Connection, generated_table_name: str, input_file: str) -> List[str]:
+    """
+    Remove the HTML files and generated_<hash> HTML entries of the targeted rows.
 
     Returns:
-        Filename for the HTML file (without sequence suffix initially)
+        Names of the HTML files that were removed
+    """
+    removed_files = []
+    for filename, entry in list(manifest.items()):
+        if entry.get("row") in target_rows:
+            try:
+                os.remove(os.path.join(output_dir, filename))
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                logger.warning(f"Error removing existing HTML file {filename}: {e}")
+            del manifest[filename]
+            removed_files.append(filename)
+
+    row_list = sorted(target_rows)
+    cursor = db_conn.cursor()
+    for start in range(0, len(row_list), 500):
+        chunk = row_list[start:start + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(
+            f"DELETE FROM {generated_table_name} WHERE mime_type = 'text/html' AND input_file = ? AND row IN ({placeholders})",
+            [input_file, *chunk]
+        )
+    db_conn.commit()
+    logger.info(f"Removed previous HTML output for {len(target_rows)} targeted rows")
+    return removed_files
+
+
+# Stands in for {datetime} when matching files of an earlier run
+_TIMESTAMP_MARKER = "\x00"
+
+
+def _manifest_from_generated(output_dir: str, db_conn: sqlite3.Connection, generated_table_name: str,
+                             input_file: str, schema: Optional[Dict[str, Any]],
+                             document_type: str) -> Dict[str, Dict[str, Any]]:
     """
-    # Default filename pattern
-    filename = f"{document_type}_{row_number:04d}.html" # Add padding to row number
+    Rebuild the HTML manifest of a session generated before manifests were written.
 
-    if schema and "output_doc_name" in schema:
-        pattern = schema["output_doc_name"]
-        logger.info(f"Using output filename pattern: {pattern}")
-        logger.debug(f"Available record keys for filename: {list(record.keys())}")
+    The filename of every HTML entry in generated_<hash> is recomputed from
+    its stored data. ``{datetime}`` is matched as the first run of 14 digits
+    in a file name, and ``_1``, ``_2``, ... suffixes are handed out in
+    generation order, as the allocator did. Files that can't be matched are
+    left alone.
+
+    Returns:
+        Manifest entries (filename -> row and generated_id) for the files found
+    """
+    try:
+        html_files = [name for name in os.listdir(output_dir) if name.lower().endswith(".html")]
+    except OSError:
+        return {}
+    if not html_files:
+        return {}
+
+    template = FilenameTemplate.from_schema(schema, document_type, timestamp=_TIMESTAMP_MARKER)
+    timestamped = "{datetime}" in (template.pattern or "")
+
+    def file_key(name: str) -> str:
+        key = os.path.normcase(name)
+        return re.sub(r"\d{14}", _TIMESTAMP_MARKER, key, count=1) if timestamped else key
+
+    # A file is listed under its own name and under its name without a _N suffix
+    candidates: Dict[str, List[str]] = {}
+    for name in sorted(html_files, key=lambda name: (len(name), name)):
+        base_name, extension = os.path.splitext(name)
+        keys = {file_key(name), file_key(re.sub(r"_\d+$", "", base_name) + extension)}
+        for key in keys:
+            candidates.setdefault(key, []).append(name)
+
+    manifest: Dict[str, Dict[str, Any]] = {}
+    try:
+        cursor = db_conn.execute(
+            f"SELECT id, row, data FROM {generated_table_name} "
+            f"WHERE mime_type = 'text/html' AND input_file = ? ORDER BY id",
+            (input_file,)
+        )
+        for generated_id, row_number, data_json in cursor:
+            try:
+                record = json.loads(data_json)
+            except (TypeError, json.JSONDecodeError):
+                record = {}
+            expected = os.path.normcase(template.format(record if isinstance(record, dict) else {}, row_number))
+            for name in candidates.get(expected, []):
+                if name not in manifest:
+                    manifest[name] = {"row": row_number, "generated_id": generated_id}
+                    break
+    except sqlite3.Error as e:
+        logger.warning(f"Could not rebuild the HTML manifest from {generated_table_name}: {e}")
+    logger.info(f"No HTML manifest in {output_dir}; matched {len(manifest)} of {len(html_files)} "
+                f"HTML files to their rows from {generated_table_name}")
+    return manifest
+
+
+def create_generated_indexes(cursor: sqlite3.Cursor, generated_table_name: str) -> None:
+    """
+    Index ``generated_<hash>`` on (row, mime_type), so a source row's HTML
+    and PDF entries are found without a table scan, and on (input_file, row)
+    for resolving lookup exceptions.
+    """
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{generated_table_name}_row_mime "
+        f"ON {generated_table_name} (row, mime_type)"
+    )
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{generated_table_name}_input_row "
+        f"ON {generated_table_name} (input_file, row)"
+    )
 
-        # Replace {datetime}
-        if "{datetime}" in pattern:
-            now = datetime.now().strftime("%Y%m%d%H%M%S")
-            pattern = pattern.replace("{datetime}", now)
 
-        # Replace {HTML|PDF} with html (lowercase)
+def load_html_manifest(html_dir: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Load the HTML manifest mapping each generated filename to its source row
+    and generated_<hash> id. Returns an empty dict if there is none.
+    """
+    manifest_path = os.path.join(html_dir, HTML_MANIFEST_FILE)
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            return json.load(f).get("files", {})
+    except FileNotFoundError:
+        return {}
+    except (json.JSONDecodeError, OSError, AttributeError) as e:
+        logger.warning(f"Could not read HTML manifest {manifest_path}: {e}")
+        return {}
+
+
+def save_html_manifest(html_dir: str, files: Dict[str, Dict[str, Any]]) -> str:
+    """
+    Write the HTML manifest atomically.
+
+    Returns:
+        Path to the manifest file
+    """
+    manifest_path = os.path.join(html_dir, HTML_MANIFEST_FILE)
+    temp_path = manifest_path + ".tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump({"updated_at": datetime.now().isoformat(), "files": files}, f)
+    os.replace(temp_path, manifest_path)
+    return manifest_path
+
+
+class FilenameTemplate:
+    """
+    Pre-compiled form of a schema's ``output_doc_name`` pattern.
+
+    The pattern is parsed once into literal text and placeholder names, so
+    formatting a row's filename is plain string work. ``{datetime}`` is fixed
+    when the template is compiled and ``{HTML|PDF}`` becomes ``html``.
+    """
+
+    def __init__(self, pattern: Optional[str], document_type: str, timestamp: Optional[str] = None):
+        """
+        Args:
+            pattern: The ``output_doc_name`` pattern, or None for the default naming
+            document_type: Type of document (used by the default pattern)
+            timestamp: Value for ``{datetime}``; defaults to the current time
+        """
+        self.pattern = pattern
+        self.document_type = document_type
+        self._segments: List[Tuple[bool, str]] = []
+        self._reported_placeholders = set()
+
+        if not pattern:
+            return
+
+        if "{datetime}" in pattern:
+            pattern = pattern.replace("{datetime}", timestamp or datetime.now().strftime("%Y%m%d%H%M%S"))
         pattern = re.sub(r'\{HTML\|PDF\}', 'html', pattern, flags=re.IGNORECASE)
 
-        # Find placeholders like {FIELD_NAME}
-        placeholders = re.findall(r'\{([A-Za-z0-9_]+)\}', pattern)
-
-        for placeholder in placeholders:
-            value = record.get(placeholder) # Get value using schema field name key
-
-            if value is not None:
-                value_str = str(value).strip()
-                sanitized_value = sanitize_filename_value(value_str)
-                if sanitized_value: # Don't replace with empty string if sanitation removes everything
-                    # Make replacement safe for regex special chars if needed, but simple replace is usually fine here
-                    pattern = pattern.replace(f"{{{placeholder}}}", sanitized_value)
-                    logger.debug(f"Replaced placeholder {{{placeholder}}} with '{sanitized_value}'")
-                else:
-                    logger.warning(f"Sanitized value for placeholder {{{placeholder}}} is empty. Original: '{value_str}'. Placeholder replaced with placeholder name.")
-                    # Replace with placeholder name to indicate missing value but keep structure
-                    pattern = pattern.replace(f"{{{placeholder}}}", f"{placeholder}_EMPTY")
+        # Split into alternating literal / placeholder segments
+        position = 0
+        for match in re.finditer(r'\{([A-Za-z0-9_]+)\}', pattern):
+            if match.start() > position:
+                self._segments.append((False, pattern[position:match.start()]))
+            self._segments.append((True, match.group(1)))
+            position = match.end()
+        if position < len(pattern):
+            self._segments.append((False, pattern[position:]))
+
+        placeholders = [text for is_placeholder, text in self._segments if is_placeholder]
+        logger.info(f"Compiled output filename pattern '{self.pattern}' with placeholders: {placeholders}")
+
+        literal_text = "".join(text for is_placeholder, text in self._segments if not is_placeholder)
+        if not re.match(r'^[\w\s\-\.\(\)]*$', literal_text):
+            logger.warning(f"Output filename pattern '{self.pattern}' contains potentially problematic characters.")
+
+    @classmethod
+    def from_schema(cls, schema: Optional[Dict[str, Any]], document_type: str,
+                    timestamp: Optional[str] = None) -> "FilenameTemplate":
+        """
+        Compile the filename template for a schema (which may be None).
+        """
+        pattern = schema.get("output_doc_name") if schema else None
+        if not pattern:
+            logger.info(f"No 'output_doc_name' pattern found in schema. Using default: {document_type}_<row>.html")
+        return cls(pattern, document_type, timestamp)
+
+    def format(self, record: Dict[str, Any], row_number: int) -> str:
+        """
+        Build the base filename for a record (without any uniqueness suffix).
+
+        Args:
+            record: Record data (keys are schema field names)
+            row_number: Row number for the default pattern
+
+        Returns:
+            Filename for the HTML file
+        """
+        if not self._segments:
+            return f"{self.document_type}_{row_number:04d}.html"
+
+        parts = []
+        for is_placeholder, text in self._segments:
+            if not is_placeholder:
+                parts.append(text)
+                continue
+
+            value = record.get(text)
+            if value is None:
+                self._report_once(text, f"Placeholder {{{text}}} not found in record data.")
+                parts.append(f"{text}_MISSING")
+                continue
+
+            sanitized_value = sanitize_filename_value(str(value).strip())
+            if sanitized_value:
+                parts.append(sanitized_value)
             else:
-                logger.warning(f"Placeholder {{{placeholder}}} not found in record data.")
-                # Replace with placeholder name to indicate missing value but keep structure
-                pattern = pattern.replace(f"{{{placeholder}}}", f"{placeholder}_MISSING")
+                logger.debug(f"Sanitized value for placeholder {{{text}}} is empty. Original: '{value}'.")
+                parts.append(f"{text}_EMPTY")
 
+        filename = "".join(parts)
 
         # Clean up separators if placeholders were missing/empty
-        pattern = re.sub(r'__+', '_', pattern) # Replace multiple underscores with one
-        pattern = pattern.strip('_') # Remove leading/trailing underscores
+        while "__" in filename:
+            filename = filename.replace("__", "_")
+        filename = filename.strip("_")
 
         # Ensure .html extension
-        if not pattern.lower().endswith('.html'):
-            # Remove existing extension if present before adding .html
-            base_pattern, _ = os.path.splitext(pattern)
-            pattern = base_pattern + '.html'
+        if not filename.lower().endswith(".html"):
+            base_name, _ = os.path.splitext(filename)
+            filename = base_name + ".html"
 
-        # Basic sanity check for filename length and characters
-        base_pattern_name = os.path.basename(pattern) # Check just the filename part
-        if len(base_pattern_name) > 200: # Limit length (adjust as needed for filesystem)
-             base_pattern_name = base_pattern_name[:195] + ".html"
-             pattern = base_pattern_name # Update pattern if truncated
+        # Limit length (adjust as needed for filesystem)
+        if len(filename) > 200:
+            filename = filename[:195] + ".html"
 
-        # Allow a wider range of characters, but log potential issues
-        # Filesystems handle many characters, but some can be problematic in URLs/scripts
-        if not re.match(r'^[\w\s\-\.\(\)]+$', base_pattern_name): # Allow word chars, space, hyphen, dot, parentheses
-             logger.warning(f"Generated filename '{base_pattern_name}' may contain potentially problematic characters.")
+        return filename
 
-        filename = pattern # Use the generated pattern
+    def _report_once(self, placeholder: str, message: str) -> None:
+        """Log a placeholder problem the first time it is seen for this template."""
+        if placeholder not in self._reported_placeholders:
+            self._reported_placeholders.add(placeholder)
+            logger.warning(message)
 
-    else:
-         logger.info(f"No 'output_doc_name' pattern found in schema. Using default: {filename}")
+
+class UniqueFilenameAllocator:
+    """
+    Hand out filenames that are unique within an output directory.
+
+    The directory is listed once when the allocator is created; after that
+    every collision is resolved in memory by appending ``_1``, ``_2``, ...
+    to the base name, without touching the filesystem.
+    """
+
+    def __init__(self, directory: str):
+        try:
+            existing = os.listdir(directory)
+        except OSError:
+            existing = []
+        self._taken = {os.path.normcase(name) for name in existing}
+        self._next_suffix: Dict[str, int] = {}
+        self.collisions = 0
+
+    def claim(self, filename: str) -> str:
+        """
+        Reserve and return a unique name derived from ``filename``.
+        """
+        key = os.path.normcase(filename)
+        if key not in self._taken:
+            self._taken.add(key)
+            return filename
+
+        self.collisions += 1
+        base_name, extension = os.path.splitext(filename)
+        counter = self._next_suffix.get(key, 1)
+        candidate = f"{base_name}_{counter}{extension}"
+        while os.path.normcase(candidate) in self._taken:
+            counter += 1
+            candidate = f"{base_name}_{counter}{extension}"
+        self._next_suffix[key] = counter + 1
+        self._taken.add(os.path.normcase(candidate))
+        logger.debug(f"Filename '{filename}' already used. Using '{candidate}' instead.")
+        return candidate
+
+    def release(self, filename: str) -> None:
+        """
+        Give a name back (e.g. when writing the file failed).
+        """
+        self._taken.discard(os.path.normcase(filename))
 
 
-    logger.info(f"Base filename for row {row_number}: {filename}")
-    return filename
+def create_filename(record: Dict[str, Any], document_type: str, row_number: int, schema: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Create a filename for the HTML file based on record data and schema pattern.
+
+    For bulk generation compile a FilenameTemplate once and call its format()
+    method instead; this helper compiles the pattern on every call.
+
+    Args:
+        record: Record data (keys are schema field names)
+        document_type: Type of document
+        row_number: Row number for fallback
+        schema: The loaded schema dictionary (optional)
+
+    Returns:
+        Filename for the HTML file (without sequence suffix initially)
+    """
+    return FilenameTemplate.from_schema(schema, document_type).format(record, row_number)
 
 
 def sanitize_filename_value(value: str) -> str:
     """
     Sanitize a value to be used in a filename.
-    Allows letters, numbers, underscore, hyphen, period, parentheses, and space.
-    Replaces other invalid characters with a hyphen.
+    Allows letters, numbers, underscore, hyphen, period and parentheses.
+    Runs of whitespace, hyphens and other invalid characters become a single hyphen.
 
     Args:
         value: The value to sanitize
@@ -522,22 +1041,31 @@ def sanitize_filename_value(value: str) -> str:
     Returns:
         Sanitized value safe for use in filenames
     """
-    # Keep alphanumeric, underscore, hyphen, period, parentheses, space
-    # Replace others with hyphen
-    sanitized = re.sub(r'[^\w\s\-\.\(\)]', '-', value)
-
-    # Replace multiple hyphens or spaces with a single one
-    sanitized = re.sub(r'[\s-]+', '-', sanitized)
-
-    # Trim leading/trailing whitespace, hyphens, dots
-    sanitized = sanitized.strip('. -')
-
-    # Limit length to prevent excessively long filenames (adjust limit as needed)
     max_length = 100
+
+    # Fast path: typical IDs and references are plain alphanumerics
+    if value.isalnum():
+        return value[:max_length]
+
+    chars = []
+    pending_separator = False
+    for ch in value:
+        if ch.isalnum() or ch in "_.()":
+            if pending_separator:
+                chars.append("-")
+                pending_separator = False
+            chars.append(ch)
+        else:
+            pending_separator = True
+    if pending_separator:
+        chars.append("-")
+
+    # Trim leading/trailing hyphens and dots
+    sanitized = "".join(chars).strip(". -")
+
+    # Limit length to prevent excessively long filenames
     if len(sanitized) > max_length:
-        sanitized = sanitized[:max_length]
-        # Ensure it doesn't end with a hyphen after truncation
-        sanitized = sanitized.rstrip('-')
+        sanitized = sanitized[:max_length].rstrip("-")
 
     return sanitized
 
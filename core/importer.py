@@ -361,31 +361,7 @@ def get_table_data(session_hash: Optional[str] = None) -> Tuple[str, List[str],
         if not session_hash:
             raise ValueError("No active session found")
 
-    # Get the database path from status.json
-    try:
-        with open('status.json', 'r') as f:
-            status_data = json.load(f)
-
-        # Check if the current session matches the one in status.json
-        current_state = status_data.get('current_state', {})
-        if current_state.get('hash') == session_hash and 'sqlite_db_file' in current_state:
-            db_path = current_state['sqlite_db_file']
-            logger.info(f"Using database path from status.json: {db_path}")
-        else:
-            # Fallback to the default path
-            session_dir = get_session_dir(session_hash)
-            db_path = os.path.join(session_dir, "data.db")
-            logger.info(f"Using default database path: {db_path}")
-    except Exception as e:
-        # Fallback to the default path if status.json can't be read
-        logger.warning(f"Could not read database path from status.json: {e}")
-        session_dir = get_session_dir(session_hash)
-        db_path = os.path.join(session_dir, "data.db")
-
-    # Make sure the database file exists
-    if not os.path.isfile(db_path):
-        logger.error(f"Database file not found: {db_path}")
-        raise FileNotFoundError(f"Database file not found: {db_path}")
+    db_path = _session_db_path(session_hash)
 
     # Connect to the database
     try:
@@ -398,26 +374,7 @@ def get_table_data(session_hash: Optional[str] = None) -> Tuple[str, List[str],
     try:
         # Get the table name
         cursor = conn.cursor()
-
-        # Extract the first 10 characters of the session hash to match the table name pattern
-        hash_prefix = session_hash[:10]
-        exact_table_name = f"imported_{hash_prefix}"
-
-        # First try to find the exact table
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name = ?", (exact_table_name,))
-        table_result = cursor.fetchone()
-
-        if not table_result:
-            # If exact match not found, fall back to the old method
-            logger.warning(f"Exact table {exact_table_name} not found, trying pattern match")
-            cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name = 'imported_' || ? ", (hash_prefix,))
-            table_result = cursor.fetchone()
-
-            if not table_result:
-                logger.error(f"No imported table found in database {db_path}")
-                raise ValueError(f"No imported table found in database {db_path}")
-
-        table_name = table_result[0]
+        table_name = _find_imported_table(cursor, session_hash, db_path)
         logger.info(f"Using table: {table_name}")
 
         # Get the columns
@@ -443,6 +400,82 @@ def get_table_data(session_hash: Optional[str] = None) -> Tuple[str, List[str],
         conn.close()
 
 
+def get_table_name(session_hash: Optional[str] = None) -> str:
+    """
+    Get the name of the imported table for a session without reading its rows.
+
+    Args:
+        session_hash: Hash of the session, or None to use current session
+
+    Returns:
+        The imported table name
+    """
+    if not session_hash:
+        session_hash = get_current_session()
+        if not session_hash:
+            raise ValueError("No active session found")
+
+    db_path = _session_db_path(session_hash)
+    conn = sqlite3.connect(db_path)
+    try:
+        return _find_imported_table(conn.cursor(), session_hash, db_path)
+    finally:
+        conn.close()
+
+
+def _session_db_path(session_hash: str) -> str:
+    """Path of a session's database, preferring the one recorded in status.json."""
+    # Get the database path from status.json
+    try:
+        with open('status.json', 'r') as f:
+            status_data = json.load(f)
+
+        # Check if the current session matches the one in status.json
+        current_state = status_data.get('current_state', {})
+        if current_state.get('hash') == session_hash and 'sqlite_db_file' in current_state:
+            db_path = current_state['sqlite_db_file']
+            logger.info(f"Using database path from status.json: {db_path}")
+        else:
+            # Fallback to the default path
+            session_dir = get_session_dir(session_hash)
+            db_path = os.path.join(session_dir, "data.db")
+            logger.info(f"Using default database path: {db_path}")
+    except Exception as e:
+        # Fallback to the default path if status.json can't be read
+        logger.warning(f"Could not read database path from status.json: {e}")
+        session_dir = get_session_dir(session_hash)
+        db_path = os.path.join(session_dir, "data.db")
+
+    # Make sure the database file exists
+    if not os.path.isfile(db_path):
+        logger.error(f"Database file not found: {db_path}")
+        raise FileNotFoundError(f"Database file not found: {db_path}")
+    return db_path
+
+
+def _find_imported_table(cursor, session_hash: str, db_path: str) -> str:
+    """Name of the session's imported table in an open database."""
+    # Extract the first 10 characters of the session hash to match the table name pattern
+    hash_prefix = session_hash[:10]
+    exact_table_name = f"imported_{hash_prefix}"
+
+    # First try to find the exact table
+    cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name = ?", (exact_table_name,))
+    table_result = cursor.fetchone()
+
+    if not table_result:
+        # If exact match not found, fall back to the old method
+        logger.warning(f"Exact table {exact_table_name} not found, trying pattern match")
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name = 'imported_' || ? ", (hash_prefix,))
+        table_result = cursor.fetchone()
+
+        if not table_result:
+            logger.error(f"No imported table found in database {db_path}")
+            raise ValueError(f"No imported table found in database {db_path}")
+
+    return table_result[0]
+
+
 def get_column_info(session_hash: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
     """
     Get information about columns in the imported data.
@@ -16,14 +16,11 @@ import shutil
 import jinja2
 
 from core.session import get_session_dir, get_current_session, generate_execution_id
+from core.template_service import get_template_env
 
 # Configure standard Python logging
 logger = logging.getLogger(__name__)
 
-# Set up Jinja2 environment
-template_loader = jinja2.FileSystemLoader(searchpath="templates/logs")
-jinja_env = jinja2.Environment(loader=template_loader)
-
 
 class HTMLLogger:
     """
@@ -75,7 +72,7 @@ class HTMLLogger:
             return self._template_cache[template_name]
 
         try:
-            template = jinja_env.get_template(template_name)
+            template = get_template_env("logs").get_template(template_name)
             self._template_cache[template_name] = template
             return template
         except jinja2.exceptions.TemplateNotFound:
@@ -213,7 +210,8 @@ class HTMLLogger:
         return self._render_template("mapping.html", html_file, context)
 
     def log_html_generation(self, num_files: int, file_list: List[str],
-                        errors: List[Dict[str, Any]] = None) -> str:
+                        errors: List[Dict[str, Any]] = None,
+                        metrics: Optional[Dict[str, Any]] = None) -> str:
         """
         Generate HTML log for HTML file generation.
 
@@ -221,6 +219,7 @@ class HTMLLogger:
             num_files: Number of HTML files generated
             file_list: List of generated file names
             errors: List of errors encountered during generation
+            metrics: Per-phase timing summary from StageProfiler.summary()
 
         Returns:
             Path to the generated HTML file
@@ -249,6 +248,7 @@ class HTMLLogger:
             "output_dir": output_dir,
             "file_list": file_list,
             "errors": errors or [],
+            "metrics": metrics,
         }
 
         html_file = f"generate_html_{self.execution_id}.html"
@@ -415,7 +415,7 @@ class HTMLLogger:
         """
         try:
             # Load template
-            template = jinja_env.get_template(template_name)
+            template = self._get_template(template_name)
 
             # Add common context variables
             context.update({
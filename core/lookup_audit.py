@@ -0,0 +1,258 @@
+#!/usr/bin/env python
+"""
+Lookup Audit - Record lookup attempts and exceptions of a resolution run.
+
+The full audit writes one ``tenant_lookup_{hash}`` row per mapping tried,
+with the action spelled out, and copies the record's data into every
+exception. The compact audit writes one row of integers per record instead:
+the run, how many mappings were tried and an outcome code. The ordered
+mappings of each run are stored once, and exceptions reference their
+``generated_{hash}`` row rather than copying its data. Views rebuild the
+full layout from both:
+
+- ``tenant_lookup_view_{hash}``: one row per attempt, like ``tenant_lookup_{hash}``
+- ``tenant_lookup_exceptions_view_{hash}``: exceptions with their data filled in
+"""
+
+import time
+import logging
+from typing import Dict, List, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+AUDIT_MODES = ("full", "compact")
+
+# Outcome codes of the compact audit
+AUDIT_MATCHED = 1
+AUDIT_UNMATCHED = 2
+AUDIT_INVALID_JSON = 3
+AUDIT_NO_MAPPINGS = 4
+AUDIT_OUTCOMES = {
+    AUDIT_MATCHED: "matched",
+    AUDIT_UNMATCHED: "unmatched",
+    AUDIT_INVALID_JSON: "invalid_json",
+    AUDIT_NO_MAPPINGS: "no_mappings",
+}
+
+
+class LookupAudit:
+    """
+    Full audit: a ``tenant_lookup_{hash}`` row per attempt and full exception rows.
+
+    Set-based resolution reports the attempts of a record in one call
+    (``attempts``) and they are inserted together on ``flush``; per-record
+    resolution inserts each attempt as it is made (``attempt``) so an
+    exception can be linked to it.
+    """
+
+    compact = False
+
+    def __init__(self, cursor, tables: Tuple[str, str, str], plans):
+        self.cursor = cursor
+        self.generated_table_name, self.lookup_table_name, self.exceptions_table_name = tables
+        self.plans = plans
+        self._attempt_rows: List[Tuple[int, str]] = []
+
+    def attempt(self, record_id: int, position: int) -> Optional[int]:
+        """Insert the attempt of plan ``position`` for a record and return its ID."""
+        self.cursor.execute(
+            f"INSERT INTO {self.lookup_table_name} (generated_id, action) VALUES (?, ?)",
+            (record_id, _attempt_action(self.plans[position]))
+        )
+        return self.cursor.lastrowid
+
+    def attempts(self, record_id: int, count: int) -> None:
+        """Queue the attempts of the first ``count`` plans for a record."""
+        self._attempt_rows.extend((record_id, _attempt_action(plan)) for plan in self.plans[:count])
+
+    def exception(self, action: str, message: str, input_file: str, row: int, data: str,
+                  record_id: Optional[int] = None) -> int:
+        """Log a lookup exception and return its ID."""
+        self.cursor.execute(
+            f"INSERT INTO {self.exceptions_table_name} "
+            f"(action, exception_message, input_file, row, data, created_at) "
+            f"VALUES (?, ?, ?, ?, ?, ?)",
+            (action, message, input_file, row, data, int(time.time()))
+        )
+        return self.cursor.lastrowid
+
+    def link_exception(self, attempt_id: Optional[int], record_id: int, exception_id: int) -> None:
+        """Point an attempt at the exception it raised."""
+        if attempt_id is None:
+            return
+        self.cursor.execute(
+            f"UPDATE {self.lookup_table_name} SET tenant_lookup_exceptions_id = ? WHERE id = ?",
+            (exception_id, attempt_id)
+        )
+
+    def finish(self, record_id: int, attempts: int, outcome: int) -> None:
+        """Record how a record's resolution ended (only kept by the compact audit)."""
+
+    def flush(self) -> int:
+        """Write queued rows; returns the number of attempts written."""
+        self.cursor.executemany(
+            f"INSERT INTO {self.lookup_table_name} (generated_id, action) VALUES (?, ?)", self._attempt_rows
+        )
+        written = len(self._attempt_rows)
+        self._attempt_rows = []
+        return written
+
+
+class CompactLookupAudit(LookupAudit):
+    """
+    Compact audit: one ``tenant_lookup_log_{hash}`` row of integers per record.
+
+    A record's attempts are the first ``attempts`` mappings of its run, so
+    they are not stored one by one. Exceptions keep their action and message
+    but reference the generated row instead of copying its data.
+    """
+
+    compact = True
+
+    def __init__(self, cursor, tables: Tuple[str, str, str], plans):
+        super().__init__(cursor, tables, plans)
+        self.table_hash = self.generated_table_name[len("generated_"):]
+        ensure_compact_audit_tables(cursor, self.table_hash)
+        self.run_id = _register_run(cursor, self.table_hash, plans)
+        self.log_table_name = f"tenant_lookup_log_{self.table_hash}"
+        self._log_rows: List[Tuple[int, int, int, int, Optional[int], int]] = []
+        self._exception_ids: Dict[int, int] = {}
+
+    def attempt(self, record_id: int, position: int) -> Optional[int]:
+        return None
+
+    def attempts(self, record_id: int, count: int) -> None:
+        pass
+
+    def exception(self, action: str, message: str, input_file: str, row: int, data: str,
+                  record_id: Optional[int] = None) -> int:
+        # The data stays in the generated row; the view joins it back in
+        self.cursor.execute(
+            f"INSERT INTO {self.exceptions_table_name} "
+            f"(action, exception_message, input_file, row, data, generated_id, created_at) "
+            f"VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (action, message, input_file, row, "" if record_id is not None else data, record_id, int(time.time()))
+        )
+        return self.cursor.lastrowid
+
+    def link_exception(self, attempt_id: Optional[int], record_id: int, exception_id: int) -> None:
+        self._exception_ids[record_id] = exception_id
+
+    def finish(self, record_id: int, attempts: int, outcome: int) -> None:
+        self._log_rows.append((record_id, self.run_id, attempts, outcome,
+                               self._exception_ids.pop(record_id, None), int(time.time())))
+
+    def flush(self) -> int:
+        self.cursor.executemany(
+            f"INSERT INTO {self.log_table_name} "
+            f"(generated_id, run_id, attempts, action, exception_id, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+            self._log_rows
+        )
+        written = sum(row[2] for row in self._log_rows)
+        self._log_rows = []
+        return written
+
+
+def create_lookup_audit(cursor, tables: Tuple[str, str, str], plans, mode: str = "full") -> LookupAudit:
+    """
+    The audit writer for ``lookups.audit`` mode "full" or "compact".
+
+    Raises:
+        ValueError: If the mode is unknown
+    """
+    if mode not in AUDIT_MODES:
+        raise ValueError(f"Unknown lookup audit mode '{mode}' (expected one of: {', '.join(AUDIT_MODES)})")
+    if mode == "compact":
+        return CompactLookupAudit(cursor, tables, plans)
+    return LookupAudit(cursor, tables, plans)
+
+
+def ensure_compact_audit_tables(cursor, table_hash: str) -> None:
+    """Create the compact audit tables and the views that rebuild the full layout."""
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS tenant_lookup_plans_{table_hash} (
+        id INTEGER PRIMARY KEY,
+        lookup_type TEXT NOT NULL,
+        mapping TEXT NOT NULL,
+        UNIQUE (lookup_type, mapping)
+    )
+    ''')
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS tenant_lookup_run_plans_{table_hash} (
+        run_id INTEGER NOT NULL,
+        position INTEGER NOT NULL,
+        plan_id INTEGER NOT NULL,
+        PRIMARY KEY (run_id, position)
+    ) WITHOUT ROWID
+    ''')
+    cursor.execute(f'''
+    CREATE TABLE IF NOT EXISTS tenant_lookup_log_{table_hash} (
+        id INTEGER PRIMARY KEY,
+        generated_id INTEGER NOT NULL,
+        run_id INTEGER NOT NULL,
+        attempts INTEGER NOT NULL,
+        action INTEGER NOT NULL,
+        exception_id INTEGER,
+        created_at INTEGER NOT NULL
+    )
+    ''')
+
+    exceptions_table_name = f"tenant_lookup_exceptions_{table_hash}"
+    columns = [row[1] for row in cursor.execute(f"PRAGMA table_info({exceptions_table_name})")]
+    if "generated_id" not in columns:
+        cursor.execute(f"ALTER TABLE {exceptions_table_name} ADD COLUMN generated_id INTEGER")
+
+    # Attempts of both audits; an exception is shown on the record's last attempt
+    cursor.execute(f'''
+    CREATE VIEW IF NOT EXISTS tenant_lookup_view_{table_hash} AS
+    SELECT ROW_NUMBER() OVER (ORDER BY source, entry_id, position) AS id,
+           generated_id, action, tenant_lookup_exceptions_id, created_at
+    FROM (
+        SELECT 0 AS source, id AS entry_id, 0 AS position, generated_id, action,
+               tenant_lookup_exceptions_id, created_at
+        FROM tenant_lookup_{table_hash}
+        UNION ALL
+        SELECT 1, l.id, rp.position, l.generated_id,
+               'Trying ' || p.lookup_type || ' mapping: ' || p.mapping,
+               CASE WHEN rp.position = l.attempts - 1 THEN l.exception_id END,
+               datetime(l.created_at, 'unixepoch')
+        FROM tenant_lookup_log_{table_hash} l
+        JOIN tenant_lookup_run_plans_{table_hash} rp ON rp.run_id = l.run_id AND rp.position < l.attempts
+        JOIN tenant_lookup_plans_{table_hash} p ON p.id = rp.plan_id
+    )
+    ''')
+    cursor.execute(f'''
+    CREATE VIEW IF NOT EXISTS tenant_lookup_exceptions_view_{table_hash} AS
+    SELECT e.id, e.action, e.exception_message, e.input_file, e.row,
+           CASE WHEN e.generated_id IS NOT NULL AND e.data = '' THEN g.data ELSE e.data END AS data,
+           e.accept_action, e.lookup_value, e.status, e.created_at, e.updated_at
+    FROM {exceptions_table_name} e
+    LEFT JOIN generated_{table_hash} g ON g.id = e.generated_id
+    ''')
+
+
+def _register_run(cursor, table_hash: str, plans) -> int:
+    """Store the run's mappings in the order they are tried and return the new run ID."""
+    plans_table_name = f"tenant_lookup_plans_{table_hash}"
+    cursor.executemany(
+        f"INSERT OR IGNORE INTO {plans_table_name} (lookup_type, mapping) VALUES (?, ?)",
+        [(plan.lookup_type, plan.mapping) for plan in plans]
+    )
+    run_id = cursor.execute(
+        f"SELECT COALESCE(MAX(run_id), 0) + 1 FROM tenant_lookup_run_plans_{table_hash}"
+    ).fetchone()[0]
+    for position, plan in enumerate(plans):
+        plan_id = cursor.execute(
+            f"SELECT id FROM {plans_table_name} WHERE lookup_type = ? AND mapping = ?",
+            (plan.lookup_type, plan.mapping)
+        ).fetchone()[0]
+        cursor.execute(
+            f"INSERT INTO tenant_lookup_run_plans_{table_hash} (run_id, position, plan_id) VALUES (?, ?, ?)",
+            (run_id, position, plan_id)
+        )
+    return run_id
+
+
+def _attempt_action(plan) -> str:
+    return f"Trying {plan.lookup_type} mapping: {plan.mapping}"
@@ -0,0 +1,424 @@
+#!/usr/bin/env python
+"""
+Lookup Backends - Query tenant destination databases for lookup resolution.
+
+A backend matches many source values against one destination column with
+batched ``WHERE column IN (...)`` queries over a small connection pool, so a
+lookup run costs one round trip per batch instead of one per record. The
+MySQL backend talks to tenant databases through pymysql; the SQLite backend
+implements the same interface over a database file and stands in for MySQL
+in tests and local setups.
+"""
+
+import queue
+import logging
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Dict, List, Any, Optional, Iterable, Callable, Tuple
+
+# pymysql is optional; MySQL destinations are unavailable without it
+try:
+    import pymysql
+    PYMYSQL_AVAILABLE = True
+except ImportError:
+    pymysql = None
+    PYMYSQL_AVAILABLE = False
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 1000
+DEFAULT_POOL_SIZE = 4
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 30
+# Seconds to wait for a free pooled connection
+DEFAULT_POOL_TIMEOUT = 30
+# Matching ignores case, like MySQL's default *_ci collations, unless a connection sets case_sensitive
+DEFAULT_CASE_SENSITIVE = False
+# Settings a tenant connection may have; anything else is most likely a typo
+CONNECTION_SETTINGS = ("driver", "host", "port", "username", "password", "database", "charset", "path",
+                       "connect_timeout", "read_timeout", "write_timeout", "pool_size", "pool_timeout",
+                       "batch_size", "case_sensitive")
+
+
+class LookupBackendError(Exception):
+    """A destination database can't be reached or queried."""
+
+
+class ConnectionPool:
+    """
+    A fixed number of connections shared by threads; connections are opened on
+    first use, checked before reuse (and replaced if the check fails) and
+    dropped when a query on them fails.
+    """
+
+    def __init__(self, connect: Callable[[], Any], size: int = DEFAULT_POOL_SIZE,
+                 validate: Optional[Callable[[Any], None]] = None, timeout: float = DEFAULT_POOL_TIMEOUT):
+        self._connect = connect
+        self._validate = validate
+        self._timeout = timeout
+        self._idle: "queue.LifoQueue[Any]" = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max(1, size))
+        self.size = max(1, size)
+        self.opened = 0
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of the ``with`` block."""
+        if not self._slots.acquire(timeout=self._timeout):
+            raise LookupBackendError(f"No lookup connection became free within {self._timeout}s")
+        conn = None
+        try:
+            conn = self._checkout()
+            yield conn
+        except Exception:
+            # The connection may be in an unknown state; open a fresh one next time
+            self._discard(conn)
+            conn = None
+            raise
+        finally:
+            if conn is not None:
+                self._idle.put(conn)
+            self._slots.release()
+
+    def _checkout(self) -> Any:
+        """An idle connection that passes validation, or a new one."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            if not self._validate:
+                return conn
+            try:
+                self._validate(conn)
+                return conn
+            except Exception as e:
+                # E.g. the server closed it while it was idle; try the next one
+                logger.debug(f"Dropping a pooled lookup connection that failed validation: {e}")
+                self._discard(conn)
+        conn = self._connect()
+        self.opened += 1
+        return conn
+
+    def close(self) -> None:
+        """Close all idle connections."""
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    @staticmethod
+    def _discard(conn: Any) -> None:
+        if conn is None:
+            return
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class LookupBackend:
+    """
+    Matches values against a destination column in batches.
+
+    Subclasses provide the pool and the parameter placeholder. ``fold_case``
+    makes matching case-insensitive, like MySQL's default ``*_ci`` collations;
+    backends whose columns compare exactly add ``fold_case_collation`` to the query.
+    With a ``cache`` (a LookupCache), values looked up before are answered
+    from it and only the rest are queried.
+    """
+
+    placeholder = "?"
+    fold_case_collation = ""
+
+    def __init__(self, name: str, pool: ConnectionPool, batch_size: int = DEFAULT_BATCH_SIZE,
+                 fold_case: bool = False):
+        self.name = name
+        self.pool = pool
+        self.batch_size = max(1, batch_size)
+        self.fold_case = fold_case
+        self.cache = None
+        self.queries = 0
+        self.values_looked_up = 0
+        self.values_cached = 0
+
+    def normalise(self, value: Any) -> str:
+        """Key under which a source value and a stored value count as equal."""
+        text = str(value)
+        return text.casefold() if self.fold_case else text
+
+    def match_values(self, table: str, column: str, values: Iterable[Any]) -> Dict[str, Tuple[int, Any]]:
+        """
+        Look up values in ``table.column``, ``batch_size`` values per query.
+
+        ``table`` and ``column`` must be validated identifiers (see LookupPlan).
+
+        Returns:
+            Dict of normalise(value) -> (number of matching rows, a matching stored value);
+            values without a match are absent
+        """
+        distinct: Dict[str, Any] = {}
+        for value in values:
+            distinct.setdefault(self.normalise(value), value)
+
+        found: Dict[str, Tuple[int, Any]] = {}
+        if self.cache is not None:
+            cached = self.cache.get_many(self.name, table, column, distinct)
+            found.update((key, entry) for key, entry in cached.items() if entry[0])
+            self.values_cached += len(cached)
+            distinct = {key: value for key, value in distinct.items() if key not in cached}
+
+        queried: Dict[str, Tuple[int, Any]] = {}
+        batch_values = list(distinct.values())
+        for start in range(0, len(batch_values), self.batch_size):
+            batch = batch_values[start:start + self.batch_size]
+            placeholders = ", ".join([self.placeholder] * len(batch))
+            collation = self.fold_case_collation if self.fold_case else ""
+            sql = (f"SELECT {column}, COUNT(*) FROM {table} "
+                   f"WHERE {column}{collation} IN ({placeholders}) GROUP BY {column}")
+            for stored_value, count in self._query(sql, batch):
+                key = self.normalise(stored_value)
+                previous_count, previous_value = queried.get(key, (0, stored_value))
+                queried[key] = (previous_count + count, previous_value)
+        self.values_looked_up += len(batch_values)
+
+        if self.cache is not None:
+            # Values without a match are cached as (0, None)
+            self.cache.put_many(self.name, table, column,
+                                {key: queried.get(key, (0, None)) for key in distinct})
+        found.update(queried)
+        return found
+
+    def column_values(self, table: str, column: str) -> List[Tuple[Any, int]]:
+        """
+        Every distinct value of ``table.column`` with the number of rows holding it.
+
+        Used to build the CandidateIndex of normalised and fuzzy mappings;
+        these lookups bypass the cache.
+        """
+        return self._query(f"SELECT {column}, COUNT(*) FROM {table} GROUP BY {column}", [])
+
+    def stats(self) -> Dict[str, Any]:
+        """Queries run, values looked up and values answered from the cache so far."""
+        return {"queries": self.queries, "values": self.values_looked_up, "cached": self.values_cached,
+                "connections": self.pool.opened}
+
+    def check(self) -> None:
+        """
+        Open (or reuse) a pooled connection to make sure the database can be reached.
+
+        Raises:
+            LookupBackendError: If no connection can be opened
+        """
+        try:
+            with self.pool.connection():
+                pass
+        except LookupBackendError:
+            raise
+        except Exception as e:
+            raise LookupBackendError(f"Could not connect to '{self.name}': {e}") from e
+
+    def close(self) -> None:
+        self.pool.close()
+
+    def _query(self, sql: str, params: List[Any]) -> List[Tuple]:
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, params)
+                self.queries += 1
+                return list(cursor.fetchall())
+            finally:
+                cursor.close()
+
+
+class SqliteLookupBackend(LookupBackend):
+    """
+    Lookups against a SQLite database file with the same batching as MySQL.
+
+    Used for ``driver: sqlite`` connections and as the stand-in for MySQL in tests.
+    SQLite compares exactly unless a column says otherwise, so with
+    ``fold_case`` values are compared with NOCASE (which folds ASCII letters only).
+    """
+
+    placeholder = "?"
+    fold_case_collation = " COLLATE NOCASE"
+
+    def __init__(self, name: str, path: str, batch_size: int = 500, pool_size: int = DEFAULT_POOL_SIZE,
+                 timeout: float = DEFAULT_CONNECT_TIMEOUT, fold_case: bool = False):
+        # SQLite allows a limited number of parameters per statement
+        pool = ConnectionPool(lambda: sqlite3.connect(path, timeout=timeout, check_same_thread=False),
+                              size=pool_size)
+        super().__init__(name, pool, batch_size=min(batch_size, 900), fold_case=fold_case)
+
+
+class MySQLLookupBackend(LookupBackend):
+    """Lookups against a MySQL tenant database through a pymysql connection pool."""
+
+    placeholder = "%s"
+
+    def __init__(self, name: str, settings: Dict[str, Any]):
+        if not PYMYSQL_AVAILABLE:
+            raise LookupBackendError(f"Connection '{name}' needs pymysql (pip install pymysql)")
+
+        def connect():
+            try:
+                return pymysql.connect(
+                    host=settings.get("host", "localhost"),
+                    port=int(settings.get("port", 3306)),
+                    user=settings.get("username"),
+                    password=settings.get("password"),
+                    database=settings.get("database"),
+                    charset=settings.get("charset", "utf8mb4"),
+                    connect_timeout=settings.get("connect_timeout", DEFAULT_CONNECT_TIMEOUT),
+                    read_timeout=settings.get("read_timeout", DEFAULT_READ_TIMEOUT),
+                    write_timeout=settings.get("write_timeout", DEFAULT_READ_TIMEOUT),
+                    autocommit=True,
+                )
+            except pymysql.MySQLError as e:
+                raise LookupBackendError(f"Could not connect to '{name}' at {settings.get('host')}: {e}") from e
+
+        pool = ConnectionPool(connect, size=int(settings.get("pool_size", DEFAULT_POOL_SIZE)),
+                              validate=lambda conn: conn.ping(reconnect=True),
+                              timeout=settings.get("pool_timeout", DEFAULT_POOL_TIMEOUT))
+        super().__init__(name, pool, batch_size=int(settings.get("batch_size", DEFAULT_BATCH_SIZE)),
+                         fold_case=not settings.get("case_sensitive", DEFAULT_CASE_SENSITIVE))
+
+    def _query(self, sql: str, params: List[Any]) -> List[Tuple]:
+        try:
+            return super()._query(sql, params)
+        except pymysql.MySQLError as e:
+            raise LookupBackendError(f"Lookup query on '{self.name}' failed: {e}") from e
+
+
+def create_lookup_backend(name: str, settings: Dict[str, Any]) -> LookupBackend:
+    """
+    Create the backend for a tenant connection.
+
+    Args:
+        name: Connection name from ``tenant.connections``
+        settings: The connection's settings; ``driver`` is "mysql" (the
+            default when a host is given) or "sqlite" (with ``path``).
+            Matching ignores case unless ``case_sensitive`` is true, for either driver
+
+    Raises:
+        LookupBackendError: If a setting or the driver is unknown, or the driver is unavailable
+    """
+    unknown = sorted(key for key in settings if key not in CONNECTION_SETTINGS)
+    if unknown:
+        raise LookupBackendError(f"Connection '{name}' has unknown setting(s) {', '.join(unknown)} "
+                                 f"(expected some of: {', '.join(CONNECTION_SETTINGS)})")
+    driver = (settings.get("driver") or ("mysql" if settings.get("host") else "sqlite")).lower()
+    if driver == "mysql":
+        return MySQLLookupBackend(name, settings)
+    if driver == "sqlite":
+        if not settings.get("path"):
+            raise LookupBackendError(f"Connection '{name}' has no path")
+        return SqliteLookupBackend(name, settings["path"],
+                                   batch_size=int(settings.get("batch_size", 500)),
+                                   pool_size=int(settings.get("pool_size", DEFAULT_POOL_SIZE)),
+                                   fold_case=not settings.get("case_sensitive", DEFAULT_CASE_SENSITIVE))
+    raise LookupBackendError(f"Connection '{name}' has unsupported driver '{driver}'")
+
+
+class LookupBackends:
+    """
+    The backends of one lookup run, created on first use and closed together.
+
+    Usage:
+        backends = LookupBackends(tenant_connections)
+        try:
+            found = backends.get("local_mysql").match_values("users", "email", values)
+        finally:
+            backends.close()
+    """
+
+    def __init__(self, connections: Optional[Dict[str, Dict[str, Any]]] = None, cache=None):
+        self.connections = connections or {}
+        self.cache = cache
+        self._backends: Dict[str, LookupBackend] = {}
+        self._failures: Dict[str, LookupBackendError] = {}
+        self._match_indexes: Dict[Tuple, Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, backend: LookupBackend) -> None:
+        """Use ``backend`` for connection ``name`` (e.g. a SQLite stand-in)."""
+        backend.cache = self.cache
+        self._backends[name] = backend
+
+    def get(self, name: str) -> LookupBackend:
+        """
+        The backend for a tenant connection.
+
+        Raises:
+            LookupBackendError: If the connection isn't configured or has failed
+        """
+        with self._lock:
+            if name in self._failures:
+                raise self._failures[name]
+            if name not in self._backends:
+                if name not in self.connections:
+                    raise LookupBackendError(f"Connection '{name}' is not configured under tenant.connections")
+                backend = create_lookup_backend(name, self.connections[name])
+                backend.cache = self.cache
+                self._backends[name] = backend
+            return self._backends[name]
+
+    def check(self, names: Iterable[str]) -> None:
+        """
+        Make sure every connection in ``names`` is configured and reachable,
+        once, before a run starts querying them.
+
+        Raises:
+            LookupBackendError: Naming every connection that can't be used
+        """
+        problems = []
+        for name in sorted(set(names)):
+            try:
+                self.get(name).check()
+            except LookupBackendError as e:
+                self.fail(name, e)
+                problems.append(str(e))
+        if problems:
+            raise LookupBackendError("; ".join(problems))
+
+    def fail(self, name: str, error: LookupBackendError) -> bool:
+        """
+        Stop using a connection for the rest of the run, so an unreachable
+        database costs one timeout rather than one per record.
+
+        Returns:
+            True the first time the connection fails
+        """
+        with self._lock:
+            first = name not in self._failures
+            self._failures.setdefault(name, error)
+            return first
+
+    def match_index(self, key: Tuple, build: Callable[[], Any]) -> Any:
+        """
+        The CandidateIndex stored under ``key`` (connection, table, column, MatchRule),
+        built with ``build()`` the first time it is needed, so a destination
+        column is read once per run.
+        """
+        with self._lock:
+            if key in self._match_indexes:
+                return self._match_indexes[key]
+        index = build()
+        with self._lock:
+            return self._match_indexes.setdefault(key, index)
+
+    def match_index_stats(self) -> Dict[str, Dict[str, int]]:
+        """Stats of the candidate indexes built, by ``connection:table:column [rule]``."""
+        return {f"{key[0]}:{key[1]}:{key[2]} [{key[3].describe()}]": index.stats()
+                for key, index in self._match_indexes.items()}
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {name: backend.stats() for name, backend in self._backends.items()}
+
+    def close(self) -> None:
+        for backend in self._backends.values():
+            backend.close()
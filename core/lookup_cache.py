@@ -0,0 +1,225 @@
+#!/usr/bin/env python
+"""
+Lookup Cache - Remember tenant database lookups across sessions.
+
+Lookup results are stored in a SQLite file keyed by (connection, table,
+column, value), so values that come up again in a later session or for
+another document type are answered without querying the tenant database.
+Values without a match are cached too, for a shorter time. Entries expire
+after a TTL, the least recently used entries are evicted once the cache
+holds more than ``max_entries``, and entries of a connection or table can
+be dropped explicitly when the tenant data is reloaded.
+"""
+
+import os
+import time
+import sqlite3
+import logging
+import threading
+from typing import Dict, Any, Optional, Iterable, Tuple, Callable
+
+from core.session import OUTPUT_DIR, load_config
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(OUTPUT_DIR, "lookup_cache.db")
+DEFAULT_TTL_HOURS = 24
+DEFAULT_NEGATIVE_TTL_HOURS = 1
+DEFAULT_MAX_ENTRIES = 100000
+
+
+class LookupCache:
+    """
+    Persistent cache of lookup results.
+
+    An entry holds the number of destination rows that matched a value and
+    one matched value: (1, value) is a match, (0, None) a cached miss and a
+    higher count an ambiguous value. The cache is safe to share between threads.
+    """
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, ttl_hours: float = DEFAULT_TTL_HOURS,
+                 negative_ttl_hours: float = DEFAULT_NEGATIVE_TTL_HOURS, max_entries: int = DEFAULT_MAX_ENTRIES,
+                 clock: Callable[[], float] = time.time):
+        self.path = path
+        self.ttl = ttl_hours * 3600
+        self.negative_ttl = negative_ttl_hours * 3600
+        self.max_entries = max(1, max_entries)
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evicted = 0
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('''
+        CREATE TABLE IF NOT EXISTS lookup_cache (
+            connection TEXT NOT NULL,
+            table_name TEXT NOT NULL,
+            column_name TEXT NOT NULL,
+            value_key TEXT NOT NULL,
+            match_count INTEGER NOT NULL,
+            lookup_value,
+            created_at REAL NOT NULL,
+            last_used_at REAL NOT NULL
+        )
+        ''')
+        self._conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_lookup_cache_key "
+                           "ON lookup_cache (connection, table_name, column_name, value_key)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_lookup_cache_last_used ON lookup_cache (last_used_at)")
+        self._conn.commit()
+
+    def get_many(self, connection: str, table: str, column: str, keys: Iterable[str]) -> Dict[str, Tuple[int, Any]]:
+        """
+        Cached results for the given value keys.
+
+        Returns:
+            Dict of key -> (match_count, lookup_value) for keys with a fresh entry
+        """
+        keys = list(keys)
+        now = self.clock()
+        cached = {}
+        with self._lock:
+            # Stay well below SQLite's parameter limit
+            for start in range(0, len(keys), 500):
+                batch = keys[start:start + 500]
+                rows = self._conn.execute(
+                    f"SELECT value_key, match_count, lookup_value, created_at FROM lookup_cache "
+                    f"WHERE connection = ? AND table_name = ? AND column_name = ? "
+                    f"AND value_key IN ({', '.join('?' * len(batch))})",
+                    [connection, table, column] + batch
+                ).fetchall()
+                for value_key, match_count, lookup_value, created_at in rows:
+                    ttl = self.ttl if match_count else self.negative_ttl
+                    if now - created_at < ttl:
+                        cached[value_key] = (match_count, lookup_value)
+            self._conn.executemany(
+                "UPDATE lookup_cache SET last_used_at = ? "
+                "WHERE connection = ? AND table_name = ? AND column_name = ? AND value_key = ?",
+                [(now, connection, table, column, key) for key in cached]
+            )
+            self._conn.commit()
+            self.hits += len(cached)
+            self.misses += len(keys) - len(cached)
+        return cached
+
+    def put_many(self, connection: str, table: str, column: str, entries: Dict[str, Tuple[int, Any]]) -> None:
+        """Store (match_count, lookup_value) results by value key, replacing older entries."""
+        if not entries:
+            return
+        now = self.clock()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO lookup_cache "
+                "(connection, table_name, column_name, value_key, match_count, lookup_value, created_at, last_used_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                [(connection, table, column, key, count, value, now, now) for key, (count, value) in entries.items()]
+            )
+            self.stored += len(entries)
+            self._evict()
+            self._conn.commit()
+
+    def invalidate(self, connection: Optional[str] = None, table: Optional[str] = None) -> int:
+        """
+        Drop cached entries, e.g. after a tenant table was reloaded.
+
+        Args:
+            connection: Only entries of this connection (all connections if None)
+            table: Only entries of this destination table (all tables if None)
+
+        Returns:
+            Number of entries dropped
+        """
+        conditions, params = [], []
+        if connection:
+            conditions.append("connection = ?")
+            params.append(connection)
+        if table:
+            conditions.append("table_name = ?")
+            params.append(table)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        with self._lock:
+            deleted = self._conn.execute(f"DELETE FROM lookup_cache{where}", params).rowcount
+            self._conn.commit()
+        logger.info(f"Dropped {deleted} lookup cache entries"
+                    f"{f' for {connection}' if connection else ''}{f'.{table}' if table else ''}")
+        return deleted
+
+    def stats(self) -> Dict[str, Any]:
+        """Hits, misses, entries stored and evicted during this run."""
+        looked_up = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / looked_up, 3) if looked_up else 0.0,
+            "stored": self.stored,
+            "evicted": self.evicted,
+        }
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _evict(self) -> None:
+        """Drop expired entries, then the least recently used ones above max_entries."""
+        now = self.clock()
+        expired = self._conn.execute(
+            "DELETE FROM lookup_cache WHERE created_at < ? OR (match_count = 0 AND created_at < ?)",
+            (now - self.ttl, now - self.negative_ttl)
+        ).rowcount
+        excess = self._conn.execute("SELECT COUNT(*) FROM lookup_cache").fetchone()[0] - self.max_entries
+        if excess > 0:
+            self._conn.execute(
+                "DELETE FROM lookup_cache WHERE rowid IN "
+                "(SELECT rowid FROM lookup_cache ORDER BY last_used_at LIMIT ?)",
+                (excess,)
+            )
+        self.evicted += expired + max(0, excess)
+
+
+def lookup_cache_from_config(lookups_config: Dict[str, Any]) -> Optional[LookupCache]:
+    """
+    Open the cache configured under ``lookups.cache``, or None if it is disabled.
+
+    Usage:
+        "lookups": {"cache": {"enabled": true, "path": "output/lookup_cache.db", "ttl_hours": 24}}
+    """
+    cache_config = lookups_config.get("cache") or {}
+    if not cache_config.get("enabled", False):
+        return None
+    try:
+        return LookupCache(
+            path=cache_config.get("path") or DEFAULT_CACHE_PATH,
+            ttl_hours=float(cache_config.get("ttl_hours", DEFAULT_TTL_HOURS)),
+            negative_ttl_hours=float(cache_config.get("negative_ttl_hours", DEFAULT_NEGATIVE_TTL_HOURS)),
+            max_entries=int(cache_config.get("max_entries", DEFAULT_MAX_ENTRIES)),
+        )
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"Lookup cache unavailable, looking up without it: {e}")
+        return None
+
+
+def clear_lookup_cache(connection: Optional[str] = None, table: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Drop cached lookups of a tenant connection or table after its data was reloaded.
+
+    Args:
+        connection: Connection name from ``tenant.connections`` (all if None)
+        table: Destination table (all tables if None)
+
+    Returns:
+        Dict with status and the number of entries dropped
+    """
+    cache_config = (load_config().get("lookups", {}) or {}).get("cache") or {}
+    path = cache_config.get("path") or DEFAULT_CACHE_PATH
+    if not os.path.exists(path):
+        return {"status": "success", "deleted": 0, "path": path}
+    cache = LookupCache(path)
+    try:
+        deleted = cache.invalidate(connection, table)
+    finally:
+        cache.close()
+    return {"status": "success", "deleted": deleted, "path": path}
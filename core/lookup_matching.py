@@ -0,0 +1,188 @@
+#!/usr/bin/env python
+"""
+Lookup Matching - Normalised and fuzzy matching of lookup values.
+
+A mapping can compare values after normalising both sides (trimming or
+removing whitespace, keeping only digits, folding case, dropping leading zeros) and
+can accept destination values within a Levenshtein distance of the source
+value. Such mappings match against a CandidateIndex: the destination
+column is read once per run and its values are indexed by normalised key.
+For fuzzy matching every key is also indexed under the strings left after
+deleting up to ``max_distance`` of its characters; two keys within that
+distance share at least one of these strings, so a source value is only
+compared with the few keys it shares one with instead of with every
+destination value.
+"""
+
+import logging
+from itertools import combinations
+from typing import Dict, List, Any, Optional, Iterable, Tuple, NamedTuple, Set
+
+# python-levenshtein is optional; a pure Python distance is used without it
+try:
+    import Levenshtein
+    LEVENSHTEIN_AVAILABLE = True
+except ImportError:
+    Levenshtein = None
+    LEVENSHTEIN_AVAILABLE = False
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+NORMALISERS = {
+    "trim": str.strip,
+    "no_spaces": lambda text: "".join(text.split()),
+    "digits": lambda text: "".join(char for char in text if char.isdigit()),
+    "casefold": str.casefold,
+    "strip_zeros": lambda text: text.lstrip("0"),
+}
+# The deletion index grows with the number of deletions per key
+MAX_DISTANCE = 2
+
+
+class MatchRule(NamedTuple):
+    """How a mapping compares source and destination values."""
+    normalise: Tuple[str, ...] = ()
+    max_distance: int = 0
+
+    def key(self, value: Any) -> str:
+        """The normalised key of a source or destination value."""
+        text = str(value)
+        for name in self.normalise:
+            text = NORMALISERS[name](text)
+        return text
+
+    def describe(self) -> str:
+        parts = list(self.normalise)
+        if self.max_distance:
+            parts.append(f"max_distance {self.max_distance}")
+        return ", ".join(parts)
+
+
+def compile_match_rule(options: Dict[str, Any]) -> Optional[MatchRule]:
+    """
+    The match rule of a mapping entry, or None for exact matching.
+
+    Args:
+        options: The mapping entry; reads ``normalise`` (a name or list of
+            names from NORMALISERS, applied in order) and ``max_distance``
+
+    Raises:
+        ValueError: If a normaliser is unknown or the distance is out of range
+    """
+    normalise = options.get("normalise") or []
+    if isinstance(normalise, str):
+        normalise = [normalise]
+    unknown = [name for name in normalise if name not in NORMALISERS]
+    if unknown:
+        raise ValueError(f"unknown normaliser '{unknown[0]}' (expected one of: {', '.join(NORMALISERS)})")
+
+    max_distance = options.get("max_distance", 0)
+    if not isinstance(max_distance, int) or isinstance(max_distance, bool) or not 0 <= max_distance <= MAX_DISTANCE:
+        raise ValueError(f"max_distance must be an integer from 0 to {MAX_DISTANCE}")
+
+    if not normalise and not max_distance:
+        return None
+    return MatchRule(tuple(normalise), max_distance)
+
+
+def levenshtein(a: str, b: str, max_distance: int) -> int:
+    """Edit distance between two strings; any distance above ``max_distance`` is returned as max_distance + 1."""
+    if LEVENSHTEIN_AVAILABLE:
+        return Levenshtein.distance(a, b, score_cutoff=max_distance)
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, start=1):
+        current = [i]
+        for j, char_b in enumerate(b, start=1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b)))
+        # Every later row is at least this row's minimum
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return min(previous[-1], max_distance + 1)
+
+
+def _deletions(key: str, max_distance: int) -> Set[str]:
+    """The key with every combination of up to ``max_distance`` characters deleted."""
+    variants = {key}
+    for count in range(1, min(max_distance, len(key)) + 1):
+        for positions in combinations(range(len(key)), count):
+            variants.add("".join(char for index, char in enumerate(key) if index not in positions))
+    return variants
+
+
+class CandidateIndex:
+    """
+    Destination values of one column by normalised key.
+
+    Usage:
+        index = CandidateIndex(rule, cursor.execute("SELECT email, COUNT(*) FROM users GROUP BY email"))
+        match = index.match(" Jane@Example.com")  # (stored value, distance) or None
+    """
+
+    def __init__(self, rule: MatchRule, rows: Iterable[Tuple[Any, int]]):
+        """
+        Args:
+            rule: The mapping's MatchRule
+            rows: (stored value, number of rows holding it) for the destination column
+        """
+        self.rule = rule
+        # key -> (number of destination rows, first stored value)
+        self.keys: Dict[str, Tuple[int, Any]] = {}
+        for stored_value, count in rows:
+            if stored_value is None:
+                continue
+            key = rule.key(stored_value)
+            if not key:
+                continue
+            previous_count, previous_value = self.keys.get(key, (0, stored_value))
+            self.keys[key] = (previous_count + count, previous_value)
+
+        self.deletions: Dict[str, List[str]] = {}
+        if rule.max_distance:
+            for key in self.keys:
+                for variant in _deletions(key, rule.max_distance):
+                    self.deletions.setdefault(variant, []).append(key)
+        self.comparisons = 0
+
+    def match(self, value: Any) -> Optional[Tuple[Any, int]]:
+        """
+        The destination value a source value matches.
+
+        A value matches the key it normalises to; without one, the closest
+        keys within ``max_distance``. It only matches if exactly one
+        destination row holds that key (or those keys), so ambiguous values
+        don't match.
+
+        Returns:
+            Tuple of (stored value, edit distance), or None
+        """
+        key = self.rule.key(value)
+        if not key:
+            return None
+        if key in self.keys:
+            count, stored_value = self.keys[key]
+            return (stored_value, 0) if count == 1 else None
+        if not self.rule.max_distance:
+            return None
+
+        candidates = set()
+        for variant in _deletions(key, self.rule.max_distance):
+            candidates.update(self.deletions.get(variant, ()))
+        best_distance, best = self.rule.max_distance + 1, []
+        for candidate in candidates:
+            self.comparisons += 1
+            distance = levenshtein(key, candidate, self.rule.max_distance)
+            if distance < best_distance:
+                best_distance, best = distance, [candidate]
+            elif distance == best_distance:
+                best.append(candidate)
+        if best_distance > self.rule.max_distance or sum(self.keys[candidate][0] for candidate in best) != 1:
+            return None
+        return self.keys[best[0]][1], best_distance
+
+    def stats(self) -> Dict[str, int]:
+        """Indexed keys and deletion variants, and fuzzy comparisons made so far."""
+        return {"keys": len(self.keys), "variants": len(self.deletions), "comparisons": self.comparisons}
@@ -7,29 +7,92 @@ to foreign keys through the specified mapping types.
 """
 
 import os
+import re
 import json
+import asyncio
+import itertools
 import logging
 import sqlite3
-from typing import Dict, List, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Any, Optional, Tuple, NamedTuple
 from datetime import datetime
 import time
 
 from core.session import get_current_session, get_session_dir, load_config
-from core.importer import get_table_data
+from core.importer import get_table_name
+from core.html_generator import create_generated_indexes
+from core.lookup_backends import LookupBackends, LookupBackendError
+from core.lookup_cache import lookup_cache_from_config
+from core.lookup_matching import CandidateIndex, MatchRule, compile_match_rule
+from core.lookup_audit import (
+    LookupAudit, create_lookup_audit, AUDIT_MODES, AUDIT_MATCHED, AUDIT_UNMATCHED, AUDIT_INVALID_JSON, AUDIT_NO_MAPPINGS
+)
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Mapping types, in the order they are tried
+LOOKUP_TYPES = ("column_to_column", "type_to_column")
+# Destination connections lookups can query when no tenant databases are configured
+SUPPORTED_DESTINATIONS = ("local_sqlite", "local_mysql")
+# Destination tables and columns are put into SQL, so they must be plain identifiers
+_IDENTIFIER = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+# Distinct source values of one mapping during set-based resolution
+LOOKUP_VALUES_TABLE_SQL = "CREATE TEMP TABLE IF NOT EXISTS lookup_values (id INTEGER PRIMARY KEY, value)"
+# Lookup batches in flight per tenant database in the concurrent mode
+DEFAULT_CONNECTION_CONCURRENCY = 4
+# Unresolved records read and resolved at a time
+DEFAULT_PAGE_SIZE = 5000
 
-def resolve_lookups(session_hash: Optional[str] = None) -> Dict[str, Any]:
+
+class LookupPlan(NamedTuple):
+    """One tenant mapping, parsed and checked once per run."""
+    lookup_type: str
+    mapping: str
+    source_connection: str
+    source_table: str
+    source_key: str  # Column name (column_to_column) or field type (type_to_column)
+    dest_connection: str
+    dest_table: str
+    dest_column: str
+    match: Optional[MatchRule] = None  # Normalised or fuzzy matching; exact if None
+
+
+def resolve_lookups(session_hash: Optional[str] = None, bulk: Optional[bool] = None,
+                    concurrent: Optional[bool] = None, audit: Optional[str] = None) -> Dict[str, Any]:
     """
     Resolve lookups for all unresolved records in generated_{table_hash}.
     
     This function implements Phase 2 of the document generation process,
     where lookups are performed to match generated documents with foreign keys.
     
+    In bulk mode (the default) each mapping is resolved for all records at
+    once: the distinct source values go into a temp table and are matched
+    with a single join, and the audit rows and updates are written in
+    batches. The audit rows, exceptions and updates are the same as those of
+    the per-record mode, which queries the destination once per record and mapping.
+    
+    The concurrent mode is set-based too, but looks up all mappings at once,
+    with up to ``lookups.concurrency`` batches in flight per tenant database,
+    and writes the same results as the bulk mode.
+    
+    With ``lookups.cache.enabled``, tenant database lookups are cached across
+    sessions (see core.lookup_cache); hits and misses are under ``cache``.
+    
+    The compact audit (see core.lookup_audit) logs one row of integers per
+    record instead of a row per attempt; views rebuild the full audit tables.
+    
+    Unresolved records are read ``lookups.page_size`` at a time and each page
+    is committed before the next is read, so memory use doesn't grow with
+    the session. Lookups read through one connection; audit rows and
+    updates are written through a second one.
+    
     Args:
         session_hash: Session hash, if None uses current session
+        bulk: Resolve set-based; defaults to ``lookups.bulk`` in the config (on)
+        concurrent: Run the lookups of all mappings concurrently; defaults to
+            ``lookups.concurrent`` in the config (off)
+        audit: "full" or "compact"; defaults to ``lookups.audit`` in the config ("full")
         
     Returns:
         Dict containing resolution results
@@ -45,7 +108,7 @@ def resolve_lookups(session_hash: Optional[str] = None) -> Dict[str, Any]:
         raise ValueError("No active session found")
     
     # Get the table hash and session directory
-    table_hash, _, _ = get_table_data(session_hash)
+    table_hash = get_table_name(session_hash)
     session_dir = get_session_dir(session_hash)
     
     # Initialize database connection
@@ -75,17 +138,33 @@ def resolve_lookups(session_hash: Optional[str] = None) -> Dict[str, Any]:
     if not document_type:
         raise ValueError("Document type not found in status.json")
     
-    # Load tenant mappings
+    # Load tenant mappings and parse them once, before any record is looked at
     tenant_mappings = _load_tenant_mappings(document_type)
+    tenant_databases = _load_tenant_databases()
+    plans, invalid_mappings = compile_lookup_plans(tenant_mappings, tenant_databases)
+    lookups_config = _load_lookups_config()
+    if bulk is None:
+        bulk = bool(lookups_config.get("bulk", True))
+    if concurrent is None:
+        concurrent = bool(lookups_config.get("concurrent", False))
+    # The concurrent mode is set-based
+    bulk = bulk or concurrent
+    if audit is None:
+        audit = lookups_config.get("audit", "full")
+    if audit not in AUDIT_MODES:
+        conn.close()
+        raise ValueError(f"Unknown lookup audit mode '{audit}' (expected one of: {', '.join(AUDIT_MODES)})")
     
-    # Get unresolved records
-    cursor.execute(
-        f"SELECT id, document_type, mime_type, input_file, row, data FROM {generated_table_name} "
-        f"WHERE lookup_type IS NULL"
-    )
-    unresolved_records = cursor.fetchall()
+    # Make sure local destination columns are indexed and check that lookups use the index
+    lookup_indexes = prepare_lookup_indexes(cursor, plans, create=lookups_config.get("create_indexes", True), bulk=bulk)
+    conn.commit()
+    
+    # Stream unresolved records in pages of ids, oldest first
+    page_size = max(1, int(lookups_config.get("page_size", DEFAULT_PAGE_SIZE)))
+    pages = _unresolved_pages(cursor, generated_table_name, page_size)
+    first_page = next(pages, None)
     
-    if not unresolved_records:
+    if first_page is None:
         logger.info("No unresolved records found")
         conn.close()
         return {
@@ -93,12 +172,120 @@ def resolve_lookups(session_hash: Optional[str] = None) -> Dict[str, Any]:
             "message": "No unresolved records found",
             "records_processed": 0,
             "successful_lookups": 0,
-            "exceptions": 0
+            "exceptions": 0,
+            "invalid_mappings": invalid_mappings,
+            "lookup_indexes": lookup_indexes
         }
     
-    logger.info(f"Found {len(unresolved_records)} unresolved records")
+    # Lookups read through conn while audit rows and updates go through their own connection
+    write_conn = sqlite3.connect(db_path, timeout=30)
+    write_cursor = write_conn.cursor()
+    
+    tables = (generated_table_name, lookup_table_name, exceptions_table_name)
+    lookup_audit = create_lookup_audit(write_cursor, tables, plans, audit)
+    lookup_cache = lookup_cache_from_config(lookups_config)
+    backends = LookupBackends(tenant_databases, cache=lookup_cache)
+    records_processed = 0
+    successful_lookups = 0
+    exceptions = 0
+    try:
+        # A connection that can't be used fails the run here rather than leaving every record unmatched
+        try:
+            backends.check(plan.dest_connection for plan in plans if plan.dest_connection != "local_sqlite")
+        except LookupBackendError as e:
+            raise ValueError(f"Lookup connections are not usable: {e}") from e
+        for page in itertools.chain([first_page], pages):
+            if concurrent:
+                page_successful, page_exceptions = _resolve_records_async(
+                    cursor, tables, page, plans, document_type, backends,
+                    concurrency=int(lookups_config.get("concurrency", DEFAULT_CONNECTION_CONCURRENCY)),
+                    audit=lookup_audit, write_cursor=write_cursor
+                )
+            elif bulk:
+                page_successful, page_exceptions = _resolve_records_bulk(
+                    cursor, tables, page, plans, document_type, backends,
+                    audit=lookup_audit, write_cursor=write_cursor
+                )
+            else:
+                page_successful, page_exceptions = _resolve_records_per_record(
+                    cursor, tables, page, plans, document_type, backends,
+                    audit=lookup_audit, write_cursor=write_cursor
+                )
+            records_processed += len(page)
+            successful_lookups += page_successful
+            exceptions += page_exceptions
+            
+            # End the read transaction the temp-table lookups opened, or it would block the write commit
+            conn.commit()
+            write_conn.commit()
+            logger.info(f"Resolved {records_processed} unresolved records so far")
+    finally:
+        backends.close()
+        if lookup_cache:
+            lookup_cache.close()
+        write_conn.close()
+        conn.close()
+    
+    return {
+        "status": "success",
+        "records_processed": records_processed,
+        "successful_lookups": successful_lookups,
+        "exceptions": exceptions,
+        "bulk": bulk,
+        "concurrent": concurrent,
+        "audit": audit,
+        "page_size": page_size,
+        "invalid_mappings": invalid_mappings,
+        "lookup_indexes": lookup_indexes,
+        "backends": backends.stats(),
+        "match_indexes": backends.match_index_stats(),
+        "cache": lookup_cache.stats() if lookup_cache else None
+    }
+
+
+def _unresolved_pages(cursor, generated_table_name, page_size):
+    """
+    Yield unresolved records in pages of ``page_size``, in id order.
+    
+    Each page starts after the last id of the previous one, so records
+    resolved in between don't shift the pages, and the query is answered
+    from the partial index on unresolved records.
+    
+    Yields:
+        Lists of (id, document_type, mime_type, input_file, row, data) tuples
+    """
+    last_id = 0
+    while True:
+        cursor.execute(
+            f"SELECT id, document_type, mime_type, input_file, row, data FROM {generated_table_name} "
+            f"WHERE lookup_type IS NULL AND id > ? ORDER BY id LIMIT ?",
+            (last_id, page_size)
+        )
+        page = cursor.fetchall()
+        if not page:
+            return
+        yield page
+        last_id = page[-1][0]
+
+
+def _resolve_records_per_record(cursor, tables, unresolved_records, plans, document_type, backends=None,
+                                audit=None, write_cursor=None):
+    """
+    Resolve records one at a time, querying the destination for every record and mapping.
+    
+    Args:
+        backends: LookupBackends for destinations other than local_sqlite
+        audit: LookupAudit that records attempts and exceptions (full audit if None)
+        write_cursor: Cursor for updates, if not ``cursor`` (which does the lookups)
+    
+    Returns:
+        Tuple of (successful_lookups, exceptions)
+    """
+    generated_table_name = tables[0]
+    backends = backends or LookupBackends()
+    write_cursor = write_cursor or cursor
+    audit = audit or LookupAudit(write_cursor, tables, plans)
     
-    # Process each unresolved record
     successful_lookups = 0
     exceptions = 0
     
@@ -110,109 +297,689 @@ def resolve_lookups(session_hash: Optional[str] = None) -> Dict[str, Any]:
         except json.JSONDecodeError:
             logger.error(f"Invalid JSON data for record {record_id}")
             exceptions += 1
-            _log_exception(
-                cursor,
-                exceptions_table_name,
+            exception_id = audit.exception(
                 "Invalid JSON data",
                 f"Failed to parse data JSON for record {record_id}",
                 input_file,
                 row_num,
-                data_json
+                data_json,
+                record_id
             )
+            audit.link_exception(None, record_id, exception_id)
+            audit.finish(record_id, 0, AUDIT_INVALID_JSON)
             continue
         
-        # Determine lookup methods to try
-        lookup_methods = []
-        if "column_to_column" in tenant_mappings:
-            lookup_methods.append("column_to_column")
-        if "type_to_column" in tenant_mappings:
-            lookup_methods.append("type_to_column")
-        
-        if not lookup_methods:
+        if not plans:
             logger.warning(f"No lookup methods defined for document type {document_type}")
             exceptions += 1
-            _log_exception(
-                cursor,
-                exceptions_table_name,
+            exception_id = audit.exception(
                 "No lookup methods defined",
-                f"No column_to_column or type_to_column mappings found for {document_type}",
+                f"No valid column_to_column or type_to_column mappings found for {document_type}",
                 input_file,
                 row_num,
-                data_json
+                data_json,
+                record_id
             )
+            audit.link_exception(None, record_id, exception_id)
+            audit.finish(record_id, 0, AUDIT_NO_MAPPINGS)
             continue
         
-        # Try each lookup method
+        # Try each mapping in order
         lookup_successful = False
         
-        for lookup_type in lookup_methods:
-            mappings = tenant_mappings.get(lookup_type, [])
+        for position, plan in enumerate(plans):
+            # Log the lookup attempt
+            lookup_attempt_id = audit.attempt(record_id, position)
             
-            for mapping in mappings:
-                # Log the lookup attempt
-                action = f"Trying {lookup_type} mapping: {mapping}"
-                lookup_attempt_id = _log_lookup_attempt(cursor, lookup_table_name, record_id, action)
+            try:
+                # Attempt the lookup
+                result = _perform_lookup(cursor, plan, data, backends)
                 
-                try:
-                    # Attempt the lookup
-                    result = _perform_lookup(cursor, lookup_type, mapping, data, table_hash)
+                if result:
+                    # Successful lookup
+                    lookup_value, lookup_match = result
                     
-                    if result:
-                        # Successful lookup
-                        lookup_value, lookup_match = result
-                        
-                        # Update the generated record
-                        _update_generated_record(
-                            cursor, 
-                            generated_table_name, 
-                            record_id, 
-                            lookup_type, 
-                            mapping, 
-                            lookup_match, 
-                            lookup_value
-                        )
-                        
-                        successful_lookups += 1
-                        lookup_successful = True
-                        logger.info(f"Successful lookup for record {record_id} using {lookup_type}")
-                        break  # Stop trying other mappings
-                    
-                except Exception as e:
-                    # Log the exception
-                    logger.error(f"Error during lookup: {e}")
-                    exception_id = _log_exception(
-                        cursor,
-                        exceptions_table_name,
-                        f"Error during {lookup_type} lookup",
-                        str(e),
-                        input_file,
-                        row_num,
-                        data_json
+                    # Update the generated record
+                    _update_generated_record(
+                        write_cursor, 
+                        generated_table_name, 
+                        record_id, 
+                        plan.lookup_type, 
+                        plan.mapping, 
+                        lookup_match, 
+                        lookup_value
                     )
                     
-                    # Update the lookup attempt with the exception ID
-                    cursor.execute(
-                        f"UPDATE {lookup_table_name} SET tenant_lookup_exceptions_id = ? WHERE id = ?",
-                        (exception_id, lookup_attempt_id)
-                    )
-            
-            if lookup_successful:
-                break  # Stop trying other lookup types
+                    successful_lookups += 1
+                    lookup_successful = True
+                    audit.finish(record_id, position + 1, AUDIT_MATCHED)
+                    logger.info(f"Successful lookup for record {record_id} using {plan.lookup_type}")
+                    break  # Stop trying other mappings
+                
+            except Exception as e:
+                # Log the exception
+                logger.error(f"Error during lookup: {e}")
+                exception_id = audit.exception(
+                    f"Error during {plan.lookup_type} lookup",
+                    str(e),
+                    input_file,
+                    row_num,
+                    data_json,
+                    record_id
+                )
+                
+                # Update the lookup attempt with the exception ID
+                audit.link_exception(lookup_attempt_id, record_id, exception_id)
         
         if not lookup_successful:
             exceptions += 1
+            audit.finish(record_id, len(plans), AUDIT_UNMATCHED)
             logger.warning(f"No successful lookup for record {record_id}")
     
-    # Commit all changes
-    conn.commit()
-    conn.close()
+    audit.flush()
+    return successful_lookups, exceptions
+
+
+def _resolve_records_bulk(cursor, tables, unresolved_records, plans, document_type, backends=None,
+                         audit=None, write_cursor=None):
+    """
+    Resolve records set-based, one destination query per mapping.
     
-    return {
-        "status": "success",
-        "records_processed": len(unresolved_records),
-        "successful_lookups": successful_lookups,
-        "exceptions": exceptions
-    }
+    Mappings are tried in the same order as in the per-record mode: each
+    mapping is resolved for all records that no earlier mapping matched.
+    The audit rows are then written in record order, so they come out the
+    same as those of the per-record mode. Remote destinations are queried
+    in batches of ``batch_size`` values instead of a single join.
+    
+    Args:
+        backends: LookupBackends for destinations other than local_sqlite
+        audit: LookupAudit that records attempts and exceptions (full audit if None)
+        write_cursor: Cursor for updates, if not ``cursor`` (which does the lookups)
+    
+    Returns:
+        Tuple of (successful_lookups, exceptions)
+    """
+    backends = backends or LookupBackends()
+    write_cursor = write_cursor or cursor
+    audit = audit or LookupAudit(write_cursor, tables, plans)
+    records, exceptions = _prepare_records(unresolved_records, plans, document_type, audit)
+    
+    # Resolve mapping by mapping; a record drops out at its first match
+    matches: List[Dict[int, Tuple[Any, str]]] = []
+    pending = records
+    for plan in plans:
+        mapping_matches = _bulk_lookup(cursor, plan, pending, backends) if pending else {}
+        matches.append(mapping_matches)
+        pending = [(record_id, data) for record_id, data in pending if record_id not in mapping_matches]
+    
+    successful_lookups, unresolved = _write_resolutions(write_cursor, tables[0], records, plans, matches, audit)
+    logger.info(f"Bulk lookup resolution: {successful_lookups} of {len(unresolved_records)} records resolved "
+                f"with {len(plans)} mappings")
+    return successful_lookups, exceptions + unresolved
+
+
+def _resolve_records_async(cursor, tables, unresolved_records, plans, document_type, backends=None,
+                           concurrency=DEFAULT_CONNECTION_CONCURRENCY, audit=None, write_cursor=None):
+    """
+    Resolve records set-based with the lookups of all mappings running concurrently.
+    
+    Every mapping is looked up for every record at the same time instead of
+    only for the records earlier mappings left unmatched; this costs extra
+    queries for records an earlier mapping matches, but remote round trips
+    overlap instead of adding up. Batches for tenant databases run in worker
+    threads, at most ``concurrency`` at a time per connection; local_sqlite
+    lookups run on the session connection meanwhile. Once every lookup has
+    finished, the first matching mapping of each record wins and the audit
+    rows and updates are written by this thread alone, in record order, so
+    the result is the same as in the bulk mode whatever order lookups finish in.
+    
+    Args:
+        backends: LookupBackends for destinations other than local_sqlite
+        audit: LookupAudit that records attempts and exceptions (full audit if None)
+        write_cursor: Cursor for updates, if not ``cursor`` (which does the lookups)
+        concurrency: Batches in flight per tenant database connection
+    
+    Returns:
+        Tuple of (successful_lookups, exceptions)
+    """
+    backends = backends or LookupBackends()
+    write_cursor = write_cursor or cursor
+    audit = audit or LookupAudit(write_cursor, tables, plans)
+    records, exceptions = _prepare_records(unresolved_records, plans, document_type, audit)
+    
+    matches = asyncio.run(_lookup_all_async(cursor, plans, records, backends, max(1, concurrency))) if records else []
+    
+    successful_lookups, unresolved = _write_resolutions(write_cursor, tables[0], records, plans, matches, audit)
+    logger.info(f"Concurrent lookup resolution: {successful_lookups} of {len(unresolved_records)} records resolved "
+                f"with {len(plans)} mappings")
+    return successful_lookups, exceptions + unresolved
+
+
+async def _lookup_all_async(cursor, plans, records, backends, concurrency):
+    """
+    Look up every mapping for all records concurrently.
+    
+    Returns:
+        One dict of record_id -> (lookup_value, lookup_match) per plan, in plan order
+    """
+    connections = {plan.dest_connection for plan in plans if plan.dest_connection != "local_sqlite"}
+    semaphores = {name: asyncio.Semaphore(concurrency) for name in connections}
+    executor = ThreadPoolExecutor(max_workers=max(1, concurrency * len(connections)),
+                                  thread_name_prefix="lookup")
+    asyncio.get_running_loop().set_default_executor(executor)
+    
+    source_values = [_lookup_source_values(plan, records) for plan in plans]
+    
+    # Start the remote lookups first so they run while the local ones are matched
+    remote = {index: asyncio.ensure_future(_backend_lookup_async(backends, plan, values, semaphores[plan.dest_connection]))
+              for index, (plan, values) in enumerate(zip(plans, source_values))
+              if plan.dest_connection != "local_sqlite"}
+    matches: List[Dict[int, Tuple[Any, str]]] = []
+    for index, (plan, values) in enumerate(zip(plans, source_values)):
+        if plan.dest_connection == "local_sqlite":
+            if plan.match:
+                matches.append(_match_candidates(cursor, plan, values, backends))
+            else:
+                matches.append(_match_local_sqlite(cursor, plan, values))
+            # Give queued batches a chance to start
+            await asyncio.sleep(0)
+        else:
+            matches.append({})
+    
+    for index, task in remote.items():
+        matches[index] = await task
+    return matches
+
+
+async def _backend_lookup_async(backends, plan, source_values, semaphore):
+    """Look up a mapping in a tenant database, its batches running concurrently."""
+    if not source_values:
+        return {}
+    if plan.match:
+        # One read of the destination column, then matching in memory
+        async with semaphore:
+            return await asyncio.to_thread(_match_candidates, None, plan, source_values, backends)
+    try:
+        backend = backends.get(plan.dest_connection)
+    except LookupBackendError as e:
+        if backends.fail(plan.dest_connection, e):
+            logger.error(f"Lookups on '{plan.dest_connection}' disabled for this run: {e}")
+        return {}
+    
+    # Distinct values split into one batch per query
+    distinct = {}
+    for value in source_values.values():
+        distinct.setdefault(backend.normalise(value), value)
+    values = list(distinct.values())
+    
+    async def run_batch(batch):
+        async with semaphore:
+            return await asyncio.to_thread(backend.match_values, plan.dest_table, plan.dest_column, batch)
+    
+    batches = [values[start:start + backend.batch_size] for start in range(0, len(values), backend.batch_size)]
+    results = await asyncio.gather(*(run_batch(batch) for batch in batches), return_exceptions=True)
+    found = {}
+    for result in results:
+        if isinstance(result, LookupBackendError):
+            if backends.fail(plan.dest_connection, result):
+                logger.error(f"Lookups on '{plan.dest_connection}' disabled for this run: {result}")
+            return {}
+        if isinstance(result, BaseException):
+            raise result
+        found.update(result)
+    return _match_backend_values(backend, source_values, found)
+
+
+def _prepare_records(unresolved_records, plans, document_type, audit):
+    """
+    Parse unresolved records for set-based resolution.
+    
+    Records that can't be looked up at all are logged as in the per-record mode.
+    
+    Returns:
+        Tuple of (list of (record_id, data), number of exceptions logged)
+    """
+    exceptions = 0
+    records = []
+    for record_id, doc_type, mime_type, input_file, row_num, data_json in unresolved_records:
+        try:
+            data = json.loads(data_json)
+        except json.JSONDecodeError:
+            logger.error(f"Invalid JSON data for record {record_id}")
+            exceptions += 1
+            exception_id = audit.exception("Invalid JSON data", f"Failed to parse data JSON for record {record_id}",
+                                           input_file, row_num, data_json, record_id)
+            audit.link_exception(None, record_id, exception_id)
+            audit.finish(record_id, 0, AUDIT_INVALID_JSON)
+            continue
+        if not plans:
+            logger.warning(f"No lookup methods defined for document type {document_type}")
+            exceptions += 1
+            exception_id = audit.exception("No lookup methods defined",
+                                           f"No valid column_to_column or type_to_column mappings found for {document_type}",
+                                           input_file, row_num, data_json, record_id)
+            audit.link_exception(None, record_id, exception_id)
+            audit.finish(record_id, 0, AUDIT_NO_MAPPINGS)
+            continue
+        records.append((record_id, data))
+    return records, exceptions
+
+
+def _write_resolutions(cursor, generated_table_name, records, plans, matches, audit):
+    """
+    Write the audit trail and updates of set-based resolution.
+    
+    Each record takes its first matching mapping. Rows are written in the
+    order the per-record mode would write them.
+    
+    Args:
+        matches: One dict of record_id -> (lookup_value, lookup_match) per plan
+        audit: LookupAudit the attempts are recorded with
+    
+    Returns:
+        Tuple of (records resolved, records left unresolved)
+    """
+    successful_lookups = 0
+    unresolved = 0
+    updates = []
+    for record_id, _ in records:
+        for position, (plan, mapping_matches) in enumerate(zip(plans, matches)):
+            if record_id in mapping_matches:
+                lookup_value, lookup_match = mapping_matches[record_id]
+                updates.append((plan.lookup_type, plan.mapping, lookup_match, lookup_value, record_id))
+                audit.attempts(record_id, position + 1)
+                audit.finish(record_id, position + 1, AUDIT_MATCHED)
+                successful_lookups += 1
+                break
+        else:
+            audit.attempts(record_id, len(plans))
+            audit.finish(record_id, len(plans), AUDIT_UNMATCHED)
+            unresolved += 1
+    
+    attempts_written = audit.flush()
+    cursor.executemany(
+        f"UPDATE {generated_table_name} "
+        f"SET lookup_type = ?, lookup = ?, lookup_match = ?, lookup_value = ? "
+        f"WHERE id = ?",
+        updates
+    )
+    logger.info(f"{attempts_written} lookup attempts logged")
+    return successful_lookups, unresolved
+
+
+def compile_lookup_plan(lookup_type: str, mapping: str, destinations: Optional[Tuple[str, ...]] = None) -> LookupPlan:
+    """
+    Parse a mapping string into a LookupPlan.
+    
+    The format is ``<connection>:<table>:<source> = <connection>:<table>:<column>``.
+    For column_to_column mappings the source is a column name (quotes are
+    stripped); for type_to_column mappings it is a field type.
+    
+    A mapping can also be a dict with the mapping string under ``mapping``
+    and the match options ``normalise`` and ``max_distance`` (see
+    core.lookup_matching); the options are appended to the plan's mapping
+    so the audit shows how a value was matched.
+    
+    Args:
+        destinations: Destination connections that can be queried, defaults to SUPPORTED_DESTINATIONS
+    
+    Raises:
+        ValueError: If the mapping is malformed or can't be looked up
+    """
+    match = None
+    if isinstance(mapping, dict):
+        match = compile_match_rule(mapping)
+        mapping = mapping.get("mapping")
+    if not isinstance(mapping, str) or mapping.count('=') != 1:
+        raise ValueError("expected '<connection>:<table>:<source> = <connection>:<table>:<column>'")
+    source_side, dest_side = (side.strip() for side in mapping.split('='))
+    source_parts = source_side.split(':', 2)
+    dest_parts = [part.strip() for part in dest_side.split(':')]
+    if len(source_parts) != 3 or len(dest_parts) != 3:
+        raise ValueError("each side needs exactly <connection>:<table>:<column>")
+    
+    source_key = source_parts[2].strip()
+    if lookup_type == "column_to_column":
+        source_key = source_key.strip("'\"")
+    if not source_key:
+        raise ValueError("the source column or type is empty")
+    
+    dest_connection, dest_table, dest_column = dest_parts
+    destinations = destinations or SUPPORTED_DESTINATIONS
+    if dest_connection not in destinations:
+        raise ValueError(f"unsupported destination connection '{dest_connection}' "
+                         f"(supported: {', '.join(destinations)})")
+    for name in (dest_table, dest_column):
+        if not _IDENTIFIER.match(name):
+            raise ValueError(f"'{name}' is not a valid table or column name")
+    
+    if match:
+        mapping = f"{mapping} [{match.describe()}]"
+    return LookupPlan(lookup_type, mapping, source_parts[0].strip(), source_parts[1].strip(), source_key,
+                      dest_connection, dest_table, dest_column, match)
+
+
+def compile_lookup_plans(tenant_mappings: Dict[str, List[str]],
+                         tenant_databases: Optional[Dict[str, Any]] = None) -> Tuple[List[LookupPlan], List[Dict[str, str]]]:
+    """
+    Compile a document type's tenant mappings into plans, in the order they are tried.
+    
+    Every bad mapping is logged once here and left out of the run.
+    
+    Args:
+        tenant_mappings: Mapping strings by lookup type
+        tenant_databases: ``tenant.connections`` from the config; when given, a
+            destination must be local_sqlite or one of these connections
+    
+    Returns:
+        Tuple of (plans, invalid mappings as dicts with lookup_type, mapping and error)
+    """
+    destinations = None
+    if tenant_databases:
+        destinations = ("local_sqlite",) + tuple(name for name in tenant_databases if name != "local_sqlite")
+    plans = []
+    invalid = []
+    for lookup_type in LOOKUP_TYPES:
+        for mapping in tenant_mappings.get(lookup_type, []):
+            try:
+                plans.append(compile_lookup_plan(lookup_type, mapping, destinations))
+            except ValueError as e:
+                logger.error(f"Skipping invalid {lookup_type} mapping '{mapping}': {e}")
+                invalid.append({"lookup_type": lookup_type, "mapping": str(mapping), "error": str(e)})
+    return plans, invalid
+
+
+def _bulk_lookup(cursor, plan, records, backends):
+    """
+    Look up one mapping for many records.
+    
+    Args:
+        records: List of (record_id, data) tuples
+        backends: LookupBackends for destinations other than local_sqlite
+    
+    Returns:
+        Dict of record_id -> (lookup_value, lookup_match) for records with exactly one match
+    """
+    source_values = _lookup_source_values(plan, records)
+    if plan.match:
+        return _match_candidates(cursor, plan, source_values, backends)
+    if plan.dest_connection != "local_sqlite":
+        return _bulk_query_backend(backends, plan, source_values)
+    return _match_local_sqlite(cursor, plan, source_values)
+
+
+def _lookup_source_values(plan, records):
+    """
+    A mapping's source value for each record.
+    
+    Values that can't be bound as query parameters never match, as in the
+    per-record mode, and are left out.
+    
+    Returns:
+        Dict of record_id -> scalar source value
+    """
+    source_values = {}
+    for record_id, data in records:
+        value = data.get(plan.source_key) if isinstance(data, dict) else None
+        if value is not None:
+            source_values[record_id] = value
+    missing = len(records) - len(source_values)
+    if missing:
+        logger.warning(f"Source '{plan.source_key}' not found in {missing} records for mapping {plan.mapping}")
+    return {record_id: value for record_id, value in source_values.items()
+            if isinstance(value, (str, int, float))}
+
+
+def _match_local_sqlite(cursor, plan, source_values):
+    """Match source values against a local_sqlite destination with one join."""
+    if not source_values:
+        return {}
+    found = _bulk_query_local_sqlite(cursor, plan.dest_table, plan.dest_column, source_values.values())
+    matches = {}
+    for record_id, value in source_values.items():
+        key = _value_key(value)
+        if key in found:
+            matches[record_id] = (found[key], f"{value}:{found[key]}")
+    return matches
+
+
+def _bulk_query_backend(backends, plan, source_values):
+    """
+    Look up a mapping's source values in a tenant database, batch by batch.
+    
+    Args:
+        source_values: Dict of record_id -> scalar source value
+    
+    Returns:
+        Dict of record_id -> (lookup_value, lookup_match) for values with exactly one match
+    """
+    if not source_values:
+        return {}
+    try:
+        backend = backends.get(plan.dest_connection)
+        found = backend.match_values(plan.dest_table, plan.dest_column, source_values.values())
+    except LookupBackendError as e:
+        if backends.fail(plan.dest_connection, e):
+            logger.error(f"Lookups on '{plan.dest_connection}' disabled for this run: {e}")
+        return {}
+    return _match_backend_values(backend, source_values, found)
+
+
+def _match_candidates(cursor, plan, source_values, backends):
+    """
+    Match source values through the CandidateIndex of a normalised or fuzzy mapping.
+    
+    The index of the destination column is built on first use and kept in
+    ``backends`` for the rest of the run.
+    
+    Args:
+        cursor: Cursor on the session database, for local_sqlite destinations
+        source_values: Dict of record_id -> scalar source value
+    
+    Returns:
+        Dict of record_id -> (lookup_value, lookup_match) for values with exactly one match
+    """
+    if not source_values:
+        return {}
+    index = backends.match_index((plan.dest_connection, plan.dest_table, plan.dest_column, plan.match),
+                                 lambda: _build_candidate_index(cursor, plan, backends))
+    if index is None:
+        return {}
+    
+    matches = {}
+    fuzzy = 0
+    for record_id, value in source_values.items():
+        match = index.match(value)
+        if match is None:
+            continue
+        lookup_value, distance = match
+        if distance:
+            fuzzy += 1
+            matches[record_id] = (lookup_value, f"{value}:{lookup_value} (distance {distance})")
+        else:
+            matches[record_id] = (lookup_value, f"{value}:{lookup_value}")
+    logger.info(f"Matched {len(matches)} of {len(source_values)} values in {plan.dest_table}.{plan.dest_column} "
+                f"({plan.match.describe()}), {fuzzy} within the edit distance")
+    return matches
+
+
+def _build_candidate_index(cursor, plan, backends):
+    """
+    Read a mapping's destination column once and index it by normalised key.
+    
+    Returns:
+        CandidateIndex, or None if the destination connection failed
+    """
+    if plan.dest_connection == "local_sqlite":
+        try:
+            rows = cursor.execute(f"SELECT {plan.dest_column}, COUNT(*) FROM {plan.dest_table} "
+                                  f"GROUP BY {plan.dest_column}").fetchall()
+        except sqlite3.Error as e:
+            logger.error(f"Error querying SQLite: {e}")
+            rows = []
+    else:
+        try:
+            rows = backends.get(plan.dest_connection).column_values(plan.dest_table, plan.dest_column)
+        except LookupBackendError as e:
+            if backends.fail(plan.dest_connection, e):
+                logger.error(f"Lookups on '{plan.dest_connection}' disabled for this run: {e}")
+            return None
+    index = CandidateIndex(plan.match, rows)
+    logger.info(f"Indexed {len(index.keys)} keys of {plan.dest_connection}:{plan.dest_table}.{plan.dest_column} "
+                f"({plan.match.describe()})")
+    return index
+
+
+def _match_backend_values(backend, source_values, found):
+    """Pair source values with the backend's matches; ambiguous values don't match."""
+    matches = {}
+    for record_id, value in source_values.items():
+        count, lookup_value = found.get(backend.normalise(value), (0, None))
+        if count == 1:
+            matches[record_id] = (lookup_value, f"{value}:{lookup_value}")
+    return matches
+
+
+def _lookup_sql(table, column):
+    """Per-record lookup query."""
+    return f"SELECT {column} FROM {table} WHERE {column} = ?"
+
+
+def _bulk_lookup_sql(table, column):
+    """Set-based lookup query over the lookup_values temp table."""
+    return (f"SELECT v.id, COUNT(*), MIN(d.{column}) FROM lookup_values v "
+            f"JOIN {table} d ON d.{column} = +v.value GROUP BY v.id")
+
+
+def prepare_lookup_indexes(cursor, plans, create=True, bulk=True):
+    """
+    Index the destination columns of local SQLite lookups and check the query plans.
+    
+    Every destination column needs an index whose first column it is; the
+    lookup only reads that column, so the index covers the query. Missing
+    indexes are created (``create``) or returned as a recommendation. The
+    lookup query of the chosen mode is then run through EXPLAIN QUERY PLAN
+    to confirm it searches the index rather than scanning the table.
+    
+    Args:
+        cursor: Cursor on the session database (which holds local_sqlite tables)
+        plans: Compiled LookupPlans
+        create: Create missing indexes
+        bulk: Check the set-based join instead of the per-record query
+    
+    Returns:
+        One dict per destination column with table, column, index, created,
+        recommendation, index_hit and query_plan
+    """
+    report = []
+    seen = set()
+    for plan in plans:
+        target = (plan.dest_table, plan.dest_column)
+        if plan.dest_connection != "local_sqlite" or target in seen:
+            continue
+        seen.add(target)
+        table, column = target
+        entry = {"table": table, "column": column, "index": None, "created": False,
+                 "recommendation": None, "index_hit": False, "query_plan": []}
+        report.append(entry)
+        
+        try:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+            if cursor.fetchone() is None:
+                entry["query_plan"] = [f"Table {table} not found"]
+                logger.warning(f"Lookup destination table {table} not found in the session database")
+                continue
+            
+            entry["index"] = _find_leading_index(cursor, table, column)
+            if entry["index"] is None:
+                index_name = f"idx_lookup_{table}_{column}"
+                index_sql = f"CREATE INDEX IF NOT EXISTS {index_name} ON {table} ({column})"
+                if create:
+                    cursor.execute(index_sql)
+                    entry["index"], entry["created"] = index_name, True
+                    logger.info(f"Created index {index_name} for lookups on {table}.{column}")
+                else:
+                    entry["recommendation"] = index_sql
+                    logger.warning(f"Lookups on {table}.{column} scan the table; recommended: {index_sql}")
+            
+            if bulk:
+                cursor.execute(LOOKUP_VALUES_TABLE_SQL)
+                cursor.execute(f"EXPLAIN QUERY PLAN {_bulk_lookup_sql(table, column)}")
+                alias = "d"
+            else:
+                cursor.execute(f"EXPLAIN QUERY PLAN {_lookup_sql(table, column)}", (None,))
+                alias = table
+            entry["query_plan"] = [row[-1] for row in cursor.fetchall()]
+            # An automatic index is built for every query, which is what a real index saves
+            entry["index_hit"] = any(
+                detail.startswith(f"SEARCH {alias} ") and "INDEX" in detail and "AUTOMATIC" not in detail
+                for detail in entry["query_plan"]
+            )
+            if not entry["index_hit"]:
+                logger.warning(f"Lookups on {table}.{column} don't use an index: {'; '.join(entry['query_plan'])}")
+        except sqlite3.Error as e:
+            logger.error(f"Could not check lookup index for {table}.{column}: {e}")
+            entry["query_plan"] = [f"Error: {e}"]
+    return report
+
+
+def _find_leading_index(cursor, table, column):
+    """Name of an index on ``table`` whose first column is ``column``, or None."""
+    cursor.execute(f"PRAGMA index_list({table})")
+    for index in cursor.fetchall():
+        index_name = index[1]
+        cursor.execute(f"PRAGMA index_info('{index_name}')")
+        columns = sorted(cursor.fetchall())
+        if columns and columns[0][2] == column:
+            return index_name
+    return None
+
+
+def _value_key(value):
+    """Dict key for a source value that keeps 1, 1.0, True and '1' apart."""
+    return type(value).__name__, value
+
+
+def _bulk_query_local_sqlite(cursor, table, column, values):
+    """
+    Match many values against a local SQLite column with one join.
+    
+    The distinct values are loaded into a temp table. Values with more than
+    one match are ambiguous and, like values without a match, left out.
+    ``+v.value`` strips the temp column's affinity, so values compare with
+    ``column`` exactly as a bound ``column = ?`` parameter would.
+    
+    Returns:
+        Dict of _value_key(value) -> matched column value
+    """
+    distinct = {}
+    for value in values:
+        distinct.setdefault(_value_key(value), value)
+    keys = list(distinct)
+    
+    try:
+        cursor.execute(LOOKUP_VALUES_TABLE_SQL)
+        cursor.execute("DELETE FROM lookup_values")
+        cursor.executemany("INSERT INTO lookup_values (id, value) VALUES (?, ?)",
+                           ((index, distinct[key]) for index, key in enumerate(keys)))
+        cursor.execute(_bulk_lookup_sql(table, column))
+        rows = cursor.fetchall()
+        cursor.execute("DELETE FROM lookup_values")
+    except sqlite3.Error as e:
+        logger.error(f"Error querying SQLite: {e}")
+        return {}
+    
+    found = {}
+    ambiguous = 0
+    for index, count, lookup_value in rows:
+        if count == 1:
+            found[keys[index]] = lookup_value
+        else:
+            ambiguous += 1
+    if ambiguous:
+        logger.warning(f"Multiple matches found in {table}.{column} for {ambiguous} values")
+    logger.info(f"Matched {len(found)} of {len(keys)} distinct values in {table}.{column}")
+    return found
 
 
 def _ensure_tables_exist(cursor, generated_table_name, lookup_table_name, exceptions_table_name):
@@ -222,6 +989,14 @@ def _ensure_tables_exist(cursor, generated_table_name, lookup_table_name, except
     if cursor.fetchone() is None:
         raise ValueError(f"Table {generated_table_name} not found. Run Phase 1 (document generation) first.")
     
+    # Partial index over the records still waiting for a lookup, so pending
+    # work is found without scanning resolved rows
+    cursor.execute(
+        f"CREATE INDEX IF NOT EXISTS idx_{generated_table_name}_unresolved "
+        f"ON {generated_table_name} (id) WHERE lookup_type IS NULL"
+    )
+    create_generated_indexes(cursor, generated_table_name)
+    
     # Create tenant_lookup_{table_hash} if not exists
     cursor.execute(f'''
     CREATE TABLE IF NOT EXISTS {lookup_table_name} (
@@ -251,6 +1026,28 @@ def _ensure_tables_exist(cursor, generated_table_name, lookup_table_name, except
     ''')
 
 
+def _load_lookups_config():
+    """The ``lookups`` section of the config (empty if it can't be read)."""
+    try:
+        return load_config().get("lookups", {}) or {}
+    except Exception as e:
+        logger.warning(f"Could not read the lookups config, using defaults: {e}")
+        return {}
+
+
+def _load_tenant_databases():
+    """
+    The tenant's destination connections from ``tenant.connections``, or from
+    ``tenant.databases`` in older configs (empty if they can't be read).
+    """
+    try:
+        tenant = load_config().get("tenant", {}) or {}
+        return tenant.get("connections") or tenant.get("databases") or {}
+    except Exception as e:
+        logger.error(f"Error loading tenant databases: {e}")
+        return {}
+
+
 def _load_tenant_mappings(document_type):
     """Load tenant mappings for the specified document type."""
     tenant_mappings = {}
@@ -273,29 +1070,6 @@ def _load_tenant_mappings(document_type):
     return tenant_mappings
 
 
-def _log_lookup_attempt(cursor, lookup_table_name, generated_id, action):
-    """Log a lookup attempt and return the attempt ID."""
-    cursor.execute(
-        f"INSERT INTO {lookup_table_name} (generated_id, action) VALUES (?, ?)",
-        (generated_id, action)
-    )
-    return cursor.lastrowid
-
-
-def _log_exception(cursor, exceptions_table_name, action, exception_message, input_file, row, data):
-    """Log a lookup exception and return the exception ID."""
-    current_time = int(time.time())
-    
-    cursor.execute(
-        f"INSERT INTO {exceptions_table_name} "
-        f"(action, exception_message, input_file, row, data, created_at) "
-        f"VALUES (?, ?, ?, ?, ?, ?)",
-        (action, exception_message, input_file, row, data, current_time)
-    )
-    
-    return cursor.lastrowid
-
-
 def _update_generated_record(cursor, generated_table_name, record_id, lookup_type, lookup, lookup_match, lookup_value):
     """Update a generated record with lookup information."""
     cursor.execute(
@@ -306,120 +1080,35 @@ def _update_generated_record(cursor, generated_table_name, record_id, lookup_typ
     )
 
 
-def _perform_lookup(cursor, lookup_type, mapping, data, table_hash):
+def _perform_lookup(cursor, plan, data, backends):
     """
-    Perform a lookup based on mapping type and configuration.
+    Look up one record with a compiled mapping plan.
+    
+    Args:
+        backends: LookupBackends for destinations other than local_sqlite
     
     Returns:
         Tuple of (lookup_value, lookup_match) if successful, None otherwise
     """
-    if lookup_type == "column_to_column":
-        return _perform_column_to_column_lookup(cursor, mapping, data, table_hash)
-    elif lookup_type == "type_to_column":
-        return _perform_type_to_column_lookup(cursor, mapping, data, table_hash)
-    else:
-        return None
-
-
-def _perform_column_to_column_lookup(cursor, mapping, data, table_hash):
-    """Perform a column-to-column lookup."""
-    # Parse the mapping
-    # Example: "local_sqlite:imported_ce65e00a45:'Shareholder ID Number' = local_mysql:users:email"
-    try:
-        source_side, dest_side = mapping.split('=')
-        source_side = source_side.strip()
-        dest_side = dest_side.strip()
-        
-        source_parts = source_side.split(':')
-        dest_parts = dest_side.split(':')
-        
-        if len(source_parts) < 3 or len(dest_parts) < 3:
-            logger.error(f"Invalid mapping format: {mapping}")
-            return None
-        
-        # Extract connection, table, and column
-        source_conn = source_parts[0]
-        source_table = source_parts[1]
-        source_column = source_parts[2].strip("'\"")
-        
-        dest_conn = dest_parts[0]
-        dest_table = dest_parts[1]
-        dest_column = dest_parts[2]
-        
-        # Find the source value in the data
-        source_value = None
-        for key, value in data.items():
-            if key == source_column:
-                source_value = value
-                break
-        
-        if source_value is None:
-            logger.warning(f"Source column '{source_column}' not found in data")
-            return None
-        
-        # Query destination based on connection type
-        if dest_conn == "local_sqlite":
-            return _query_local_sqlite(cursor, dest_table, dest_column, source_value)
-        elif dest_conn == "local_mysql":
-            return _query_local_mysql(dest_table, dest_column, source_value)
-        else:
-            logger.warning(f"Unsupported destination connection: {dest_conn}")
-            return None
-        
-    except Exception as e:
-        logger.error(f"Error parsing mapping '{mapping}': {e}")
+    # For type_to_column plans the source key is the field type; in a real
+    # system the field's type would be checked, here it is matched by name
+    source_value = data.get(plan.source_key) if isinstance(data, dict) else None
+    if source_value is None:
+        logger.warning(f"Source '{plan.source_key}' not found in data")
         return None
-
-
-def _perform_type_to_column_lookup(cursor, mapping, data, table_hash):
-    """Perform a type-to-column lookup."""
-    # Parse the mapping
-    # Example: "local_sqlite:imported_ce65e00a45:SA_ID_NUMBER = local_mysql:users:email"
+    
     try:
-        source_side, dest_side = mapping.split('=')
-        source_side = source_side.strip()
-        dest_side = dest_side.strip()
-        
-        source_parts = source_side.split(':')
-        dest_parts = dest_side.split(':')
-        
-        if len(source_parts) < 3 or len(dest_parts) < 3:
-            logger.error(f"Invalid mapping format: {mapping}")
-            return None
-        
-        # Extract connection, table, and type
-        source_conn = source_parts[0]
-        source_table = source_parts[1]
-        source_type = source_parts[2]
-        
-        dest_conn = dest_parts[0]
-        dest_table = dest_parts[1]
-        dest_column = dest_parts[2]
-        
-        # Find the source value in data based on type
-        source_value = None
-        for key, value in data.items():
-            # In a real system, you would check the field type here
-            # For this example, we'll use a simple string match
-            if key == source_type:
-                source_value = value
-                break
-        
-        if source_value is None:
-            logger.warning(f"Field with type '{source_type}' not found in data")
-            return None
-        
-        # Query destination based on connection type
-        if dest_conn == "local_sqlite":
-            return _query_local_sqlite(cursor, dest_table, dest_column, source_value)
-        elif dest_conn == "local_mysql":
-            return _query_local_mysql(dest_table, dest_column, source_value)
-        else:
-            logger.warning(f"Unsupported destination connection: {dest_conn}")
+        if plan.match:
+            if not isinstance(source_value, (str, int, float)):
+                return None
+            return _match_candidates(cursor, plan, {0: source_value}, backends).get(0)
+        if plan.dest_connection == "local_sqlite":
+            return _query_local_sqlite(cursor, plan.dest_table, plan.dest_column, source_value)
+        if not isinstance(source_value, (str, int, float)):
             return None
-        
+        return _bulk_query_backend(backends, plan, {0: source_value}).get(0)
     except Exception as e:
-        logger.error(f"Error parsing mapping '{mapping}': {e}")
+        logger.error(f"Error looking up '{plan.mapping}': {e}")
         return None
 
 
@@ -427,8 +1116,7 @@ def _query_local_sqlite(cursor, table, column, value):
     """Query a local SQLite database."""
     try:
         # Execute the query
-        query = f"SELECT {column} FROM {table} WHERE {column} = ?"
-        cursor.execute(query, (value,))
+        cursor.execute(_lookup_sql(table, column), (value,))
         
         # Check results
         results = cursor.fetchall()
@@ -452,19 +1140,6 @@ def _query_local_sqlite(cursor, table, column, value):
         raise
 
 
-def _query_local_mysql(table, column, value):
-    """Query a local MySQL database."""
-    # This is a placeholder - in a real implementation, you'd connect to MySQL
-    # For this example, we'll just simulate a lookup
-    logger.info(f"Simulating MySQL query on {table}.{column} for value '{value}'")
-    
-    # Simulate a successful lookup
-    lookup_value = f"mysql-{value}"
-    lookup_match = f"{value}:{lookup_value}"
-    
-    return lookup_value, lookup_match
-
-
 def resolve_exception(session_hash: str, exception_id: int, accept: bool, lookup_value: Optional[str] = None) -> Dict[str, Any]:
     """
     Resolve a lookup exception.
@@ -478,75 +1153,137 @@ def resolve_exception(session_hash: str, exception_id: int, accept: bool, lookup
     Returns:
         Dict with resolution results
     """
-    # Get the table hash
-    table_hash, _, _ = get_table_data(session_hash)
-    session_dir = get_session_dir(session_hash)
+    result = resolve_exceptions(session_hash, [
+        {"exception_id": exception_id, "accept": accept, "lookup_value": lookup_value}
+    ])
+    if result["status"] != "success":
+        return result
+    outcome = result["results"][0]
+    return {
+        "status": "success" if outcome["status"] == "resolved" else "error",
+        "message": outcome["message"]
+    }
+
+
+def resolve_exceptions(session_hash: Optional[str], resolutions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Resolve many lookup exceptions in one transaction.
     
-    # Initialize database connection
-    db_path = os.path.join(session_dir, "data.db")
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    Each resolution is a dict with ``exception_id``, ``accept`` and, when
+    accepting, ``lookup_value``; ``accept`` must be a boolean. Accepting
+    sets the lookup value on the exception's generated record: the
+    exception's generated_id for compact audits, otherwise the record of the
+    exception's input file and row that holds the data copied into the
+    exception (found through the index on (input_file, row)). Invalid entries are reported and skipped without affecting
+    the others; a database error rolls back the whole batch.
+    
+    Args:
+        session_hash: Session hash, if None uses current session
+        resolutions: List of {"exception_id", "accept", "lookup_value"} dicts
+        
+    Returns:
+        Dict with status, resolved and failed counts, and one result per entry
+        (exception_id, status "resolved" or "error", message, generated_id)
+    """
+    if not session_hash:
+        session_hash = get_current_session()
+    if not session_hash:
+        raise ValueError("No active session found")
+    
+    # Only the table name is needed, not the imported rows
+    table_hash = get_table_name(session_hash)
+    session_dir = get_session_dir(session_hash)
     
     # Table names
     generated_table_name = f"generated_{table_hash}"
     exceptions_table_name = f"tenant_lookup_exceptions_{table_hash}"
     
+    conn = sqlite3.connect(os.path.join(session_dir, "data.db"))
+    cursor = conn.cursor()
+    try:
+        has_generated_id = "generated_id" in [row[1] for row in cursor.execute(f"PRAGMA table_info({exceptions_table_name})")]
+        
+        current_time = int(time.time())
+        results = []
+        for entry in resolutions:
+            results.append(_apply_exception_resolution(
+                cursor, generated_table_name, exceptions_table_name, has_generated_id, entry, current_time
+            ))
+        conn.commit()
+    except sqlite3.Error as e:
+        conn.rollback()
+        logger.error(f"Error resolving exceptions, nothing was changed: {e}")
+        return {"status": "error", "message": f"Error resolving exceptions: {e}"}
+    finally:
+        conn.close()
+    
+    resolved = sum(1 for result in results if result["status"] == "resolved")
+    logger.info(f"Resolved {resolved} of {len(results)} lookup exceptions")
+    return {
+        "status": "success",
+        "resolved": resolved,
+        "failed": len(results) - resolved,
+        "results": results
+    }
+
+
+def _apply_exception_resolution(cursor, generated_table_name, exceptions_table_name, has_generated_id, entry,
+                                current_time):
+    """Apply one exception resolution inside the caller's transaction and describe the outcome."""
+    exception_id = entry.get("exception_id") if isinstance(entry, dict) else None
+    accept = entry.get("accept") if isinstance(entry, dict) else None
+    lookup_value = entry.get("lookup_value") if isinstance(entry, dict) else None
+    
+    def error(message):
+        return {"exception_id": exception_id, "status": "error", "message": message, "generated_id": None}
+    
+    if not isinstance(exception_id, int) or isinstance(exception_id, bool):
+        return error("exception_id must be an integer")
+    # "false" or 0 must not count as accepting
+    if not isinstance(accept, bool):
+        return error("accept must be true or false")
+    
     # Get the exception record
     cursor.execute(
-        f"SELECT action, input_file, row, data, accept_action, status FROM {exceptions_table_name} WHERE id = ?",
+        f"SELECT input_file, row, data, status{', generated_id' if has_generated_id else ', NULL'} "
+        f"FROM {exceptions_table_name} WHERE id = ?",
         (exception_id,)
     )
     exception_record = cursor.fetchone()
-    
     if not exception_record:
-        conn.close()
-        return {
-            "status": "error",
-            "message": f"Exception with ID {exception_id} not found"
-        }
+        return error(f"Exception with ID {exception_id} not found")
     
-    action, input_file, row, data_json, current_accept_action, current_status = exception_record
+    input_file, row, data, current_status, generated_id = exception_record
     
-    # Check if already resolved
+    # Check if already resolved (also when the same ID comes twice in a batch)
     if current_status == 1:
-        conn.close()
-        return {
-            "status": "error",
-            "message": f"Exception with ID {exception_id} is already resolved"
-        }
-    
-    # Update exception record
-    current_time = int(time.time())
-    accept_action_value = 1 if accept else 0
+        return error(f"Exception with ID {exception_id} is already resolved")
     
     if accept and not lookup_value:
-        conn.close()
-        return {
-            "status": "error",
-            "message": "Lookup value is required when accepting an exception"
-        }
+        return error("Lookup value is required when accepting an exception")
     
     # Update the exception record
     cursor.execute(
         f"UPDATE {exceptions_table_name} "
         f"SET accept_action = ?, status = 1, lookup_value = ?, updated_at = ? "
         f"WHERE id = ?",
-        (accept_action_value, lookup_value if accept else None, current_time, exception_id)
+        (1 if accept else 0, lookup_value if accept else None, current_time, exception_id)
     )
     
     # If accepting, update the generated record
     if accept:
-        # Find the record in generated_{table_hash} based on input_file and row
-        cursor.execute(
-            f"SELECT id FROM {generated_table_name} WHERE input_file = ? AND row = ?",
-            (input_file, row)
-        )
-        record = cursor.fetchone()
+        if generated_id is None:
+            # HTML and PDF records share their source row; the full audit
+            # copied the record's data into the exception, which tells them apart
+            cursor.execute(
+                f"SELECT id FROM {generated_table_name} WHERE input_file = ? AND row = ? AND data = ? "
+                f"ORDER BY id LIMIT 1",
+                (input_file, row, data)
+            )
+            record = cursor.fetchone()
+            generated_id = record[0] if record else None
         
-        if record:
-            record_id = record[0]
-            
-            # Update the record with lookup information
+        if generated_id is not None:
             cursor.execute(
                 f"UPDATE {generated_table_name} "
                 f"SET lookup_type = 'manual_resolution', "
@@ -554,14 +1291,12 @@ def resolve_exception(session_hash: str, exception_id: int, accept: bool, lookup
                 f"lookup_match = 'manually_matched', "
                 f"lookup_value = ? "
                 f"WHERE id = ?",
-                (lookup_value, record_id)
+                (lookup_value, generated_id)
             )
     
-    # Commit and close
-    conn.commit()
-    conn.close()
-    
     return {
-        "status": "success",
-        "message": f"Exception {exception_id} resolved with action: {'accept' if accept else 'reject'}"
+        "exception_id": exception_id,
+        "status": "resolved",
+        "message": f"Exception {exception_id} resolved with action: {'accept' if accept else 'reject'}",
+        "generated_id": generated_id if accept else None
     }
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+"""
+Metrics - Lightweight per-phase timers and counters for generation stages.
+"""
+
+import os
+import json
+import time
+import cProfile
+import pstats
+import io
+import math
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Any, List, Iterator
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+
+    Args:
+        sorted_values: Values in ascending order
+        pct: Percentile between 0 and 100
+
+    Returns:
+        The percentile value, or 0.0 for an empty list
+    """
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100.0 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """
+    Summarise a list of samples as count, total, mean, p50, p95 and max.
+    """
+    ordered = sorted(values)
+    total = sum(ordered)
+    return {
+        "count": len(ordered),
+        "total": round(total, 3),
+        "mean": round(total / len(ordered), 3) if ordered else 0.0,
+        "p50": round(percentile(ordered, 50), 3),
+        "p95": round(percentile(ordered, 95), 3),
+        "max": round(ordered[-1], 3) if ordered else 0.0,
+    }
+
+
+class StageProfiler:
+    """
+    Collect per-phase timings (milliseconds), value samples and counters for a stage.
+
+    Usage:
+        profiler = StageProfiler("html")
+        with profiler.phase("render"):
+            ...
+        profiler.sample("bytes_written", size)
+        profiler.count("collisions")
+        summary = profiler.summary()
+    """
+
+    def __init__(self, stage: str):
+        self.stage = stage
+        self.started_at = datetime.now()
+        self._start = time.perf_counter()
+        self.timings: Dict[str, List[float]] = {}
+        self.samples: Dict[str, List[float]] = {}
+        self.counters: Dict[str, int] = {}
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time the enclosed block and record it under ``name``."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_timing(name, (time.perf_counter() - start) * 1000.0)
+
+    def add_timing(self, name: str, elapsed_ms: float) -> None:
+        """Record a duration in milliseconds that was measured elsewhere."""
+        self.timings.setdefault(name, []).append(elapsed_ms)
+
+    def sample(self, name: str, value: float) -> None:
+        """Record a non-timing sample, e.g. bytes written for one document."""
+        self.samples.setdefault(name, []).append(value)
+
+    def count(self, name: str, amount: int = 1) -> None:
+        """Increment a counter."""
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Build a JSON-serialisable summary of everything recorded so far.
+
+        Returns:
+            Dict with wall time, per-phase timing stats (ms), sample stats and counters
+        """
+        return {
+            "stage": self.stage,
+            "started_at": self.started_at.isoformat(),
+            "wall_ms": round((time.perf_counter() - self._start) * 1000.0, 3),
+            "phases_ms": {name: summarize(values) for name, values in self.timings.items()},
+            "samples": {name: summarize(values) for name, values in self.samples.items()},
+            "counters": dict(self.counters),
+        }
+
+
+def write_metrics_file(metrics: Dict[str, Any], file_path: str) -> str:
+    """
+    Write a metrics summary as JSON.
+
+    Args:
+        metrics: Summary from StageProfiler.summary()
+        file_path: Destination file
+
+    Returns:
+        Path to the written file
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    with open(file_path, 'w', encoding='utf-8') as f:
+        json.dump(metrics, f, indent=2)
+    return file_path
+
+
+def dump_cprofile(profile: cProfile.Profile, file_path: str, top: int = 30) -> str:
+    """
+    Save cProfile stats (loadable with pstats/snakeviz) and a text summary next to it.
+
+    Args:
+        profile: Finished cProfile.Profile
+        file_path: Destination ``.prof`` file
+        top: Number of functions to list in the text summary
+
+    Returns:
+        Path to the ``.prof`` file
+    """
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    profile.dump_stats(file_path)
+
+    report = io.StringIO()
+    pstats.Stats(profile, stream=report).sort_stats("cumulative").print_stats(top)
+    with open(os.path.splitext(file_path)[0] + ".txt", 'w', encoding='utf-8') as f:
+        f.write(report.getvalue())
+
+    logger.info(f"cProfile stats written to {file_path}")
+    return file_path
@@ -0,0 +1,263 @@
+#!/usr/bin/env python
+"""
+PDF Bundler - Append converted PDFs into print bundles of N documents or M megabytes.
+
+Documents are appended in source order while the conversion is still running:
+results that arrive out of order wait (as file names only) until the documents
+before them are in. Only the bundle being written is held in memory; it is
+written out and released as soon as it is full. pypdf builds a bundle in
+memory and keeps the appended documents parsed until it is written, so a
+run needs room for about two to three times ``max_mb`` (or a single larger
+document) whatever its size. A manifest records, for every source row, the
+bundle it ended up in and its page offset.
+"""
+
+import os
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Callable, NamedTuple
+
+# pypdf is optional; bundling is unavailable without it
+try:
+    from pypdf import PdfReader, PdfWriter
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PdfReader = PdfWriter = None
+    PYPDF_AVAILABLE = False
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+BUNDLE_DIR = "bundles"
+BUNDLE_MANIFEST_FILE = "manifest.json"
+
+
+class BundleSettings(NamedTuple):
+    """How converted documents are grouped into bundle files; both limits bound the memory a bundle takes."""
+    max_documents: int = 500
+    max_mb: float = 100.0
+    name_pattern: str = "bundle_{index:04d}.pdf"
+    keep_documents: bool = True
+
+
+def bundle_settings_from_config(pdf_config: Dict[str, Any], enabled: Optional[bool] = None) -> Optional[BundleSettings]:
+    """
+    Read ``pdf.bundle`` from the config.
+
+    Args:
+        pdf_config: The ``pdf`` section of the config
+        enabled: Overrides ``pdf.bundle.enabled`` when not None
+
+    Returns:
+        BundleSettings, or None if bundling is off
+
+    Raises:
+        ValueError: If ``max_documents`` or ``max_mb`` is not positive; an
+            unlimited bundle would hold the whole run in memory
+    """
+    bundle_config = pdf_config.get("bundle", {}) or {}
+    if enabled is None:
+        enabled = bool(bundle_config.get("enabled", False))
+    if not enabled:
+        return None
+    defaults = BundleSettings()
+    max_documents = int(bundle_config.get("max_documents", defaults.max_documents) or 0)
+    max_mb = float(bundle_config.get("max_mb", defaults.max_mb) or 0)
+    if max_documents < 1 or max_mb <= 0:
+        raise ValueError(f"pdf.bundle.max_documents and pdf.bundle.max_mb must both be positive "
+                         f"(got {max_documents} and {max_mb:g})")
+    return BundleSettings(
+        max_documents=max_documents,
+        max_mb=max_mb,
+        name_pattern=bundle_config.get("name_pattern", defaults.name_pattern),
+        keep_documents=bool(bundle_config.get("keep_documents", defaults.keep_documents)),
+    )
+
+
+class PypdfBundleWriter:
+    """Write one bundle file with pypdf."""
+
+    def __init__(self, path: str):
+        if not PYPDF_AVAILABLE:
+            raise RuntimeError("pypdf is not installed; install it to bundle PDFs (pip install pypdf)")
+        self.path = path
+        self.pages = 0
+        self._writer = PdfWriter()
+
+    def append(self, pdf_path: str) -> int:
+        """Append every page of a PDF and return the number of pages added."""
+        reader = PdfReader(pdf_path)
+        for page in reader.pages:
+            self._writer.add_page(page)
+        added = len(reader.pages)
+        self.pages += added
+        return added
+
+    def close(self) -> None:
+        """Write the bundle (atomically) and release its pages."""
+        temp_path = self.path + ".tmp"
+        with open(temp_path, "wb") as f:
+            self._writer.write(f)
+        os.replace(temp_path, self.path)
+        self._writer = None
+
+
+class PdfBundler:
+    """
+    Collect conversion results and append the PDFs to bundles in document order.
+
+    Usage:
+        bundler = PdfBundler(pdf_dir, html_files, rows, settings)
+        for result in results_as_they_complete:
+            bundler.add(result)
+        summary = bundler.finish()
+    """
+
+    def __init__(self, pdf_dir: str, html_files: List[str], rows: Dict[str, Optional[int]],
+                 settings: BundleSettings, writer_factory: Optional[Callable[[str], Any]] = None):
+        self.pdf_dir = pdf_dir
+        self.bundle_dir = os.path.join(pdf_dir, BUNDLE_DIR)
+        self.settings = settings
+        self.rows = rows
+        self.errors: List[Dict[str, Any]] = []
+        self.skipped: List[str] = []
+        self.bundles: List[Dict[str, Any]] = []
+        self.documents: List[Dict[str, Any]] = []
+
+        self._writer_factory = writer_factory or PypdfBundleWriter
+        self._order = list(html_files)
+        self._position = {html_file: index for index, html_file in enumerate(self._order)}
+        self._waiting: Dict[int, Dict[str, Any]] = {}
+        self._next = 0
+        self._current = None
+        self._current_entry: Optional[Dict[str, Any]] = None
+        self._max_bytes = int(settings.max_mb * 1024 * 1024)
+
+        os.makedirs(self.bundle_dir, exist_ok=True)
+        self._remove_old_bundles()
+
+    def add(self, result: Dict[str, Any]) -> None:
+        """Take a final conversion result; append every document that is now next in line."""
+        position = self._position.get(result["html_file"])
+        if position is None or position < self._next:
+            return
+        self._waiting[position] = {"html_file": result["html_file"], "pdf_file": result.get("pdf_file"),
+                                   "success": result.get("success", False)}
+        while self._next in self._waiting:
+            self._append(self._waiting.pop(self._next))
+            self._next += 1
+
+    def finish(self) -> Dict[str, Any]:
+        """
+        Append what is still waiting, close the last bundle and write the manifest.
+
+        Documents that never produced a result are left out and listed as skipped.
+
+        Returns:
+            Dict with the bundle list, number of bundled documents, skipped files,
+            errors and the manifest path
+        """
+        while self._next < len(self._order):
+            entry = self._waiting.pop(self._next, None)
+            if entry is None:
+                self.skipped.append(self._order[self._next])
+            else:
+                self._append(entry)
+            self._next += 1
+        self._close_bundle()
+
+        manifest_path = os.path.join(self.bundle_dir, BUNDLE_MANIFEST_FILE)
+        with open(manifest_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "created_at": datetime.now().isoformat(),
+                "bundles": self.bundles,
+                "documents": self.documents,
+                "skipped": self.skipped,
+            }, f, indent=2)
+
+        logger.info(f"Bundled {len(self.documents)} PDFs into {len(self.bundles)} files in {self.bundle_dir}"
+                    + (f" ({len(self.skipped)} skipped)" if self.skipped else ""))
+        return {
+            "bundles": self.bundles,
+            "num_documents": len(self.documents),
+            "skipped": self.skipped,
+            "errors": self.errors,
+            "manifest": manifest_path,
+        }
+
+    def _append(self, entry: Dict[str, Any]) -> None:
+        if not entry["success"] or not entry["pdf_file"]:
+            self.skipped.append(entry["html_file"])
+            return
+
+        pdf_path = os.path.join(self.pdf_dir, entry["pdf_file"])
+        try:
+            size = os.path.getsize(pdf_path)
+        except OSError as e:
+            self.errors.append({"file": entry["pdf_file"], "error": f"Cannot bundle: {e}"})
+            self.skipped.append(entry["html_file"])
+            return
+
+        if self._current is not None and self._is_full(size):
+            self._close_bundle()
+        if self._current is None:
+            self._open_bundle()
+
+        try:
+            pages = self._current.append(pdf_path)
+        except Exception as e:
+            logger.error(f"Could not append {entry['pdf_file']} to {self._current_entry['file']}: {e}")
+            self.errors.append({"file": entry["pdf_file"], "error": f"Cannot bundle: {e}"})
+            self.skipped.append(entry["html_file"])
+            return
+
+        self._current_entry["documents"] += 1
+        self._current_entry["source_bytes"] += size
+        self.documents.append({
+            "row": self.rows.get(entry["html_file"]),
+            "html_file": entry["html_file"],
+            "pdf_file": entry["pdf_file"],
+            "bundle": self._current_entry["file"],
+            "first_page": self._current.pages - pages + 1,
+            "page_count": pages,
+        })
+
+        if not self.settings.keep_documents:
+            try:
+                os.remove(pdf_path)
+            except OSError as e:
+                logger.warning(f"Could not remove bundled PDF {pdf_path}: {e}")
+
+    def _is_full(self, next_size: int) -> bool:
+        entry = self._current_entry
+        if self.settings.max_documents and entry["documents"] >= self.settings.max_documents:
+            return True
+        return bool(self._max_bytes) and entry["source_bytes"] + next_size > self._max_bytes
+
+    def _open_bundle(self) -> None:
+        name = self.settings.name_pattern.format(index=len(self.bundles) + 1)
+        self._current = self._writer_factory(os.path.join(self.bundle_dir, name))
+        self._current_entry = {"file": name, "documents": 0, "pages": 0, "source_bytes": 0}
+        self.bundles.append(self._current_entry)
+
+    def _close_bundle(self) -> None:
+        if self._current is None:
+            return
+        try:
+            self._current.close()
+            self._current_entry["pages"] = self._current.pages
+        except Exception as e:
+            logger.error(f"Could not write bundle {self._current_entry['file']}: {e}")
+            self.errors.append({"file": self._current_entry["file"], "error": f"Bundle not written: {e}"})
+        self._current = None
+        self._current_entry = None
+
+    def _remove_old_bundles(self) -> None:
+        """Bundles are rebuilt on every run; drop those of the previous one."""
+        for name in os.listdir(self.bundle_dir):
+            if name.lower().endswith(".pdf") or name in (BUNDLE_MANIFEST_FILE,) or name.endswith(".pdf.tmp"):
+                try:
+                    os.remove(os.path.join(self.bundle_dir, name))
+                except OSError as e:
+                    logger.warning(f"Could not remove old bundle file {name}: {e}")
@@ -9,7 +9,11 @@ import logging
 import subprocess
 import time
 import sqlite3
-from typing import Dict, List, Any, Optional, Tuple
+import queue
+import heapq
+import itertools
+import collections
+from typing import Callable, Dict, List, Any, Optional, Iterable, Tuple, NamedTuple
 import re
 from pathlib import Path # Added
 import sys # Added
@@ -24,80 +28,302 @@ except ImportError:
 
 # Ensure core modules can be imported if run directly or imported
 try:
-    from core.session import get_current_session, get_session_dir, update_session_status, load_config
+    from core.session import get_current_session, get_session_dir, update_session_status, load_config, compute_file_hash
     from core.importer import get_table_data
     from core.logger import HTMLLogger
+    from core.pdf_scheduler import AdaptiveScheduler, plan_pool, DEFAULT_MIN_POOL_SECONDS, DEFAULT_TARGET_CHUNK_SECONDS
+    from core.html_generator import load_html_manifest, create_generated_indexes
+    from core.pdf_bundler import PdfBundler, bundle_settings_from_config, PYPDF_AVAILABLE
 except ImportError:
     # Adjust path if running as a script might require this
     SCRIPT_DIR = Path(__file__).resolve().parent
     PROJECT_ROOT = SCRIPT_DIR.parent.parent
     sys.path.insert(0, str(PROJECT_ROOT))
-    from core.session import get_current_session, get_session_dir, update_session_status, load_config
+    from core.session import get_current_session, get_session_dir, update_session_status, load_config, compute_file_hash
     from core.importer import get_table_data
     from core.logger import HTMLLogger
+    from core.pdf_scheduler import AdaptiveScheduler, plan_pool, DEFAULT_MIN_POOL_SECONDS, DEFAULT_TARGET_CHUNK_SECONDS
+    from core.html_generator import load_html_manifest, create_generated_indexes
+    from core.pdf_bundler import PdfBundler, bundle_settings_from_config, PYPDF_AVAILABLE
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+PROJECT_ROOT_DIR = Path(__file__).resolve().parent.parent
+
+# Present in the PDF directory while a run is in progress; left behind by an interrupted run
+PDF_RUN_MARKER = ".pdf_run.json"
+
+# The adaptive loop checks for lost chunks this often, and allows this long on
+# top of the converter timeout before giving up on a chunk that never returned
+WORKER_POLL_SECONDS = 1.0
+WORKER_STALL_GRACE_SECONDS = 30.0
+
+
+def read_session_state(session_hash: Optional[str] = None) -> Tuple[Optional[str], str]:
+    """
+    Read the current document type and imported file from status.json.
+
+    Args:
+        session_hash: If given, only trust status.json when it belongs to this session
+
+    Returns:
+        Tuple of (document_type or None, input_file or "")
+    """
+    status_file_path = PROJECT_ROOT_DIR / "status.json"
+    if not status_file_path.exists():
+        logger.warning(f"status.json not found at {status_file_path}. Cannot determine document type.")
+        return None, ""
+    try:
+        with open(status_file_path, 'r', encoding='utf-8') as f:
+            current_state = json.load(f).get("current_state", {})
+        if session_hash and current_state.get("hash") != session_hash:
+            logger.warning(f"Session hash in status.json does not match current session {session_hash}. Cannot determine document type.")
+            return None, ""
+        return current_state.get("document_type"), current_state.get("imported_file", "")
+    except (json.JSONDecodeError, OSError, TypeError, AttributeError) as e:
+        logger.error(f"Error reading status.json: {e}")
+        return None, ""
+
+
+class PdfMargins(NamedTuple):
+    """Page margins as CSS lengths (e.g. "10mm")."""
+    top: str = "10mm"
+    bottom: str = "10mm"
+    left: str = "10mm"
+    right: str = "10mm"
+
+
+class PdfSettings(NamedTuple):
+    """
+    PDF settings for one run, resolved once and shared (read-only) by all workers.
+    """
+    generator: str
+    wkhtmltopdf_path: str
+    page_size: str
+    orientation: str
+    margins: PdfMargins
+    extra_options: Tuple[str, ...]
+    timeout: int
+    css_files: Tuple[str, ...]
+    document_type: Optional[str] = None
+    batch_size: int = 1
+
+    def wkhtmltopdf_args(self) -> List[str]:
+        """Command line options shared by every wkhtmltopdf invocation of the run."""
+        return [
+            "--enable-local-file-access",
+            "--load-error-handling", "ignore",
+            "--load-media-error-handling", "ignore",
+            "--quiet",
+            "--page-size", self.page_size,
+            "--orientation", self.orientation,
+            "--margin-top", self.margins.top,
+            "--margin-bottom", self.margins.bottom,
+            "--margin-left", self.margins.left,
+            "--margin-right", self.margins.right,
+            *self.extra_options,
+        ]
+
+
+def load_schema_layout(document_type: Optional[str]) -> Dict[str, Any]:
+    """
+    Find the schema for a document type and return its ``layout`` section.
+
+    Args:
+        document_type: Document type to look up
+
+    Returns:
+        The layout dict, or an empty dict if there is no matching schema/layout
+    """
+    if not document_type:
+        logger.info("Document type not determined, using default margins.")
+        return {}
+
+    schema_dir = PROJECT_ROOT_DIR / "schemas"
+    if not schema_dir.is_dir():
+        logger.warning(f"Schemas directory not found: {schema_dir}")
+        return {}
+
+    for schema_file_path in sorted(schema_dir.glob('*.json')):
+        try:
+            with open(schema_file_path, 'r', encoding='utf-8') as sf:
+                schema_content = json.load(sf)
+        except json.JSONDecodeError as json_err:
+            logger.warning(f"Error decoding JSON from schema file {schema_file_path.name}: {json_err}")
+            continue
+        except Exception as read_err:
+            logger.warning(f"Error reading schema file {schema_file_path.name}: {read_err}")
+            continue
+
+        if schema_content.get("type") == document_type:
+            logger.debug(f"Found matching schema: {schema_file_path.name}")
+            layout = schema_content.get("layout", {})
+            if not layout:
+                logger.debug(f"Schema '{schema_file_path.name}' does not have a 'layout' section.")
+            return layout
+
+    logger.warning(f"No schema file found with type '{document_type}' in {schema_dir}.")
+    return {}
+
+
+def resolve_pdf_settings(config: Dict[str, Any], document_type: Optional[str] = None,
+                         html_dir: Optional[str] = None) -> PdfSettings:
+    """
+    Resolve the PDF settings for a run from config, the document schema and defaults.
+
+    Margins come from ``pdf.margin`` / ``pdf.margin_<side>`` and are overridden by
+    the schema's ``layout.margins``. WeasyPrint CSS files come from
+    ``pdf.weasyprint_css_files`` or, if none exist, a ``style.css`` next to the
+    HTML files or in the session's ``www/assets``.
+
+    Args:
+        config: Full application config
+        document_type: Document type of the session (for schema margins)
+        html_dir: Directory holding the HTML files (for default CSS lookup)
+
+    Returns:
+        Frozen PdfSettings
+    """
+    pdf_config = config.get("pdf", {})
+
+    # Uses the 'margin' key from the config as the base default
+    default_margin = pdf_config.get("margin", "10mm")
+    margins = {
+        "top": pdf_config.get("margin_top", default_margin),
+        "bottom": pdf_config.get("margin_bottom", default_margin),
+        "left": pdf_config.get("margin_left", default_margin),
+        "right": pdf_config.get("margin_right", default_margin)
+    }
+
+    try:
+        schema_margins = load_schema_layout(document_type).get("margins", {})
+    except Exception as e:
+        logger.warning(f"Could not load schema information for margins due to error: {e}", exc_info=True)
+        schema_margins = {}
+    if schema_margins:
+        logger.info(f"Applying margins from schema for '{document_type}': {schema_margins}")
+        margins.update(schema_margins)
+    else:
+        logger.info(f"Using default/config margins: {margins}")
+
+    extra_options = pdf_config.get("wkhtmltopdf_options", [])
+    if not isinstance(extra_options, list):
+        logger.warning(f"wkhtmltopdf_options in config is not a list: {extra_options}")
+        extra_options = []
+
+    css_files = []
+    css_files_config = pdf_config.get("weasyprint_css_files", [])
+    if isinstance(css_files_config, list):
+        for css_file in css_files_config:
+            if Path(css_file).exists():
+                if str(css_file) not in css_files:
+                    css_files.append(str(css_file))
+            else:
+                logger.warning(f"Configured Weasyprint CSS file not found: {css_file}")
+    else:
+        logger.warning(f"Config key 'pdf.weasyprint_css_files' is not a list.")
+
+    # Check default locations if no specific CSS is configured
+    if not css_files and html_dir:
+        for default_css in (Path(html_dir) / "style.css", Path(html_dir).parent / "www" / "assets" / "style.css"):
+            if default_css.exists():
+                css_files.append(str(default_css))
+                logger.info(f"Using default CSS for Weasyprint: {default_css}")
+                break
+
+    return PdfSettings(
+        generator=pdf_config.get("generator", "wkhtmltopdf").lower(),
+        wkhtmltopdf_path=pdf_config.get("wkhtmltopdf", "wkhtmltopdf"),
+        page_size=pdf_config.get("page_size", "A4"),
+        orientation=pdf_config.get("orientation", "Portrait"),
+        margins=PdfMargins(**{side: str(margins[side]) for side in PdfMargins._fields}),
+        extra_options=tuple(str(option) for option in extra_options),
+        timeout=pdf_config.get("timeout", 60),
+        css_files=tuple(css_files),
+        document_type=document_type,
+        batch_size=max(1, int(pdf_config.get("wkhtmltopdf_batch_size", 1))),
+    )
+
+
 # --- Worker Function (Top Level) ---
+def _pdf_target(html_file: str, pdf_dir: str) -> Tuple[str, str]:
+    """
+    Work out the PDF file name and path for an HTML file.
+
+    Returns:
+        Tuple of (pdf_file, pdf_path)
+    """
+    # Ensure pdf filename replaces .html (case-insensitive) and .htm
+    pdf_base = re.sub(r'\.(html|htm)$', '', html_file, flags=re.IGNORECASE)
+    pdf_file = f"{pdf_base}.pdf"
+    return pdf_file, os.path.join(pdf_dir, pdf_file)
+
+
+def _html_fingerprint(html_path: str) -> Dict[str, Any]:
+    """
+    Content hash and mtime of an HTML file, taken before it is converted.
+
+    Stored with the PDF result so an incremental run can tell whether the PDF
+    still matches its HTML. Empty if the file can't be read.
+    """
+    try:
+        html_mtime = os.stat(html_path).st_mtime
+        return {"html_sha256": compute_file_hash(html_path), "html_mtime": html_mtime}
+    except OSError as e:
+        logger.warning(f"Could not fingerprint {html_path}: {e}")
+        return {}
+
+
+def _is_transient_error(error: BaseException) -> bool:
+    """
+    Whether a conversion error is worth retrying: timeouts, memory pressure
+    and OS-level failures (e.g. too many processes), but not a missing file
+    or executable.
+    """
+    if isinstance(error, FileNotFoundError):
+        return False
+    return isinstance(error, (subprocess.TimeoutExpired, MemoryError, OSError))
+
+
+def _discard_failed_pdf(pdf_path: str) -> None:
+    """Remove a partial or stale PDF left behind by a failed conversion."""
+    try:
+        os.remove(pdf_path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Could not remove PDF of failed conversion {pdf_path}: {e}")
+
+
 def _process_html_file_worker(
     html_file: str,
     html_dir: str,
     pdf_dir: str,
-    pdf_method: str,
-    config: Dict[str, Any] # Pass full config for generator functions
+    settings: PdfSettings # Resolved once per run in generate_pdfs
 ) -> Dict[str, Any]:
     """
     Worker function to convert a single HTML file to PDF.
     Moved outside generate_pdfs for multiprocessing compatibility.
     """
     html_path = os.path.join(html_dir, html_file)
-    # Ensure pdf filename replaces .html (case-insensitive) and .htm
-    pdf_base = re.sub(r'\.(html|htm)$', '', html_file, flags=re.IGNORECASE)
-    pdf_file = f"{pdf_base}.pdf"
-    pdf_path = os.path.join(pdf_dir, pdf_file)
-
-    # Try to extract row number from filename (improved extraction)
-    row_number = None
-    # Matches _<digits>.<extension> at the end
-    match = re.search(r'_(\d+)\.(html|htm)$', html_file, re.IGNORECASE)
-    if match:
-        try:
-            row_number = int(match.group(1))
-        except (ValueError, IndexError):
-            logger.debug(f"Could not parse row number from suffix in {html_file}")
-            pass
-    # Fallback: try simple number before extension if no underscore match
-    if row_number is None:
-        # Matches <digits>.<extension> at the end
-        match = re.search(r'(\d+)\.(html|htm)$', html_file, re.IGNORECASE)
-        if match:
-            try:
-                # Avoid matching year/date as row number if filename has structure like YYYYMMDD_...
-                if not re.match(r'^\d{8}_', html_file):
-                     row_number = int(match.group(1))
-                else:
-                     logger.debug(f"Skipping potential row number match due to date-like prefix in {html_file}")
-            except (ValueError, IndexError):
-                 logger.debug(f"Could not parse row number from end of {html_file}")
-                 pass
-
-    if row_number is None:
-         logger.warning(f"Could not determine row number from filename: {html_file}")
-
+    pdf_file, pdf_path = _pdf_target(html_file, pdf_dir)
+    fingerprint = _html_fingerprint(html_path)
 
     start_time = time.time()
 
     try:
-        logger.debug(f"Worker converting {html_file} to PDF using {pdf_method}...")
+        logger.debug(f"Worker converting {html_file} to PDF using {settings.generator}...")
 
-        if pdf_method == "weasyprint":
-            result = generate_pdf_weasyprint(html_path, pdf_path, config)
+        if settings.generator == "weasyprint":
+            result = generate_pdf_weasyprint(html_path, pdf_path, settings)
         else: # Default to wkhtmltopdf
-            result = generate_pdf_wkhtmltopdf(html_path, pdf_path, config)
+            result = generate_pdf_wkhtmltopdf(html_path, pdf_path, settings)
 
         end_time = time.time()
         conversion_time = end_time - start_time
+        if not result["success"]:
+            _discard_failed_pdf(pdf_path)
 
         # Return necessary info for DB insert later
         return {
@@ -105,70 +331,99 @@ def _process_html_file_worker(
             "pdf_file": pdf_file,
             "success": result["success"],
             "error": result.get("error"),
+            "transient": result.get("transient", False),
             "conversion_time": conversion_time,
-            "row_number": row_number # Include extracted row number (can be None)
+            **fingerprint
         }
 
     except Exception as e:
         # Catch any unexpected error in the worker
         logger.error(f"Unexpected error in worker for {html_file}: {e}", exc_info=True)
+        _discard_failed_pdf(pdf_path)
         return {
             "html_file": html_file,
             "pdf_file": pdf_file,
             "success": False,
             "error": f"Worker unexpected error: {str(e)}",
-            "conversion_time": time.time() - start_time,
-            "row_number": row_number
+            "transient": _is_transient_error(e),
+            "conversion_time": time.time() - start_time
         }
-# === END WORKER FUNCTION ===
 
-# --- Main PDF Generation Function ---
-def generate_pdfs() -> Dict[str, Any]:
-    """
-    Generate PDF files from HTML files for the current session.
-    Uses parallel processing for improved performance if available and beneficial.
 
-    Returns:
-        Dict containing generation results
-
-    Raises:
-        ValueError: If no active session found
-        RuntimeError: If PDF generation fails
+def _process_html_batch_worker(
+    html_files: List[str],
+    html_dir: str,
+    pdf_dir: str,
+    settings: PdfSettings
+) -> List[Dict[str, Any]]:
     """
-    # Get current session
-    session_hash = get_current_session()
-    if not session_hash:
-        raise ValueError("No active session found")
+    Worker function to convert a batch of HTML files with one wkhtmltopdf process.
 
-    logger.info(f"Starting PDF generation for session: {session_hash}")
+    Returns one result per HTML file, in the same shape as _process_html_file_worker.
+    The batch's wall time is split evenly across its documents.
+    """
+    jobs = []
+    fingerprints = []
+    for html_file in html_files:
+        pdf_file, pdf_path = _pdf_target(html_file, pdf_dir)
+        html_path = os.path.join(html_dir, html_file)
+        jobs.append((html_file, html_path, pdf_file, pdf_path))
+        fingerprints.append(_html_fingerprint(html_path))
 
-    # Load config
+    start_time = time.time()
     try:
-        config = load_config()
+        batch_results = generate_pdf_wkhtmltopdf_batch([(job[1], job[3]) for job in jobs], settings)
     except Exception as e:
-         logger.error(f"Failed to load configuration: {e}", exc_info=True)
-         # Provide a minimal default config to attempt continuation
-         config = {"pdf": {}}
+        logger.error(f"Unexpected error in batch worker: {e}", exc_info=True)
+        batch_results = [{"success": False, "error": f"Worker unexpected error: {str(e)}",
+                          "transient": _is_transient_error(e)}] * len(jobs)
+    per_document_time = (time.time() - start_time) / len(jobs) if jobs else 0
 
-    pdf_config = config.get("pdf", {})
+    for (_, _, _, pdf_path), result in zip(jobs, batch_results):
+        if not result["success"]:
+            _discard_failed_pdf(pdf_path)
 
-    # Get paths
-    try:
-        session_dir = get_session_dir(session_hash)
-        html_dir = os.path.join(session_dir, "html")
-        pdf_dir = os.path.join(session_dir, "pdf")
-    except ValueError as e:
-         logger.error(f"Error getting session directory: {e}")
-         raise RuntimeError(f"Cannot get session directory: {e}")
+    return [
+        {
+            "html_file": html_file,
+            "pdf_file": pdf_file,
+            "success": result["success"],
+            "error": result.get("error"),
+            "transient": result.get("transient", False),
+            "conversion_time": per_document_time,
+            **fingerprint
+        }
+        for (html_file, _, pdf_file, _), result, fingerprint in zip(jobs, batch_results, fingerprints)
+    ]
 
-    # Ensure PDF directory exists
-    try:
-        os.makedirs(pdf_dir, exist_ok=True)
-    except OSError as e:
-        logger.error(f"Failed to create PDF directory {pdf_dir}: {e}")
-        raise RuntimeError(f"Failed to create PDF directory: {e}")
 
-    # --- Clear existing PDF files ---
+def process_pdf_task(task: Tuple) -> List[Dict[str, Any]]:
+    """
+    Single-argument worker for ``imap_unordered``: a task whose first item is
+    a list is a batch, otherwise a single file. Always returns a list of results.
+    """
+    if isinstance(task[0], list):
+        return _process_html_batch_worker(*task)
+    return [_process_html_file_worker(*task)]
+
+
+def process_pdf_chunk(tasks: List[Tuple]) -> List[Dict[str, Any]]:
+    """
+    Worker for a chunk of tasks sent in one round trip; returns all their results.
+    """
+    results = []
+    for task in tasks:
+        results.extend(process_pdf_task(task))
+    return results
+# === END WORKER FUNCTION ===
+
+def clean_pdf_dir(pdf_dir: str) -> int:
+    """
+    Remove all existing PDF files from the PDF output directory.
+
+    Returns:
+        Number of files removed
+    """
     logger.info(f"Cleaning existing PDF files in {pdf_dir}")
     deleted_count = 0
     try:
@@ -186,188 +441,608 @@ def generate_pdfs() -> Dict[str, Any]:
     except OSError as e:
         logger.error(f"Error listing or cleaning PDF directory {pdf_dir}: {e}")
         # Decide if this is critical, maybe just log and continue
+    return deleted_count
 
-    # --- Find HTML files ---
-    if not os.path.exists(html_dir):
-        logger.error(f"HTML directory not found: {html_dir}")
-        return {
-            "num_files": 0, "pdf_files": [],
-            "errors": [{"error": f"HTML directory not found: {html_dir}"}],
-            "total_time": 0, "log_file": None
-        }
 
-    try:
-        html_files = [f for f in os.listdir(html_dir) if f.lower().endswith((".html", ".htm"))]
-    except OSError as e:
-         logger.error(f"Error listing HTML files in {html_dir}: {e}")
-         raise RuntimeError(f"Failed to list HTML files: {e}")
+def create_pdf_pool(settings: PdfSettings, pdf_config: Dict[str, Any],
+                    num_workers: Optional[int] = None) -> "multiprocessing.pool.Pool":
+    """
+    Create the worker pool for a PDF run.
 
+    WeasyPrint gets a long-lived pool: each worker imports WeasyPrint and warms
+    fonts/CSS once, and is replaced after ``pdf.weasyprint_max_tasks_per_worker``
+    documents to cap memory growth. wkhtmltopdf workers only spawn processes,
+    so they need no setup.
 
-    if not html_files:
-        logger.warning(f"No HTML files found in {html_dir}")
-        return {
-            "num_files": 0, "pdf_files": [], "errors": [],
-             "total_time": 0, "log_file": None
+    Args:
+        settings: Resolved PdfSettings
+        pdf_config: The ``pdf`` section of the config
+        num_workers: Worker count; defaults to the configured count capped by the CPU count
+
+    Raises:
+        RuntimeError: If multiprocessing is not available
+    """
+    if not MULTIPROCESSING_AVAILABLE or not multiprocessing:
+        raise RuntimeError("Multiprocessing module was not imported correctly.")
+
+    multiprocessing_workers = pdf_config.get("multiprocessing_workers", 4)
+    if settings.generator == "weasyprint":
+        if num_workers is None:
+            num_workers = min(multiprocessing.cpu_count(), pdf_config.get("weasyprint_workers", multiprocessing_workers))
+        max_tasks = pdf_config.get("weasyprint_max_tasks_per_worker", 200) or None
+        logger.info(f"Using WeasyPrint worker pool with {num_workers} workers, recycled every {max_tasks} documents...")
+        return multiprocessing.Pool(processes=num_workers,
+                                    initializer=_init_weasyprint_worker,
+                                    initargs=(settings,),
+                                    maxtasksperchild=max_tasks)
+
+    if num_workers is None:
+        num_workers = min(multiprocessing.cpu_count(), multiprocessing_workers)
+    logger.info(f"Using multiprocessing with {num_workers} workers...")
+    return multiprocessing.Pool(processes=num_workers)
+
+
+class RetryQueue:
+    """
+    Hold documents whose conversion failed transiently (e.g. a timeout) for
+    another attempt after an exponential backoff.
+
+    Each document is retried at most ``max_retries`` times; the n-th retry
+    waits ``backoff * 2**(n-1)`` seconds.
+    """
+
+    def __init__(self, max_retries: int = 0, backoff: float = 0.0, clock=time.monotonic):
+        self.max_retries = max(0, int(max_retries))
+        self.backoff = max(0.0, float(backoff))
+        self.retried = 0
+        self._clock = clock
+        self._attempts: Dict[str, int] = {}
+        self._heap: List[Tuple[float, int, Tuple]] = []
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def offer(self, result: Dict[str, Any], task: Tuple) -> bool:
+        """
+        Queue ``task`` again if ``result`` is a transient failure with retries left.
+
+        Returns:
+            True if the document will be retried (so the result is not final)
+        """
+        if result["success"] or not result.get("transient"):
+            return False
+        html_file = result["html_file"]
+        attempts = self._attempts.get(html_file, 0)
+        if attempts >= self.max_retries:
+            return False
+        self._attempts[html_file] = attempts + 1
+        self.retried += 1
+        delay = self.backoff * (2 ** attempts)
+        heapq.heappush(self._heap, (self._clock() + delay, next(self._sequence), task))
+        logger.warning(f"Retrying {html_file} in {delay:.1f}s (retry {attempts + 1} of {self.max_retries}): {result.get('error')}")
+        return True
+
+    def ready(self) -> List[Tuple]:
+        """Take the tasks whose backoff has passed."""
+        now = self._clock()
+        tasks = []
+        while self._heap and self._heap[0][0] <= now:
+            tasks.append(heapq.heappop(self._heap)[2])
+        return tasks
+
+    def wait_time(self) -> Optional[float]:
+        """Seconds until the next retry is due, or None if nothing is queued."""
+        if not self._heap:
+            return None
+        return max(0.0, self._heap[0][0] - self._clock())
+
+
+class _ResultCollector:
+    """
+    Gather worker results: transient failures go to the retry queue, final
+    results are kept and passed to ``on_result`` (e.g. a PdfCheckpoint) straight away.
+    """
+
+    def __init__(self, task_context: Tuple, retries: RetryQueue,
+                 on_result: Optional[Callable[[Dict[str, Any]], None]] = None):
+        self.task_context = task_context
+        self.retries = retries
+        self.on_result = on_result
+        self.results: List[Dict[str, Any]] = []
+        self.handled: set = set()
+
+    def add(self, task_results: List[Dict[str, Any]]) -> None:
+        for result in task_results:
+            self.handled.add(result["html_file"])
+            if self.retries.offer(result, (result["html_file"],) + self.task_context):
+                continue
+            self.results.append(result)
+            if self.on_result:
+                self.on_result(result)
+
+    def unhandled(self, tasks: List[Tuple]) -> List[Tuple]:
+        """Tasks none of whose documents have produced a result yet."""
+        return [task for task in tasks
+                if not any(name in self.handled for name in (task[0] if isinstance(task[0], list) else [task[0]]))]
+
+    def drain_retries(self) -> None:
+        """Run the queued retries in this process, waiting out their backoff."""
+        while len(self.retries):
+            time.sleep(self.retries.wait_time() or 0)
+            for task in self.retries.ready():
+                self.add(process_pdf_task(task))
+
+
+def _stall_seconds(chunks: Iterable[List[Tuple]], settings: PdfSettings, pdf_config: Dict[str, Any]) -> float:
+    """
+    How long the adaptive loop waits without any result before it gives up on the chunks in flight.
+
+    Every document is bounded by the converter timeout, so a live worker
+    answers well within this; ``pdf.stall_timeout`` overrides it.
+    """
+    if pdf_config.get("stall_timeout"):
+        return float(pdf_config["stall_timeout"])
+    documents = max(sum(len(task[0]) if isinstance(task[0], list) else 1 for task in chunk) for chunk in chunks)
+    return documents * settings.timeout + WORKER_STALL_GRACE_SECONDS
+
+
+def _give_up_lost_chunks(outstanding: Dict[int, List[Tuple]], collector: _ResultCollector) -> None:
+    """
+    Record the documents of chunks that never came back (e.g. their worker was
+    OOM-killed) as transient failures, so the retry queue submits them again.
+    """
+    documents = []
+    for chunk in outstanding.values():
+        for task in chunk:
+            documents.extend(task[0] if isinstance(task[0], list) else [task[0]])
+    logger.error(f"No PDF results for {len(outstanding)} chunks ({len(documents)} documents); "
+                 f"their workers are presumed dead. Retrying them.")
+    outstanding.clear()
+    collector.add([
+        {
+            "html_file": html_file,
+            "pdf_file": _pdf_target(html_file, "")[0],
+            "success": False,
+            "error": "PDF worker was lost (killed or stalled) before returning a result",
+            "transient": True,
+            "conversion_time": 0.0,
         }
+        for html_file in documents
+    ])
 
-    logger.info(f"Found {len(html_files)} HTML files to convert to PDF")
 
-    # --- Load session info (document type, input file) ---
-    document_type = "unknown"
-    input_file = ""
-    try:
-        # Find status.json relative to the project structure
-        project_root_dir = Path(__file__).resolve().parent.parent.parent
-        status_file_path = project_root_dir / "status.json"
-        if status_file_path.exists():
-            with open(status_file_path, 'r', encoding='utf-8') as f:
-                status = json.load(f)
-                # Verify hash matches current session if status file is shared
-                if status.get("current_state", {}).get("hash") == session_hash:
-                    document_type = status.get("current_state", {}).get("document_type", "unknown")
-                    input_file = status.get("current_state", {}).get("imported_file", "")
-                else:
-                     logger.warning(f"Session hash in status.json does not match current session {session_hash}. Cannot determine document type.")
-        else:
-            logger.warning(f"status.json not found at {status_file_path}. Cannot determine document type.")
-    except (json.JSONDecodeError, FileNotFoundError, OSError, TypeError) as e:
-        logger.error(f"Error reading status.json: {e}")
+def run_pdf_tasks_adaptive(tasks: List[Tuple], settings: PdfSettings, pdf_config: Dict[str, Any],
+                           on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+                           retries: Optional[RetryQueue] = None) -> List[Dict[str, Any]]:
+    """
+    Run PDF tasks with a pool sized from the machine and an adaptive in-flight limit.
+
+    The first task is converted in this process to measure latency. If the
+    rest would take less than ``pdf.min_pool_seconds`` sequentially, or only
+    one worker fits, no pool is started. Otherwise chunks of tasks are
+    submitted with ``apply_async``, keeping as many in flight as the
+    AdaptiveScheduler allows. A chunk whose worker raised is converted again
+    in this process. If no result arrives for longer than a chunk can take
+    (see _stall_seconds), the chunks in flight are taken as lost with their
+    workers and their documents go to the retry queue. Transient failures are
+    resubmitted once their backoff has passed.
+
+    Args:
+        tasks: Tasks as accepted by process_pdf_task
+        settings: Resolved PdfSettings
+        pdf_config: The ``pdf`` section of the config
+        on_result: Called with every final result as soon as it is in
+        retries: Retry queue for transient failures; none are retried without it
 
+    Returns:
+        One result per document, flattened across batches
+    """
+    if not tasks:
+        return []
+
+    retries = retries if retries is not None else RetryQueue()
+    collector = _ResultCollector(tasks[0][1:], retries, on_result)
+    plan = plan_pool(settings.generator, pdf_config, len(tasks))
+    scheduler = AdaptiveScheduler(
+        plan.workers,
+        target_chunk_seconds=pdf_config.get("target_chunk_seconds", DEFAULT_TARGET_CHUNK_SECONDS)
+    )
+    pending = collections.deque(tasks)
+
+    def run_here(task: Tuple) -> None:
+        task_start = time.perf_counter()
+        task_results = process_pdf_task(task)
+        collector.add(task_results)
+        scheduler.record(time.perf_counter() - task_start, len(task_results))
+
+    run_here(pending.popleft())
+
+    min_pool_seconds = pdf_config.get("min_pool_seconds", DEFAULT_MIN_POOL_SECONDS)
+    estimate = scheduler.estimate_seconds(len(pending))
+    if not pending or plan.workers <= 1 or not MULTIPROCESSING_AVAILABLE or estimate < min_pool_seconds:
+        logger.info(f"Converting {len(tasks)} tasks sequentially (workers available: {plan.workers}, "
+                    f"estimated {estimate:.1f}s for the rest)")
+        while pending:
+            run_here(pending.popleft())
+        collector.drain_retries()
+        return collector.results
+
+    logger.info(f"Adaptive PDF scheduling: up to {plan.workers} workers (limited by {plan.limited_by}; "
+                f"{plan.cores} cores, {plan.memory_mb or 0:.0f} MB available), "
+                f"{scheduler.latency:.3f}s per task measured")
+
+    # WeasyPrint workers are recycled per task, so one document per task keeps that count meaningful
+    one_per_chunk = settings.generator == "weasyprint"
+    done: "queue.Queue[Tuple[int, Optional[List[Dict[str, Any]]], Optional[BaseException]]]" = queue.Queue()
+    chunk_ids = itertools.count()
+    try:
+        with create_pdf_pool(settings, pdf_config, num_workers=plan.workers) as pool:
+            # Chunks submitted and not yet answered; a chunk whose worker was killed is never answered
+            outstanding: Dict[int, List[Tuple]] = {}
+            last_progress = time.monotonic()
+            while pending or outstanding or len(retries):
+                pending.extend(retries.ready())
+                while pending and len(outstanding) < scheduler.limit:
+                    size = 1 if one_per_chunk else scheduler.chunk_size(len(pending))
+                    chunk = [pending.popleft() for _ in range(size)]
+                    chunk_id = next(chunk_ids)
+                    if not outstanding:
+                        last_progress = time.monotonic()
+                    outstanding[chunk_id] = chunk
+                    pool.apply_async(
+                        process_pdf_chunk, (chunk,),
+                        callback=lambda res, i=chunk_id: done.put((i, res, None)),
+                        error_callback=lambda err, i=chunk_id: done.put((i, None, err))
+                    )
+
+                if not outstanding:
+                    time.sleep(retries.wait_time() or 0)
+                    continue
+                wait = retries.wait_time()
+                try:
+                    chunk_id, chunk_results, error = done.get(
+                        timeout=WORKER_POLL_SECONDS if wait is None else min(wait, WORKER_POLL_SECONDS)
+                    )
+                except queue.Empty:
+                    if time.monotonic() - last_progress > _stall_seconds(outstanding.values(), settings, pdf_config):
+                        _give_up_lost_chunks(outstanding, collector)
+                    continue
+                chunk = outstanding.pop(chunk_id, None)
+                if chunk is None:
+                    logger.warning("Ignoring the late result of a PDF chunk that was already given up on")
+                    continue
+                last_progress = time.monotonic()
+                if error is not None:
+                    logger.error(f"PDF worker failed on a chunk of {len(chunk)} tasks: {error}. Converting them here.")
+                    for task in chunk:
+                        run_here(task)
+                    continue
+                collector.add(chunk_results)
+                # Worker-side time per task; the wall clock between submission and result would include queueing
+                chunk_seconds = sum(result.get("conversion_time", 0.0) for result in chunk_results)
+                scheduler.record(chunk_seconds / len(chunk), len(chunk_results))
+    except Exception as mp_err:
+        logger.error(f"Multiprocessing pool failed: {mp_err}. Converting the remaining tasks sequentially.", exc_info=True)
+        for task in collector.unhandled(tasks):
+            run_here(task)
+        collector.drain_retries()
+
+    logger.info(f"Adaptive PDF scheduling finished with {scheduler.limit} tasks in flight "
+                f"({scheduler.adjustments} adjustments, {scheduler.latency:.3f}s per task)")
+    return collector.results
+
+
+def run_pdf_tasks_fixed(tasks: List[Tuple], settings: PdfSettings, pdf_config: Dict[str, Any],
+                        on_result: Optional[Callable[[Dict[str, Any]], None]] = None,
+                        retries: Optional[RetryQueue] = None) -> List[Dict[str, Any]]:
+    """
+    Run PDF tasks with ``pdf.multiprocessing_workers`` workers once there are
+    more than ``pdf.multiprocessing_threshold`` of them, sequentially otherwise.
 
-    # --- Determine PDF method and prepare tasks ---
-    pdf_method = pdf_config.get("generator", "wkhtmltopdf").lower()
-    tasks = [
-        (html_file, html_dir, pdf_dir, pdf_method, config) # Pass full config
-        for html_file in html_files
-    ]
+    Results are handed to ``on_result`` as they complete; transient failures
+    are retried in this process after the pool is done.
+    """
+    if not tasks:
+        return []
 
-    # --- Execute Tasks (Parallel or Sequential) ---
-    results = []
+    retries = retries if retries is not None else RetryQueue()
+    collector = _ResultCollector(tasks[0][1:], retries, on_result)
+    pdf_method = settings.generator
     multiprocessing_threshold = pdf_config.get("multiprocessing_threshold", 50)
     multiprocessing_workers = pdf_config.get("multiprocessing_workers", 4)
 
+    weasyprint_workers = pdf_config.get("weasyprint_workers", multiprocessing_workers)
+
+    num_documents = sum(len(task[0]) if isinstance(task[0], list) else 1 for task in tasks)
     use_multiprocessing = (
         MULTIPROCESSING_AVAILABLE and
-        len(html_files) > multiprocessing_threshold and
-        pdf_method == "wkhtmltopdf" # Often WeasyPrint doesn't benefit as much or has issues
+        num_documents > multiprocessing_threshold and
+        (pdf_method == "wkhtmltopdf" or (pdf_method == "weasyprint" and weasyprint_workers > 1))
     )
 
-    start_pool_time = time.time()
     if use_multiprocessing:
-        num_workers = min(multiprocessing.cpu_count(), multiprocessing_workers)
-        logger.info(f"Using multiprocessing with {num_workers} workers (threshold: {multiprocessing_threshold})...")
         try:
             # Ensure the worker function is picklable (defined at top level)
-            if multiprocessing: # Check again as it's defined as None if import fails
-                with multiprocessing.Pool(processes=num_workers) as pool:
-                    results = pool.starmap(_process_html_file_worker, tasks)
-            else:
-                 raise RuntimeError("Multiprocessing module was not imported correctly.") # Should not happen if check passed
+            with create_pdf_pool(settings, pdf_config) as pool:
+                # chunksize=1 so WeasyPrint's maxtasksperchild counts documents
+                chunksize = 1 if pdf_method == "weasyprint" else max(1, len(tasks) // (multiprocessing_workers * 4))
+                for task_results in pool.imap_unordered(process_pdf_task, tasks, chunksize=chunksize):
+                    collector.add(task_results)
         except Exception as mp_err:
              logger.error(f"Multiprocessing pool failed: {mp_err}. Falling back to sequential processing.", exc_info=True)
              use_multiprocessing = False # Ensure sequential fallback runs
-             results = [] # Reset results
     else:
         logger.info("Processing sequentially (multiprocessing disabled, not available, threshold not met, or method unsuitable)...")
 
     # Run sequentially if multiprocessing was disabled or failed
     if not use_multiprocessing:
-        # Call the top-level worker function correctly
-        results = [_process_html_file_worker(*task_args) for task_args in tasks]
+        for task in collector.unhandled(tasks):
+            collector.add(process_pdf_task(task))
 
-    end_pool_time = time.time()
-    logger.info(f"PDF conversion process took {end_pool_time - start_pool_time:.2f} seconds.")
+    collector.drain_retries()
+    return collector.results
 
 
-    # --- Process results and handle DB inserts in the main thread ---
-    pdf_files = []
-    errors = []
-    conversion_times = []
-    db_conn = None
-    generated_table_name = None
+def record_pdf_result(cursor: sqlite3.Cursor, generated_table_name: str, document_type: str,
+                      input_file: str, result: Dict[str, Any], row_number: Optional[int] = None,
+                      html_id: Optional[int] = None) -> int:
+    """
+    Insert a conversion result into ``generated_<hash>``.
 
-    try:
-        # Initialize database connection
-        db_path = os.path.join(session_dir, "data.db")
-        db_conn = sqlite3.connect(db_path, timeout=10) # Add timeout
-        cursor = db_conn.cursor()
+    Successful conversions are stored with the content hash and mtime of the
+    HTML they were made from; failed ones with ``status`` "failed" and the
+    error, so an incremental run knows to retry them.
+
+    Args:
+        cursor: Cursor on the session database
+        generated_table_name: Name of the generated_<hash> table
+        document_type: Document type of the session
+        input_file: Imported source file
+        result: Worker result dict
+        row_number: Source row from the HTML manifest (0 if unknown)
+        html_id: Id of the HTML document's generated_<hash> entry, if known
 
-        # Get the table hash and check table existence
+    Returns:
+        Id of the inserted row
+    """
+    if result["success"]:
+        db_data = {"file": result["html_file"], "converted_to": result["pdf_file"], "status": "success"}
+    else:
+        db_data = {"file": result["html_file"], "status": "failed", "error": result.get("error")}
+    for key in ("html_sha256", "html_mtime"):
+        if key in result:
+            db_data[key] = result[key]
+    if html_id is not None:
+        db_data["html_id"] = html_id
+    # The row column is NOT NULL; documents missing from the manifest are recorded as row 0
+    if row_number is None:
+         row_number = 0
+
+    cursor.execute(
+        f"INSERT INTO {generated_table_name} (document_type, mime_type, input_file, row, data) VALUES (?, ?, ?, ?, ?)",
+        (
+            document_type,
+            "application/pdf",
+            input_file,
+            row_number,
+            json.dumps(db_data)
+        )
+    )
+    return cursor.lastrowid
+
+
+def load_pdf_state(cursor: sqlite3.Cursor, generated_table_name: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Load the most recent PDF result recorded for each HTML file.
+
+    Returns:
+        Dict mapping HTML file name to its latest result data, with the ids of
+        all of its PDF records under ``"ids"``
+    """
+    state: Dict[str, Dict[str, Any]] = {}
+    cursor.execute(f"SELECT id, data FROM {generated_table_name} WHERE mime_type = 'application/pdf' ORDER BY id")
+    for record_id, data in cursor.fetchall():
         try:
-            table_hash, _, _ = get_table_data(session_hash) # Requires DB access
-            generated_table_name = f"generated_{table_hash}"
-            cursor.execute(f"SELECT name FROM sqlite_master WHERE type='table' AND name='{generated_table_name}'")
-            table_exists = cursor.fetchone() is not None
-            if not table_exists:
-                logger.warning(f"Table {generated_table_name} not found. PDF metadata won't be saved.")
-                generated_table_name = None
-        except Exception as db_err:
-             logger.error(f"Could not get table hash or check table existence: {db_err}. PDF metadata won't be saved.")
-             generated_table_name = None
-
-        # Process results from workers
-        for result in results:
-            if result["success"]:
-                pdf_files.append(result["pdf_file"])
-                conversion_times.append(result["conversion_time"])
-                logger.debug(f"Successfully generated PDF: {result['pdf_file']} in {result['conversion_time']:.2f} seconds")
-
-                # Save PDF metadata to database if table exists
-                if generated_table_name:
-                    try:
-                        db_data = {"file": result["html_file"], "converted_to": result["pdf_file"]}
-                        row_num_to_insert = result.get("row_number") # Can be None
-                        # Handle None row_number - decide on a convention (e.g., 0 or -1, or NULL if DB allows)
-                        if row_num_to_insert is None:
-                             row_num_to_insert = 0 # Or handle as NULL if schema allows
-
-                        cursor.execute(
-                            f"INSERT INTO {generated_table_name} (document_type, mime_type, input_file, row, data) VALUES (?, ?, ?, ?, ?)",
-                            (
-                                document_type,
-                                "application/pdf",
-                                input_file,
-                                row_num_to_insert,
-                                json.dumps(db_data)
-                            )
-                        )
-                        # Commit frequently or at the end? For robustness, maybe commit in batches or at end.
-                        # db_conn.commit() # Commit per insert can be slow
-                    except sqlite3.Error as e:
-                        logger.error(f"Error logging PDF generation to database for {result['pdf_file']}: {e}")
-                        # Decide whether to rollback or just log
-                        # db_conn.rollback()
-            else:
-                errors.append({
-                    "file": result["html_file"],
-                    "error": result["error"]
-                })
-                logger.error(f"Failed to generate PDF for {result['html_file']}: {result['error']}")
+            entry = json.loads(data)
+            html_file = entry["file"]
+        except (TypeError, ValueError, KeyError):
+            continue
+        ids = state[html_file]["ids"] if html_file in state else []
+        ids.append(record_id)
+        entry["ids"] = ids
+        state[html_file] = entry
+    return state
+
+
+def is_pdf_up_to_date(html_path: str, pdf_path: str, previous: Optional[Dict[str, Any]]) -> bool:
+    """
+    Check whether an existing PDF still matches its HTML file.
 
-        # Commit all successful DB inserts at the end
-        if generated_table_name:
+    The PDF is current if its last conversion succeeded, the file exists and
+    the HTML content hash is the one it was made from. The hash is only
+    computed when the HTML mtime differs from the recorded one or is newer
+    than the PDF; an HTML file that was rewritten with identical content is
+    not converted again.
+    """
+    if not previous or previous.get("status", "success") != "success" or not previous.get("html_sha256"):
+        return False
+    try:
+        pdf_mtime = os.stat(pdf_path).st_mtime
+        html_mtime = os.stat(html_path).st_mtime
+    except OSError:
+        return False
+
+    if html_mtime == previous.get("html_mtime") and html_mtime <= pdf_mtime:
+        return True
+    try:
+        return compute_file_hash(html_path) == previous["html_sha256"]
+    except OSError:
+        return False
+
+
+def select_pdf_work(html_files: List[str], html_dir: str, pdf_dir: str,
+                    state: Dict[str, Dict[str, Any]]) -> Tuple[List[str], List[str]]:
+    """
+    Split HTML files into those that need converting and those whose PDF is current.
+
+    Args:
+        html_files: HTML file names in ``html_dir``
+        html_dir: HTML directory
+        pdf_dir: PDF directory
+        state: Previous results from load_pdf_state
+
+    Returns:
+        Tuple of (files to convert, files already up to date)
+    """
+    to_convert, up_to_date = [], []
+    for html_file in html_files:
+        _, pdf_path = _pdf_target(html_file, pdf_dir)
+        if is_pdf_up_to_date(os.path.join(html_dir, html_file), pdf_path, state.get(html_file)):
+            up_to_date.append(html_file)
+        else:
+            to_convert.append(html_file)
+    return to_convert, up_to_date
+
+
+def prune_orphan_pdfs(pdf_dir: str, html_files: List[str]) -> int:
+    """
+    Remove PDFs whose HTML file no longer exists (e.g. replaced by a targeted HTML run).
+
+    Returns:
+        Number of files removed
+    """
+    expected = {_pdf_target(html_file, pdf_dir)[0] for html_file in html_files}
+    removed = 0
+    try:
+        pdf_files = [f for f in os.listdir(pdf_dir) if f.lower().endswith(".pdf")]
+    except OSError as e:
+        logger.error(f"Error listing PDF directory {pdf_dir}: {e}")
+        return 0
+    for pdf_file in pdf_files:
+        if pdf_file not in expected:
             try:
-                db_conn.commit()
-                logger.info("Committed PDF metadata inserts to database.")
-            except sqlite3.Error as e:
-                 logger.error(f"Failed to commit PDF metadata to database: {e}")
+                os.remove(os.path.join(pdf_dir, pdf_file))
+                removed += 1
+            except OSError as e:
+                logger.warning(f"Error removing orphaned PDF file {pdf_file}: {e}")
+    if removed:
+        logger.info(f"Removed {removed} PDF files without a matching HTML file.")
+    return removed
 
 
-    except sqlite3.Error as e:
-        logger.error(f"Database connection or operation error: {e}", exc_info=True)
-        # Add error to list? Maybe a general DB error.
-        errors.append({"file": "Database", "error": f"DB Error: {e}"})
-    except Exception as e:
-         logger.error(f"Unexpected error during result processing: {e}", exc_info=True)
-         errors.append({"file": "Processing", "error": f"General Error: {e}"})
-    finally:
-        # Ensure database connection is closed
-        if db_conn:
-            db_conn.close()
-            logger.debug("Database connection closed.")
+def delete_pdf_records(cursor: sqlite3.Cursor, generated_table_name: str, record_ids: List[int]) -> None:
+    """Delete PDF records from ``generated_<hash>`` by id, in chunks."""
+    for start in range(0, len(record_ids), 500):
+        chunk = record_ids[start:start + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(f"DELETE FROM {generated_table_name} WHERE id IN ({placeholders})", chunk)
 
 
-    # --- Final Steps ---
+class PdfCheckpoint:
+    """
+    Record PDF results in ``generated_<hash>`` as they complete.
+
+    Results are committed in small groups (``flush_every`` results, or after
+    ``flush_seconds``), so an interrupted run keeps everything converted so
+    far and no write transaction is left open between results. Without a
+    table name results are only counted.
+    """
+
+    def __init__(self, db_path: str, generated_table_name: Optional[str], document_type: str,
+                 input_file: str, flush_every: int = 50, flush_seconds: float = 1.0,
+                 check_same_thread: bool = True):
+        self.conn = sqlite3.connect(db_path, timeout=10, check_same_thread=check_same_thread)
+        self.generated_table_name = generated_table_name
+        self.document_type = document_type
+        self.input_file = input_file
+        self.flush_every = max(1, flush_every)
+        self.flush_seconds = flush_seconds
+        self.recorded = 0
+        self._unsaved: List[Tuple[Dict[str, Any], Optional[int], Optional[int]]] = []
+        self._last_flush = time.time()
+
+    def add(self, result: Dict[str, Any], row_number: Optional[int] = None,
+            html_id: Optional[int] = None) -> None:
+        """Queue a result and write the queue out if it is due."""
+        if not self.generated_table_name:
+            return
+        self._unsaved.append((result, row_number, html_id))
+        if len(self._unsaved) >= self.flush_every or time.time() - self._last_flush >= self.flush_seconds:
+            self.flush()
+
+    def flush(self) -> None:
+        """Insert and commit everything queued, in one short transaction."""
+        self._last_flush = time.time()
+        if not self._unsaved:
+            return
+        try:
+            cursor = self.conn.cursor()
+            for result, row_number, html_id in self._unsaved:
+                record_pdf_result(cursor, self.generated_table_name, self.document_type,
+                                  self.input_file, result, row_number=row_number, html_id=html_id)
+            self.conn.commit()
+            self.recorded += len(self._unsaved)
+        except sqlite3.Error as e:
+            logger.error(f"Error logging {len(self._unsaved)} PDF results to database: {e}")
+            self.conn.rollback()
+        self._unsaved.clear()
+
+    def close(self) -> None:
+        """Write out what is left and close the connection."""
+        try:
+            self.flush()
+        finally:
+            self.conn.close()
+
+
+def resolve_generated_table(cursor: sqlite3.Cursor, session_hash: str) -> Optional[str]:
+    """
+    Name of the session's ``generated_<hash>`` table, or None if it doesn't exist.
+    """
+    try:
+        table_hash, _, _ = get_table_data(session_hash) # Requires DB access
+        generated_table_name = f"generated_{table_hash}"
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (generated_table_name,))
+        if cursor.fetchone() is None:
+            logger.warning(f"Table {generated_table_name} not found. PDF metadata won't be saved.")
+            return None
+        # Tables created before the index was introduced get it here
+        create_generated_indexes(cursor, generated_table_name)
+        return generated_table_name
+    except Exception as db_err:
+        logger.error(f"Could not get table hash or check table existence: {db_err}. PDF metadata won't be saved.")
+        return None
+
+
+def _write_run_marker(pdf_dir: str, num_files: int) -> None:
+    """Mark a PDF run as in progress; the marker is removed when the run completes."""
+    try:
+        with open(os.path.join(pdf_dir, PDF_RUN_MARKER), 'w', encoding='utf-8') as f:
+            json.dump({"started_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "pid": os.getpid(),
+                       "files": num_files}, f)
+    except OSError as e:
+        logger.warning(f"Could not write PDF run marker in {pdf_dir}: {e}")
+
+
+def _clear_run_marker(pdf_dir: str) -> None:
+    try:
+        os.remove(os.path.join(pdf_dir, PDF_RUN_MARKER))
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"Could not remove PDF run marker in {pdf_dir}: {e}")
+
+
+def finish_pdf_run(session_hash: str, input_file: str, num_html_files: int, pdf_files: List[str],
+                   conversion_times: List[float], errors: List[Dict[str, Any]],
+                   pdf_config: Dict[str, Any]) -> Optional[str]:
+    """
+    Update the session status and write the PDF log, execution summary and dashboard.
+
+    Returns:
+        Path to the PDF generation log, or None if it couldn't be written
+    """
     # Update session status
     try:
         update_session_status(
@@ -399,7 +1074,7 @@ def generate_pdfs() -> Dict[str, Any]:
             html_logger.generate_execution_summary(
                 steps_completed=["import", "validate", "map", "html", "pdf"],
                 stats={
-                    "num_html_files": len(html_files),
+                    "num_html_files": num_html_files,
                     "num_pdf_files": len(pdf_files),
                     "total_conversion_time": sum(conversion_times),
                     "avg_conversion_time": sum(conversion_times) / len(conversion_times) if conversion_times else 0,
@@ -410,121 +1085,294 @@ def generate_pdfs() -> Dict[str, Any]:
         except Exception as log_err:
             logger.error(f"Failed to generate final summary/dashboard logs: {log_err}")
 
+    return log_file
+
+
+# --- Main PDF Generation Function ---
+def generate_pdfs(incremental: Optional[bool] = None, resume: Optional[bool] = None,
+                  bundle: Optional[bool] = None) -> Dict[str, Any]:
+    """
+    Generate PDF files from HTML files for the current session.
+    Uses parallel processing for improved performance if available and beneficial.
+
+    By default every PDF is removed and all HTML files are converted again.
+    In incremental mode existing PDFs are kept and only HTML files that are
+    new, changed since their PDF was made, or failed last time are converted;
+    PDFs whose HTML file is gone are removed.
+
+    Every result is checkpointed to ``generated_<hash>`` as it completes. If
+    the previous run was interrupted it is resumed: the run is incremental,
+    so only the documents it didn't finish are converted. An explicit
+    ``incremental=False`` (``--full``) still converts everything. Timeouts and other
+    transient failures are retried up to ``pdf.max_retries`` times with an
+    exponential backoff starting at ``pdf.retry_backoff`` seconds.
+
+    With bundling on, the PDFs are also appended, in source row order and while
+    the conversion is still running, to print bundles in ``pdf/bundles`` of at
+    most ``pdf.bundle.max_documents`` documents or ``pdf.bundle.max_mb`` MB.
+    If the bundled PDFs are not kept (``pdf.bundle.keep_documents``), the run
+    is never incremental.
+
+    Args:
+        incremental: Only convert what changed; defaults to ``pdf.incremental`` in the config
+        resume: Resume an interrupted run when ``incremental`` isn't given; defaults
+            to ``pdf.resume`` (on) in the config
+        bundle: Write print bundles; defaults to ``pdf.bundle.enabled`` in the config
+
+    Returns:
+        Dict containing generation results
+
+    Raises:
+        ValueError: If no active session found, or the bundle limits are invalid
+        RuntimeError: If PDF generation fails
+    """
+    # Get current session
+    session_hash = get_current_session()
+    if not session_hash:
+        raise ValueError("No active session found")
+
+    logger.info(f"Starting PDF generation for session: {session_hash}")
+
+    # Load config
+    try:
+        config = load_config()
+    except Exception as e:
+         logger.error(f"Failed to load configuration: {e}", exc_info=True)
+         # Provide a minimal default config to attempt continuation
+         config = {"pdf": {}}
+
+    pdf_config = config.get("pdf", {})
+    # An explicit --full or --incremental is never overridden by resuming
+    mode_requested = incremental is not None
+    if incremental is None:
+        incremental = bool(pdf_config.get("incremental", False))
+    if resume is None:
+        resume = bool(pdf_config.get("resume", True))
+
+    # Get paths
+    try:
+        session_dir = get_session_dir(session_hash)
+        html_dir = os.path.join(session_dir, "html")
+        pdf_dir = os.path.join(session_dir, "pdf")
+    except ValueError as e:
+         logger.error(f"Error getting session directory: {e}")
+         raise RuntimeError(f"Cannot get session directory: {e}")
+
+    # Ensure PDF directory exists
+    try:
+        os.makedirs(pdf_dir, exist_ok=True)
+    except OSError as e:
+        logger.error(f"Failed to create PDF directory {pdf_dir}: {e}")
+        raise RuntimeError(f"Failed to create PDF directory: {e}")
+
+    # --- Resume an interrupted run ---
+    resumed = False
+    if resume and not mode_requested and not incremental and os.path.exists(os.path.join(pdf_dir, PDF_RUN_MARKER)):
+        logger.info("The previous PDF run did not finish; resuming it with the documents it didn't convert")
+        incremental = resumed = True
+
+    # Bundled documents are deleted when they aren't kept, so there is nothing to be incremental about
+    bundle_settings = bundle_settings_from_config(pdf_config, bundle)
+    if incremental and bundle_settings and not bundle_settings.keep_documents:
+        logger.warning("pdf.bundle.keep_documents is off, so no previous PDFs are kept; converting every document")
+        incremental = resumed = False
+
+    # --- Clear existing PDF files (incremental runs keep them) ---
+    if not incremental:
+        clean_pdf_dir(pdf_dir)
+
+    # --- Find HTML files ---
+    if not os.path.exists(html_dir):
+        logger.error(f"HTML directory not found: {html_dir}")
+        return {
+            "num_files": 0, "pdf_files": [],
+            "errors": [{"error": f"HTML directory not found: {html_dir}"}],
+            "total_time": 0, "log_file": None
+        }
+
+    # The HTML stage's manifest lists every document with its source row and
+    # generated_<hash> id; only sessions rendered before it existed fall back
+    # to listing the directory (their PDFs are recorded as row 0)
+    html_manifest = load_html_manifest(html_dir)
+    if html_manifest:
+        html_files = sorted(html_manifest, key=lambda name: (html_manifest[name].get("row") or 0, name))
+    else:
+        logger.warning(f"No HTML manifest in {html_dir}; listing the directory instead. "
+                       f"Regenerate the HTML to record source rows with the PDFs.")
+        try:
+            html_files = sorted(f for f in os.listdir(html_dir) if f.lower().endswith((".html", ".htm")))
+        except OSError as e:
+             logger.error(f"Error listing HTML files in {html_dir}: {e}")
+             raise RuntimeError(f"Failed to list HTML files: {e}")
+
+
+    if not html_files:
+        logger.warning(f"No HTML files found in {html_dir}")
+        return {
+            "num_files": 0, "pdf_files": [], "errors": [],
+             "total_time": 0, "log_file": None
+        }
+
+    logger.info(f"Found {len(html_files)} HTML files to convert to PDF")
+
+    # --- Load session info (document type, input file) ---
+    document_type, input_file = read_session_state(session_hash)
+    if not document_type:
+        document_type = "unknown"
+
+    # --- Incremental: keep PDFs that still match their HTML ---
+    all_html_files = html_files
+    up_to_date: List[str] = []
+    stale_record_ids: List[int] = []
+    if incremental:
+        state = _load_previous_pdf_state(session_dir, session_hash)
+        prune_orphan_pdfs(pdf_dir, html_files)
+        html_files, up_to_date = select_pdf_work(html_files, html_dir, pdf_dir, state)
+        # Only the latest record of an up-to-date PDF is kept; records of
+        # reconverted files and of files that no longer exist are replaced
+        current = set(up_to_date)
+        stale_record_ids = [record_id for html_file, entry in state.items()
+                            for record_id in (entry["ids"][:-1] if html_file in current else entry["ids"])]
+        logger.info(f"Incremental run: {len(html_files)} HTML files to convert, {len(up_to_date)} PDFs up to date")
+
+    # --- Resolve PDF settings once and prepare tasks ---
+    settings = resolve_pdf_settings(config, document_type, html_dir)
+    pdf_method = settings.generator
+    logger.info(f"PDF settings: generator={pdf_method}, page={settings.page_size} {settings.orientation}, margins={settings.margins}")
+    batch_size = settings.batch_size if pdf_method == "wkhtmltopdf" else 1
+    if batch_size > 1:
+        tasks = [
+            (html_files[i:i + batch_size], html_dir, pdf_dir, settings)
+            for i in range(0, len(html_files), batch_size)
+        ]
+        logger.info(f"Converting in batches of up to {batch_size} documents per wkhtmltopdf process ({len(tasks)} batches)")
+    else:
+        tasks = [
+            (html_file, html_dir, pdf_dir, settings)
+            for html_file in html_files
+        ]
+
+    # --- Checkpoint results to the database as they complete ---
+    checkpoint = PdfCheckpoint(os.path.join(session_dir, "data.db"), None, document_type, input_file)
+    try:
+        cursor = checkpoint.conn.cursor()
+        generated_table_name = resolve_generated_table(cursor, session_hash)
+        if generated_table_name:
+            # A full run starts from an empty PDF directory, so none of the old records apply
+            if incremental:
+                delete_pdf_records(cursor, generated_table_name, stale_record_ids)
+            else:
+                cursor.execute(f"DELETE FROM {generated_table_name} WHERE mime_type = 'application/pdf'")
+            checkpoint.conn.commit()
+        checkpoint.generated_table_name = generated_table_name
+    except sqlite3.Error as e:
+        logger.error(f"Database connection or operation error: {e}", exc_info=True)
+
+    # --- Bundle PDFs in row order as they complete ---
+    bundler = None
+    if bundle_settings and not PYPDF_AVAILABLE:
+        logger.error("PDF bundling needs pypdf (pip install pypdf); no bundles are written for this run")
+    elif bundle_settings:
+        rows = {html_file: html_manifest.get(html_file, {}).get("row") for html_file in all_html_files}
+        bundler = PdfBundler(pdf_dir, all_html_files, rows, bundle_settings)
+        for html_file in up_to_date:
+            bundler.add({"html_file": html_file, "pdf_file": _pdf_target(html_file, pdf_dir)[0], "success": True})
+
+    # --- Execute Tasks (Parallel or Sequential) ---
+    retries = RetryQueue(pdf_config.get("max_retries", 2), pdf_config.get("retry_backoff", 2.0))
+    run_tasks = run_pdf_tasks_adaptive if pdf_config.get("scheduler", "adaptive") == "adaptive" else run_pdf_tasks_fixed
+    _write_run_marker(pdf_dir, len(html_files))
+    start_pool_time = time.time()
+    try:
+        def on_result(result: Dict[str, Any]) -> None:
+            source = html_manifest.get(result["html_file"], {})
+            checkpoint.add(result, source.get("row"), source.get("generated_id"))
+            if bundler:
+                bundler.add(result)
+
+        results = run_tasks(tasks, settings, pdf_config, on_result=on_result, retries=retries)
+    finally:
+        checkpoint.close()
+    _clear_run_marker(pdf_dir)
+
+    end_pool_time = time.time()
+    logger.info(f"PDF conversion process took {end_pool_time - start_pool_time:.2f} seconds. "
+                f"Checkpointed {checkpoint.recorded} results, {retries.retried} retries.")
+
+    # --- Summarise results ---
+    pdf_files = []
+    errors = []
+    conversion_times = []
+    for result in results:
+        if result["success"]:
+            pdf_files.append(result["pdf_file"])
+            conversion_times.append(result["conversion_time"])
+            logger.debug(f"Successfully generated PDF: {result['pdf_file']} in {result['conversion_time']:.2f} seconds")
+        else:
+            errors.append({
+                "file": result["html_file"],
+                "error": result["error"]
+            })
+            logger.error(f"Failed to generate PDF for {result['html_file']}: {result['error']}")
+
+    bundle_result = None
+    if bundler:
+        bundle_result = bundler.finish()
+        errors.extend(bundle_result["errors"])
+    elif bundle_settings:
+        errors.append({"error": "PDF bundling needs pypdf, which is not installed"})
+
+    # --- Final Steps ---
+    log_file = finish_pdf_run(session_hash, input_file, len(all_html_files), pdf_files,
+                              conversion_times, errors, pdf_config)
 
-    logger.info(f"PDF generation complete for session {session_hash}. Success: {len(pdf_files)}, Errors: {len(errors)}.")
+    logger.info(f"PDF generation complete for session {session_hash}. Success: {len(pdf_files)}, "
+                f"Up to date: {len(up_to_date)}, Errors: {len(errors)}.")
 
     return {
         "num_files": len(pdf_files),
         "pdf_files": pdf_files,
         "total_time": sum(conversion_times),
         "errors": errors,
-        "log_file": log_file # Path to the summary log file
+        "log_file": log_file, # Path to the summary log file
+        "incremental": incremental,
+        "resumed": resumed,
+        "up_to_date": len(up_to_date),
+        "retried": retries.retried,
+        "bundles": bundle_result
     }
 
-def generate_pdf_wkhtmltopdf(html_path: str, pdf_path: str,
-                           config: Dict[str, Any]) -> Dict[str, Any]:
-    """
-    Generate a PDF using wkhtmltopdf.
-    """
-    pdf_config = config.get("pdf", {})
-    # --- CORRECTED KEY HERE ---
-    # Ensure 'wkhtmltopdf' is in PATH or provide full path in config
-    wkhtmltopdf_path = pdf_config.get("wkhtmltopdf", "wkhtmltopdf")
-    # --- END CORRECTION ---
 
-    # Default margins (can be overridden by schema or config)
-    # Uses the 'margin' key from dev.json as the base default
-    default_margin = pdf_config.get("margin", "10mm")
-    margins = {
-        # These specific margin keys are not in dev.json, so they will use default_margin
-        "top": pdf_config.get("margin_top", default_margin),
-        "bottom": pdf_config.get("margin_bottom", default_margin),
-        "left": pdf_config.get("margin_left", default_margin),
-        "right": pdf_config.get("margin_right", default_margin)
-    }
+def _load_previous_pdf_state(session_dir: str, session_hash: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Read the previous PDF results of a session for an incremental run.
 
-    # Try to get document type and load schema margins
-    document_type = None
-    schema_margins_found = False # Flag to track if we successfully found schema margins
+    Returns an empty dict (so everything is converted) if they can't be read.
+    """
+    db_conn = None
     try:
-        # Find status.json relative to the project structure
-        project_root_dir = Path(__file__).resolve().parent.parent
-        status_file_path = project_root_dir / "status.json"
-
-        if status_file_path.exists():
-            with open(status_file_path, 'r', encoding='utf-8') as f:
-                status = json.load(f)
-                document_type = status.get("current_state", {}).get("document_type")
-        else:
-            logger.warning(f"status.json not found at {status_file_path}, cannot determine document type for schema margins.")
+        db_conn = sqlite3.connect(os.path.join(session_dir, "data.db"), timeout=10)
+        table_hash, _, _ = get_table_data(session_hash)
+        return load_pdf_state(db_conn.cursor(), f"generated_{table_hash}")
+    except Exception as e:
+        logger.warning(f"Could not load previous PDF results, converting all files: {e}")
+        return {}
+    finally:
+        if db_conn:
+            db_conn.close()
 
-        if document_type:
-            schema_dir = project_root_dir / "schemas"
-            if schema_dir.is_dir():
-                schema_found = False
-                for schema_file_path in schema_dir.glob('*.json'):
-                    try:
-                        with open(schema_file_path, 'r', encoding='utf-8') as sf:
-                            schema_content = json.load(sf)
-                            # Check if this is the correct schema based on type
-                            if schema_content.get("type") == document_type:
-                                schema_found = True
-                                logger.debug(f"Found matching schema: {schema_file_path.name}")
-                                # Check for layout and margins within the loaded schema content
-                                if "layout" in schema_content:
-                                    schema_layout = schema_content.get("layout", {})
-                                    specific_margins = schema_layout.get("margins", {})
-                                    if specific_margins: # Check if the margins dict is not empty
-                                        logger.info(f"Applying margins from schema '{schema_file_path.name}': {specific_margins}")
-                                        margins.update(specific_margins) # Update defaults with schema values
-                                        schema_margins_found = True
-                                    else:
-                                         logger.debug(f"Schema '{schema_file_path.name}' has 'layout' but no 'margins' defined.")
-                                else:
-                                    logger.debug(f"Schema '{schema_file_path.name}' does not have a 'layout' section.")
-                                # Stop searching once the correct schema is found and processed
-                                break
-                    except json.JSONDecodeError as json_err:
-                         logger.warning(f"Error decoding JSON from schema file {schema_file_path.name}: {json_err}")
-                    except Exception as read_err:
-                         logger.warning(f"Error reading schema file {schema_file_path.name}: {read_err}")
-                if not schema_found:
-                     logger.warning(f"No schema file found with type '{document_type}' in {schema_dir}.")
-            else:
-                 logger.warning(f"Schemas directory not found: {schema_dir}")
-        else:
-             logger.info("Document type not determined from status.json, using default margins.")
+def generate_pdf_wkhtmltopdf(html_path: str, pdf_path: str, settings: PdfSettings) -> Dict[str, Any]:
+    """
+    Generate a PDF using wkhtmltopdf.
 
-    except Exception as e:
-         logger.warning(f"Could not load document type or schema information for margins due to error: {e}", exc_info=True)
-
-    # Log final margins being used
-    if not schema_margins_found:
-         logger.info(f"Using default/config margins: {margins}")
-
-    # Build command
-    cmd = [
-        wkhtmltopdf_path,
-        "--enable-local-file-access",
-        "--load-error-handling", "ignore",
-        "--load-media-error-handling", "ignore",
-        "--quiet",
-        # Uses 'page_size' and 'orientation' from dev.json
-        "--page-size", pdf_config.get("page_size", "A4"),
-        "--orientation", pdf_config.get("orientation", "Portrait"),
-        # Uses margins derived above
-        "--margin-top", margins.get("top", "10mm"),
-        "--margin-bottom", margins.get("bottom", "10mm"),
-        "--margin-left", margins.get("left", "10mm"),
-        "--margin-right", margins.get("right", "10mm"),
-    ]
-    # 'wkhtmltopdf_options' is not in dev.json, default [] will be used
-    extra_options = pdf_config.get("wkhtmltopdf_options", [])
-    if isinstance(extra_options, list):
-        cmd.extend(extra_options)
-    else:
-        logger.warning(f"wkhtmltopdf_options in config is not a list: {extra_options}")
+    Args:
+        html_path: Source HTML file
+        pdf_path: Destination PDF file
+        settings: PdfSettings from resolve_pdf_settings
+    """
+    wkhtmltopdf_path = settings.wkhtmltopdf_path
 
+    cmd = [wkhtmltopdf_path, *settings.wkhtmltopdf_args()]
     cmd.extend([str(html_path), str(pdf_path)])
 
     logger.debug(f"Running wkhtmltopdf command: {' '.join(cmd)}")
@@ -536,7 +1384,7 @@ def generate_pdf_wkhtmltopdf(html_path: str, pdf_path: str,
             capture_output=True,
             text=True,
             check=False,
-            timeout=pdf_config.get("timeout", 60)
+            timeout=settings.timeout
         )
 
         if process.returncode != 0 and process.returncode != 1:
@@ -567,78 +1415,186 @@ def generate_pdf_wkhtmltopdf(html_path: str, pdf_path: str,
          logger.error(error_msg)
          return {"success": False, "error": error_msg}
     except subprocess.TimeoutExpired:
-        error_msg = f"wkhtmltopdf timed out after {pdf_config.get('timeout', 60)} seconds for {html_path}."
+        error_msg = f"wkhtmltopdf timed out after {settings.timeout} seconds for {html_path}."
         logger.error(error_msg)
-        return {"success": False, "error": error_msg}
+        return {"success": False, "error": error_msg, "transient": True}
     except Exception as e:
         error_msg = f"Unexpected error generating PDF with wkhtmltopdf: {str(e)}"
         logger.error(error_msg, exc_info=True)
-        return {"success": False, "error": error_msg}
+        return {"success": False, "error": error_msg, "transient": _is_transient_error(e)}
 
 
-def generate_pdf_weasyprint(html_path: str, pdf_path: str,
-                          config: Dict[str, Any]) -> Dict[str, Any]:
+def _quote_stdin_arg(value: str) -> str:
+    """Quote an argument for a ``--read-args-from-stdin`` line."""
+    return '"' + str(value).replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def generate_pdf_wkhtmltopdf_batch(jobs: List[Tuple[str, str]],
+                                   settings: PdfSettings) -> List[Dict[str, Any]]:
     """
-    Generate a PDF using WeasyPrint.
+    Convert several HTML files with a single wkhtmltopdf process.
+
+    The shared options are passed on the command line and each document is
+    one ``"input" "output"`` line on stdin (``--read-args-from-stdin``), so
+    every document still gets its own PDF while process start-up and Qt
+    initialisation are paid once per batch. If the batch process fails or
+    times out, every document in the batch is converted again on its own so
+    one bad document can't fail its neighbours. Documents whose PDF is
+    missing after a clean batch run are retried the same way.
+
+    Args:
+        jobs: List of (html_path, pdf_path) tuples
+        settings: Resolved PdfSettings
+
+    Returns:
+        One result dict per job, in the same order
     """
-    pdf_config = config.get("pdf", {})
-    try:
+    if not jobs:
+        return []
+
+    # Any PDF present afterwards must have come from this batch
+    for _, pdf_path in jobs:
         try:
-            from weasyprint import HTML, CSS
-            from weasyprint.fonts import FontConfiguration
-        except ImportError:
-            error_msg = "WeasyPrint not installed. Install with: pip install weasyprint"
-            logger.error(error_msg)
-            return {"success": False, "error": error_msg}
+            os.remove(pdf_path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Could not remove stale PDF {pdf_path}: {e}")
 
-        font_config = FontConfiguration()
-        css_list = []
-        # Use CSS files specified in config
-        css_files_config = pdf_config.get("weasyprint_css_files", [])
+    cmd = [settings.wkhtmltopdf_path, *settings.wkhtmltopdf_args(), "--read-args-from-stdin"]
+    stdin_lines = "".join(f"{_quote_stdin_arg(html_path)} {_quote_stdin_arg(pdf_path)}\n" for html_path, pdf_path in jobs)
+    batch_timeout = settings.timeout * len(jobs)
 
-        # Look for default CSS in standard locations if needed
-        default_css_paths = [
-            Path(html_path).parent / "style.css", # CSS in same folder as HTML
-             # CSS in www/assets relative to session
-            Path(html_path).parent.parent / "www" / "assets" / "style.css",
-        ]
-        css_to_use = set() # Avoid duplicates
-
-        # Add configured CSS files first
-        if isinstance(css_files_config, list):
-            for css_file in css_files_config:
-                css_path = Path(css_file)
-                if css_path.exists():
-                    css_to_use.add(css_path)
-                else:
-                    logger.warning(f"Configured Weasyprint CSS file not found: {css_file}")
+    logger.debug(f"Running wkhtmltopdf batch of {len(jobs)} documents: {' '.join(cmd)}")
+
+    batch_failed = False
+    stderr = ""
+    try:
+        process = subprocess.run(
+            cmd,
+            input=stdin_lines,
+            capture_output=True,
+            text=True,
+            check=False,
+            timeout=batch_timeout
+        )
+        stderr = process.stderr or ""
+        if process.returncode not in (0, 1):
+            batch_failed = True
+            logger.warning(f"wkhtmltopdf batch of {len(jobs)} failed (code {process.returncode}), converting its documents one by one: {stderr[:500]}")
+    except FileNotFoundError:
+        error_msg = f"wkhtmltopdf executable not found at '{settings.wkhtmltopdf_path}'. Please ensure it's installed and in your PATH or provide the full path in config ('pdf.wkhtmltopdf')."
+        logger.error(error_msg)
+        return [{"success": False, "error": error_msg} for _ in jobs]
+    except subprocess.TimeoutExpired:
+        batch_failed = True
+        logger.warning(f"wkhtmltopdf batch of {len(jobs)} timed out after {batch_timeout} seconds, converting its documents one by one.")
+    except Exception as e:
+        batch_failed = True
+        logger.warning(f"Unexpected error running wkhtmltopdf batch, converting its documents one by one: {e}")
+
+    results = []
+    for html_path, pdf_path in jobs:
+        if not batch_failed and os.path.exists(pdf_path) and os.path.getsize(pdf_path) >= 100:
+            results.append({"success": True, "warning": stderr[:500]} if stderr else {"success": True})
         else:
-            logger.warning(f"Config key 'pdf.weasyprint_css_files' is not a list.")
+            if not batch_failed:
+                logger.warning(f"wkhtmltopdf batch produced no usable PDF for {html_path}, converting it on its own.")
+            results.append(generate_pdf_wkhtmltopdf(html_path, pdf_path, settings))
+    return results
+
 
-        # Check default locations if no specific CSS is configured
-        if not css_to_use:
-             for p in default_css_paths:
-                  if p.exists():
-                       css_to_use.add(p)
-                       logger.info(f"Using default CSS for Weasyprint: {p}")
-                       break # Usually only one default style is needed
+class WeasyPrintRenderer:
+    """
+    WeasyPrint state kept warm for the lifetime of a (worker) process.
+
+    WeasyPrint is imported once, and one FontConfiguration and the parsed
+    CSS stylesheets are reused for every document the process converts.
+    """
 
-        # Create CSS objects
-        for css_path in css_to_use:
-             try:
-                  css_list.append(CSS(filename=str(css_path), font_config=font_config))
-             except Exception as css_err:
-                  logger.error(f"Error loading Weasyprint CSS file {css_path}: {css_err}")
+    def __init__(self, css_files: Tuple[str, ...]):
+        """
+        Raises:
+            ImportError, OSError: If WeasyPrint or its native libraries can't be loaded
+        """
+        from weasyprint import HTML, CSS
+        from weasyprint.fonts import FontConfiguration
+
+        self.HTML = HTML
+        self.css_files = css_files
+        self.font_config = FontConfiguration()
+        self.stylesheets = []
+        for css_path in css_files:
+            try:
+                self.stylesheets.append(CSS(filename=str(css_path), font_config=self.font_config))
+            except Exception as css_err:
+                logger.error(f"Error loading Weasyprint CSS file {css_path}: {css_err}")
 
 
+# Per-process renderer, created by the pool initializer or on first use
+_weasyprint_renderer: Optional[WeasyPrintRenderer] = None
+_weasyprint_error: Optional[str] = None
+
+
+def _init_weasyprint_worker(settings: PdfSettings) -> None:
+    """
+    Pool initializer: import WeasyPrint and warm fonts and CSS once per worker.
+
+    A failure doesn't take the worker down (the pool would respawn it in a
+    loop if WeasyPrint is missing); the next document tries again instead.
+    """
+    global _weasyprint_renderer, _weasyprint_error
+    try:
+        _weasyprint_renderer = WeasyPrintRenderer(settings.css_files)
+        _weasyprint_error = None
+        logger.debug(f"WeasyPrint worker {os.getpid()} ready with {len(_weasyprint_renderer.stylesheets)} stylesheets")
+    except (ImportError, OSError) as e:
+        first_failure = _weasyprint_error is None
+        _weasyprint_renderer = None
+        _weasyprint_error = f"WeasyPrint not available: {e}. Install with: pip install weasyprint"
+        if first_failure:
+            logger.error(_weasyprint_error)
+        else:
+            logger.debug(_weasyprint_error)
+
+
+def _get_weasyprint_renderer(settings: PdfSettings) -> Optional[WeasyPrintRenderer]:
+    """
+    Return this process's warm renderer, (re)creating it if needed.
+
+    A renderer whose warm-up failed is retried for every document, so one
+    failed warm-up doesn't fail every later document of the worker.
+    """
+    if _weasyprint_renderer is None or _weasyprint_renderer.css_files != settings.css_files:
+        _init_weasyprint_worker(settings)
+    return _weasyprint_renderer
+
+
+def generate_pdf_weasyprint(html_path: str, pdf_path: str, settings: PdfSettings) -> Dict[str, Any]:
+    """
+    Generate a PDF using WeasyPrint.
+
+    Uses the process's warm WeasyPrintRenderer, so fonts and stylesheets are
+    only loaded once per process rather than once per document.
+
+    Args:
+        html_path: Source HTML file
+        pdf_path: Destination PDF file
+        settings: PdfSettings from resolve_pdf_settings
+    """
+    try:
+        renderer = _get_weasyprint_renderer(settings)
+        if renderer is None:
+            return {"success": False, "error": _weasyprint_error}
+
         # Set base_url to the HTML directory for relative paths (images, etc.)
         base_url = Path(html_path).parent.as_uri() # Use file URI scheme
 
         # Render PDF
-        HTML(filename=str(html_path), base_url=base_url).write_pdf(
+        renderer.HTML(filename=str(html_path), base_url=base_url).write_pdf(
             str(pdf_path),
-            stylesheets=css_list if css_list else None,
-            font_config=font_config,
+            stylesheets=renderer.stylesheets or None,
+            font_config=renderer.font_config,
             # Add optimization options if needed (can increase memory usage)
             # optimize_images=True,
             # optimize_size=('fonts', 'images', 'all')
@@ -655,4 +1611,4 @@ def generate_pdf_weasyprint(html_path: str, pdf_path: str,
     except Exception as e:
         error_msg = f"Error generating PDF with WeasyPrint: {str(e)}"
         logger.error(error_msg, exc_info=True) # Log full traceback
-        return {"success": False, "error": error_msg}
\ No newline at end of file
+        return {"success": False, "error": error_msg, "transient": _is_transient_error(e)}
\ No newline at end of file
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+"""
+PDF Scheduler - Size the PDF worker pool from the machine and adapt concurrency to observed latency.
+
+The pool is sized once from the usable cores and available memory. During
+the run an AdaptiveScheduler measures throughput over windows of completed
+documents and moves the number of tasks in flight up or down (hill climbing),
+backing off when memory runs low. Tasks are submitted in chunks sized from the
+measured per-task latency, so fast documents don't pay one IPC round trip each.
+"""
+
+import os
+import math
+import time
+import logging
+from typing import Dict, Any, Optional, NamedTuple
+
+# psutil is optional; /proc/meminfo or sysconf are used without it
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    psutil = None
+    PSUTIL_AVAILABLE = False
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# Rough resident memory of one worker including its converter process
+DEFAULT_WORKER_MEMORY_MB = {"weasyprint": 250, "wkhtmltopdf": 150}
+# Memory left alone for the main process and everything else on the machine
+DEFAULT_MEMORY_RESERVE_MB = 512
+# Aim for chunks that keep a worker busy this long
+DEFAULT_TARGET_CHUNK_SECONDS = 0.5
+# Runs estimated to take less than this sequentially don't start a pool
+DEFAULT_MIN_POOL_SECONDS = 2.0
+# Throughput changes within this fraction count as "no change"
+THROUGHPUT_TOLERANCE = 0.05
+
+
+def available_cores() -> int:
+    """Number of CPUs this process may run on."""
+    try:
+        return max(1, len(os.sched_getaffinity(0)))
+    except (AttributeError, OSError):
+        return max(1, os.cpu_count() or 1)
+
+
+def available_memory_mb() -> Optional[float]:
+    """
+    Memory available for new processes, in MB.
+
+    Uses psutil if installed, then /proc/meminfo (MemAvailable), then the free
+    page count from sysconf. Returns None if none of them work.
+    """
+    if PSUTIL_AVAILABLE:
+        try:
+            return psutil.virtual_memory().available / MB
+        except Exception as e:
+            logger.debug(f"psutil could not read memory: {e}")
+    try:
+        with open("/proc/meminfo", "r", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024 / MB
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE") / MB
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+class PoolPlan(NamedTuple):
+    """Pool size chosen for a run and what limited it."""
+    workers: int
+    cores: int
+    memory_mb: Optional[float]
+    limited_by: str
+
+
+def plan_pool(generator: str, pdf_config: Dict[str, Any], num_tasks: int) -> PoolPlan:
+    """
+    Choose the pool size for a run from cores, memory and the amount of work.
+
+    Args:
+        generator: "wkhtmltopdf" or "weasyprint"
+        pdf_config: The ``pdf`` section of the config; ``max_workers`` replaces
+            the core count as the upper bound, ``weasyprint_workers`` caps
+            WeasyPrint pools, ``worker_memory_mb`` and ``memory_reserve_mb``
+            override the memory defaults
+        num_tasks: Number of tasks in the run
+
+    Returns:
+        PoolPlan with at least one worker
+    """
+    cores = available_cores()
+    memory_mb = available_memory_mb()
+
+    limits = {"tasks": max(1, num_tasks)}
+    if pdf_config.get("max_workers"):
+        # An explicit maximum replaces the core count, e.g. to oversubscribe I/O-bound converters
+        limits["max_workers"] = int(pdf_config["max_workers"])
+    else:
+        limits["cores"] = cores
+    if generator == "weasyprint" and pdf_config.get("weasyprint_workers"):
+        limits["weasyprint_workers"] = int(pdf_config["weasyprint_workers"])
+    if memory_mb is not None:
+        per_worker = pdf_config.get("worker_memory_mb", DEFAULT_WORKER_MEMORY_MB.get(generator, 150))
+        reserve = pdf_config.get("memory_reserve_mb", DEFAULT_MEMORY_RESERVE_MB)
+        limits["memory"] = max(1, int((memory_mb - reserve) // max(per_worker, 1)))
+
+    limited_by = min(limits, key=lambda name: limits[name])
+    return PoolPlan(max(1, limits[limited_by]), cores, memory_mb, limited_by)
+
+
+class AdaptiveScheduler:
+    """
+    Decide how many tasks to keep in flight and how large each chunk is.
+
+    Call ``record`` for every finished task. After each window of completed
+    documents the throughput is compared with the previous window: if the last
+    change of the in-flight limit made things worse it is undone and the
+    scheduler holds for a few windows, otherwise it keeps moving the same way.
+
+    Usage:
+        scheduler = AdaptiveScheduler(plan.workers)
+        while ...:
+            size = scheduler.chunk_size(remaining)
+            ...
+            scheduler.record(task_seconds, num_documents)
+    """
+
+    def __init__(self, max_in_flight: int, target_chunk_seconds: float = DEFAULT_TARGET_CHUNK_SECONDS,
+                 memory_reserve_mb: float = DEFAULT_MEMORY_RESERVE_MB, hold_windows: int = 3,
+                 clock=time.perf_counter):
+        self.max_in_flight = max(1, max_in_flight)
+        self.limit = self.max_in_flight
+        self.target_chunk_seconds = target_chunk_seconds
+        self.memory_reserve_mb = memory_reserve_mb
+        self.hold_windows = hold_windows
+        self.latency: Optional[float] = None  # EWMA of seconds per task
+        self.adjustments = 0
+
+        self._clock = clock
+        self._direction = -1  # Starts at the maximum, so the first probe is downwards
+        self._hold = 0
+        self._previous_throughput: Optional[float] = None
+        self._window_start = clock()
+        self._window_documents = 0
+
+    @property
+    def window_size(self) -> int:
+        """Documents per measurement window: enough for every slot to finish a few."""
+        return max(8, 2 * self.limit)
+
+    def estimate_seconds(self, num_tasks: int) -> float:
+        """Estimated sequential time for ``num_tasks`` tasks at the measured latency."""
+        return (self.latency or 0.0) * num_tasks
+
+    def chunk_size(self, remaining: int) -> int:
+        """
+        Number of tasks to send in the next chunk.
+
+        Large enough to keep a worker busy for ``target_chunk_seconds``, small
+        enough that every slot still gets a few chunks of what is left.
+        """
+        if remaining <= 0:
+            return 0
+        if not self.latency:
+            return 1
+        wanted = max(1, int(self.target_chunk_seconds / self.latency))
+        fair_share = max(1, math.ceil(remaining / (self.limit * 4)))
+        return min(wanted, fair_share, remaining)
+
+    def record(self, task_seconds: float, documents: int = 1) -> None:
+        """Record a finished task and adjust the in-flight limit at the end of a window."""
+        self.latency = task_seconds if self.latency is None else 0.8 * self.latency + 0.2 * task_seconds
+        self._window_documents += documents
+        if self._window_documents >= self.window_size:
+            self._end_window()
+
+    def _end_window(self) -> None:
+        now = self._clock()
+        elapsed = now - self._window_start
+        throughput = self._window_documents / elapsed if elapsed > 0 else None
+        self._window_start = now
+        self._window_documents = 0
+        if throughput is None:
+            return
+
+        memory_mb = available_memory_mb()
+        if memory_mb is not None and memory_mb < self.memory_reserve_mb and self.limit > 1:
+            logger.info(f"Low memory ({memory_mb:.0f} MB available), reducing PDF workers in flight to {self.limit - 1}")
+            self._set_limit(self.limit - 1)
+            self._direction, self._hold = -1, self.hold_windows
+            self._previous_throughput = None
+            return
+
+        previous = self._previous_throughput
+        self._previous_throughput = throughput
+        if self._hold > 0:
+            self._hold -= 1
+            return
+        if previous is not None and throughput < previous * (1 - THROUGHPUT_TOLERANCE):
+            # The last move hurt: undo it and stay there for a while
+            self._direction = -self._direction
+            self._hold = self.hold_windows
+        self._set_limit(self.limit + self._direction)
+
+    def _set_limit(self, limit: int) -> None:
+        limit = min(max(1, limit), self.max_in_flight)
+        if limit != self.limit:
+            logger.debug(f"PDF scheduler: {self.limit} -> {limit} tasks in flight "
+                         f"(latency {self.latency or 0:.3f}s per task)")
+            self.limit = limit
+            self.adjustments += 1
+        elif limit == self.max_in_flight or limit == 1:
+            # Nothing further in this direction; turn around on the next window
+            self._direction = -self._direction
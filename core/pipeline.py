@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+"""
+Pipeline - Fused HTML→PDF generation.
+
+Documents are handed to the PDF workers as soon as they are rendered, through
+a bounded queue, so conversion runs while later rows are still rendering and
+the wall time approaches max(render, convert) instead of their sum.
+"""
+
+import os
+import time
+import logging
+import sqlite3
+import threading
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+
+from core.session import get_session_dir, load_config
+from core.html_generator import prepare_html_run, render_html_rows, finish_html_run, HtmlRun
+from core.pdf_generator import (
+    MULTIPROCESSING_AVAILABLE, PdfSettings, PdfCheckpoint, RetryQueue, resolve_pdf_settings,
+    clean_pdf_dir, create_pdf_pool, finish_pdf_run, process_pdf_task
+)
+from core.pdf_scheduler import plan_pool
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# PDF results are written to generated_<hash> in groups of this size, or at least this often
+PIPELINE_FLUSH_EVERY = 50
+PIPELINE_FLUSH_SECONDS = 1.0
+
+
+def generate_html_and_pdfs(rows: Optional[Any] = None, where: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Render HTML and convert it to PDF in one streaming pass.
+
+    Rendering runs in the pool's task feeder thread; every rendered document
+    (or batch, with ``pdf.wkhtmltopdf_batch_size``) is submitted to the PDF
+    workers straight away. At most ``pdf.pipeline_queue_size`` documents are
+    waiting for conversion at any time, so rendering never runs far ahead of
+    the workers. Results are taken with ``imap_unordered`` and written to
+    ``generated_<hash>`` as they complete.
+
+    Args:
+        rows: Row selection, as for generate_html_files
+        where: SQL filter on mapped fields, as for generate_html_files
+
+    Returns:
+        Dict with the "html" and "pdf" results and the total wall time
+
+    Raises:
+        ValueError: If session, document type, or mapping not found
+    """
+    start_time = time.time()
+
+    try:
+        config = load_config()
+    except Exception as e:
+        logger.error(f"Failed to load configuration: {e}", exc_info=True)
+        config = {"pdf": {}}
+    pdf_config = config.get("pdf", {})
+
+    # Rows are rendered from the pool's feeder thread, so the HTML run's
+    # connection must not be tied to this thread
+    run = prepare_html_run(rows=rows, where=where, check_same_thread=False)
+
+    settings = resolve_pdf_settings(config, run.document_type, run.output_dir)
+    pdf_dir = os.path.join(get_session_dir(run.session_hash), "pdf")
+    os.makedirs(pdf_dir, exist_ok=True)
+
+    # Results are written in short transactions, so the HTML inserts running
+    # in the feeder thread are never kept waiting for long
+    checkpoint = PdfCheckpoint(os.path.join(get_session_dir(run.session_hash), "data.db"),
+                               run.generated_table_name, run.document_type, run.input_file,
+                               flush_every=PIPELINE_FLUSH_EVERY, flush_seconds=PIPELINE_FLUSH_SECONDS)
+    if run.target_rows is None:
+        clean_pdf_dir(pdf_dir)
+        checkpoint.conn.execute(f"DELETE FROM {run.generated_table_name} WHERE mime_type = 'application/pdf'")
+        checkpoint.conn.commit()
+    else:
+        _remove_replaced_pdfs(run, pdf_dir, checkpoint.conn)
+
+    num_documents = len(run.target_rows) if run.target_rows is not None else len(run.data)
+    num_workers = None
+    if pdf_config.get("scheduler", "adaptive") == "adaptive":
+        # The planner decides from cores, memory and the number of documents
+        num_workers = plan_pool(settings.generator, pdf_config, num_documents).workers
+        use_pool = MULTIPROCESSING_AVAILABLE and num_workers > 1
+    else:
+        use_pool = (
+            MULTIPROCESSING_AVAILABLE and
+            num_documents > pdf_config.get("multiprocessing_threshold", 50) and
+            (settings.generator == "wkhtmltopdf" or pdf_config.get("weasyprint_workers",
+                                                                  pdf_config.get("multiprocessing_workers", 4)) > 1)
+        )
+
+    pdf_files: List[str] = []
+    conversion_times: List[float] = []
+    pdf_errors: List[Dict[str, Any]] = []
+    rendered: Dict[str, Dict[str, Any]] = {}
+    retries = RetryQueue(pdf_config.get("max_retries", 2), pdf_config.get("retry_backoff", 2.0))
+
+    def record(result: Dict[str, Any]) -> None:
+        if retries.offer(result, (result["html_file"], run.output_dir, pdf_dir, settings)):
+            return
+        document = rendered.pop(result["html_file"], {})
+        if result["success"]:
+            pdf_files.append(result["pdf_file"])
+            conversion_times.append(result["conversion_time"])
+        else:
+            pdf_errors.append({"file": result["html_file"], "error": result["error"]})
+            logger.error(f"Failed to generate PDF for {result['html_file']}: {result['error']}")
+        checkpoint.add(result, document.get("row"), document.get("generated_id"))
+
+    try:
+        if use_pool:
+            # A batch only goes out once it is full, so the queue must hold at least one batch
+            queue_size = max(pdf_config.get("pipeline_queue_size", 32), settings.batch_size, 1)
+            slots = threading.BoundedSemaphore(queue_size)
+            tasks = _pipeline_tasks(run, pdf_dir, settings, rendered, slots)
+            with create_pdf_pool(settings, pdf_config, num_workers=num_workers) as pool:
+                for results in pool.imap_unordered(process_pdf_task, tasks):
+                    for result in results:
+                        record(result)
+                        slots.release()
+        else:
+            logger.info("Converting sequentially as documents are rendered (pool not used for this run)")
+            for task in _pipeline_tasks(run, pdf_dir, settings, rendered):
+                for result in process_pdf_task(task):
+                    record(result)
+
+        # Transient failures get their retries once everything else is done
+        while len(retries):
+            time.sleep(retries.wait_time() or 0)
+            for task in retries.ready():
+                for result in process_pdf_task(task):
+                    record(result)
+    finally:
+        checkpoint.close()
+
+    html_result = finish_html_run(run)
+    log_file = finish_pdf_run(run.session_hash, run.input_file, len(run.html_files), pdf_files,
+                              conversion_times, pdf_errors, pdf_config)
+
+    wall_time = time.time() - start_time
+    logger.info(f"HTML+PDF pipeline complete in {wall_time:.2f}s. HTML: {len(run.html_files)}, "
+                f"PDF: {len(pdf_files)}, PDF errors: {len(pdf_errors)}.")
+
+    return {
+        "html": html_result,
+        "pdf": {
+            "num_files": len(pdf_files),
+            "pdf_files": pdf_files,
+            "total_time": sum(conversion_times),
+            "errors": pdf_errors,
+            "log_file": log_file
+        },
+        "wall_time": wall_time
+    }
+
+
+def _pipeline_tasks(run: HtmlRun, pdf_dir: str, settings: PdfSettings,
+                    rendered: Dict[str, Dict[str, Any]],
+                    slots: Optional[threading.BoundedSemaphore] = None) -> Iterator[Tuple]:
+    """
+    Render rows and yield PDF tasks for them as they become available.
+
+    With ``slots`` one slot is taken per document before it is handed out, and
+    the consumer releases it once the document's result is in; that bounds the
+    number of rendered documents waiting for conversion.
+    """
+    batch_size = settings.batch_size if settings.generator == "wkhtmltopdf" else 1
+    batch: List[str] = []
+
+    for document in render_html_rows(run):
+        if slots is not None:
+            slots.acquire()
+        rendered[document["html_file"]] = document
+
+        if batch_size == 1:
+            yield (document["html_file"], run.output_dir, pdf_dir, settings)
+            continue
+
+        batch.append(document["html_file"])
+        if len(batch) >= batch_size:
+            yield (batch, run.output_dir, pdf_dir, settings)
+            batch = []
+
+    if batch:
+        yield (batch, run.output_dir, pdf_dir, settings)
+
+
+def _remove_replaced_pdfs(run: HtmlRun, pdf_dir: str, db_conn: sqlite3.Connection) -> None:
+    """
+    For a targeted run, remove the PDFs (and their generated_<hash> entries)
+    of the HTML files that were just replaced.
+    """
+    if not run.replaced_files:
+        return
+
+    for html_file in run.replaced_files:
+        pdf_file = os.path.splitext(html_file)[0] + ".pdf"
+        try:
+            os.remove(os.path.join(pdf_dir, pdf_file))
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            logger.warning(f"Error removing existing PDF file {pdf_file}: {e}")
+
+    cursor = db_conn.cursor()
+    for start in range(0, len(run.replaced_files), 500):
+        chunk = run.replaced_files[start:start + 500]
+        placeholders = ", ".join("?" for _ in chunk)
+        cursor.execute(
+            f"DELETE FROM {run.generated_table_name} WHERE mime_type = 'application/pdf' "
+            f"AND json_extract(data, '$.file') IN ({placeholders})",
+            chunk
+        )
+    db_conn.commit()
+    logger.info(f"Removed previous PDF output for {len(run.replaced_files)} replaced HTML files")
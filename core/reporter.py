@@ -14,6 +14,7 @@ from pathlib import Path
 import jinja2
 
 from core.session import get_current_session, get_session_dir, update_session_status
+from core.template_service import TEMPLATE_DIRS, get_template_env
 from core.report_db import (
     init_reporting_db,
     generate_snapshot_table,
@@ -71,17 +72,11 @@ def render_report(
         Path to the rendered HTML file
     """
     # Get the templates directory
-    templates_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "templates", "reports")
-    
-    # Create Jinja2 environment
-    env = jinja2.Environment(
-        loader=jinja2.FileSystemLoader(templates_dir),
-        autoescape=jinja2.select_autoescape(['html', 'xml'])
-    )
+    templates_dir = TEMPLATE_DIRS["reports"]
     
     try:
-        # Load and render the template
-        template = env.get_template(template_name)
+        # Load and render the template (shared environment, compiled once per process)
+        template = get_template_env("reports").get_template(template_name)
         rendered_html = template.render(**data)
         
         # Write the rendered HTML to the output file
@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+"""
+Template Service - Shared Jinja2 environments for document, log and report templates.
+
+One environment is created per template family and reused for the lifetime of
+the process. Compiled templates are kept in memory, their bytecode is cached on
+disk between runs, and a template is only recompiled when its file mtime changes.
+"""
+
+import os
+import re
+import time
+import base64
+import logging
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import jinja2
+
+from core.session import load_config
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# Template families and the directories they are loaded from
+TEMPLATE_DIRS = {
+    "html": PROJECT_ROOT / "templates" / "html",
+    "logs": PROJECT_ROOT / "templates" / "logs",
+    "reports": PROJECT_ROOT / "templates" / "reports",
+}
+
+# Autoescape settings per family (kept as each module used them before)
+AUTOESCAPE = {
+    "html": jinja2.select_autoescape(['html', 'xml']),
+    "logs": False,
+    "reports": jinja2.select_autoescape(['html', 'xml']),
+}
+
+DEFAULT_BYTECODE_CACHE_DIR = ".cache/jinja"
+
+# Write buffer for streamed renders
+RENDER_BUFFER_SIZE = 64 * 1024
+
+IMAGE_MIME_TYPES = {
+    '.png': 'image/png',
+    '.jpg': 'image/jpeg',
+    '.jpeg': 'image/jpeg',
+    '.gif': 'image/gif',
+    '.svg': 'image/svg+xml',
+    '.webp': 'image/webp'
+}
+
+_environments: Dict[str, jinja2.Environment] = {}
+_bytecode_cache: Optional[jinja2.BytecodeCache] = None
+_lock = threading.Lock()
+
+
+class AssetInliningLoader(jinja2.FileSystemLoader):
+    """
+    FileSystemLoader that inlines images from the template directory.
+
+    ``src="banner.png"`` style references to images next to the templates are
+    replaced by base64 data URIs in the template source itself, so they are
+    compiled into the template once instead of being substituted into every
+    rendered document. A template is reloaded when it or any image changes.
+    """
+
+    def get_source(self, environment: jinja2.Environment,
+                   template: str) -> Tuple[str, str, Callable[[], bool]]:
+        source, filename, uptodate = super().get_source(environment, template)
+
+        images = self._load_images()
+        for img_file, (img_data, _) in images.items():
+            img_pattern = re.compile(rf'src\s*=\s*["\']?{re.escape(img_file)}["\']?')
+            source = img_pattern.sub(lambda _match: f'src="{img_data}"', source)
+
+        image_mtimes = {img_file: mtime for img_file, (_, mtime) in images.items()}
+
+        def assets_uptodate() -> bool:
+            if not uptodate():
+                return False
+            return self._image_mtimes() == image_mtimes
+
+        return source, filename, assets_uptodate
+
+    def _image_paths(self) -> List[Tuple[str, str]]:
+        """List (name, path) for every image in the search path directories."""
+        paths = []
+        for searchpath in self.searchpath:
+            try:
+                for img_file in sorted(os.listdir(searchpath)):
+                    if os.path.splitext(img_file)[1].lower() in IMAGE_MIME_TYPES:
+                        paths.append((img_file, os.path.join(searchpath, img_file)))
+            except OSError as e:
+                logger.warning(f"Template image directory not readable: {searchpath}: {e}")
+        return paths
+
+    def _image_mtimes(self) -> Dict[str, float]:
+        mtimes = {}
+        for img_file, img_path in self._image_paths():
+            try:
+                mtimes[img_file] = os.path.getmtime(img_path)
+            except OSError:
+                pass
+        return mtimes
+
+    def _load_images(self) -> Dict[str, Tuple[str, float]]:
+        """Encode every image as a data URI, keyed by file name."""
+        images = {}
+        for img_file, img_path in self._image_paths():
+            try:
+                with open(img_path, "rb") as image_file:
+                    encoded_string = base64.b64encode(image_file.read()).decode("utf-8")
+                mime_type = IMAGE_MIME_TYPES.get(os.path.splitext(img_file)[1].lower(), 'application/octet-stream')
+                images[img_file] = (f"data:{mime_type};base64,{encoded_string}", os.path.getmtime(img_path))
+                logger.debug(f"Inlined image {img_file} as base64")
+            except Exception as e:
+                logger.warning(f"Error encoding image {img_path} to base64: {e}")
+        return images
+
+
+# Loader class per family; document templates get their images inlined at load time
+LOADER_CLASSES = {
+    "html": AssetInliningLoader,
+    "logs": jinja2.FileSystemLoader,
+    "reports": jinja2.FileSystemLoader,
+}
+
+
+def _get_bytecode_cache() -> Optional[jinja2.BytecodeCache]:
+    """
+    Create (once) the on-disk bytecode cache shared by all environments.
+
+    The directory comes from ``templates.bytecode_cache_dir`` in the config and
+    is resolved relative to the project root. Returns None if it cannot be created.
+    """
+    global _bytecode_cache
+    if _bytecode_cache is not None:
+        return _bytecode_cache
+
+    cache_dir = DEFAULT_BYTECODE_CACHE_DIR
+    try:
+        cache_dir = load_config().get("templates", {}).get("bytecode_cache_dir", DEFAULT_BYTECODE_CACHE_DIR)
+    except Exception as e:
+        logger.warning(f"Could not read template settings from config, using defaults: {e}")
+
+    cache_path = Path(cache_dir)
+    if not cache_path.is_absolute():
+        cache_path = PROJECT_ROOT / cache_path
+
+    try:
+        os.makedirs(cache_path, exist_ok=True)
+        _bytecode_cache = jinja2.FileSystemBytecodeCache(directory=str(cache_path))
+        logger.debug(f"Using Jinja2 bytecode cache at {cache_path}")
+    except OSError as e:
+        logger.warning(f"Could not create Jinja2 bytecode cache directory {cache_path}: {e}")
+        _bytecode_cache = None
+
+    return _bytecode_cache
+
+
+def get_template_env(family: str) -> jinja2.Environment:
+    """
+    Get the shared Jinja2 environment for a template family.
+
+    Args:
+        family: One of the keys of TEMPLATE_DIRS ("html", "logs", "reports")
+
+    Returns:
+        The shared Jinja2 Environment
+
+    Raises:
+        ValueError: If the family is unknown
+    """
+    env = _environments.get(family)
+    if env is not None:
+        return env
+
+    if family not in TEMPLATE_DIRS:
+        raise ValueError(f"Unknown template family: {family}")
+
+    with _lock:
+        env = _environments.get(family)
+        if env is None:
+            env = jinja2.Environment(
+                loader=LOADER_CLASSES[family](searchpath=str(TEMPLATE_DIRS[family])),
+                autoescape=AUTOESCAPE[family],
+                bytecode_cache=_get_bytecode_cache(),
+                auto_reload=True,  # Recompile only when the template file's mtime changes
+            )
+            _environments[family] = env
+            logger.debug(f"Created shared Jinja2 environment for '{family}' templates")
+    return env
+
+
+def get_template(family: str, template_name: str) -> jinja2.Template:
+    """
+    Get a compiled template from the shared environment of a family.
+
+    Raises:
+        TemplateNotFound, TemplateError: If the template can't be loaded
+    """
+    return get_template_env(family).get_template(template_name)
+
+
+def render_to_file(template: jinja2.Template, file_path: str,
+                   stats: Optional[Dict[str, float]] = None, /, **context: Any) -> int:
+    """
+    Render a template straight into a file without building the whole document in memory.
+
+    Output chunks from ``template.generate()`` are written through a buffered
+    file, so memory use is bounded by the largest chunk rather than the document.
+    A partially written file is removed if rendering fails.
+
+    Args:
+        template: Compiled template
+        file_path: Destination file
+        stats: Optional dict; when given, ``write_ms`` (time spent in file
+            writes, flush and close) and ``total_ms`` are stored in it
+        **context: Template context variables
+
+    Returns:
+        Number of bytes written
+
+    Raises:
+        TemplateError: If rendering fails
+        OSError: If the file can't be written
+    """
+    try:
+        # Binary mode, so the size is the number of encoded bytes written
+        if stats is None:
+            size = 0
+            with open(file_path, 'wb', buffering=RENDER_BUFFER_SIZE) as f:
+                for chunk in template.generate(**context):
+                    size += f.write(chunk.encode('utf-8'))
+            return size
+
+        clock = time.perf_counter
+        start = clock()
+        write_time = 0.0
+        size = 0
+        f = open(file_path, 'wb', buffering=RENDER_BUFFER_SIZE)
+        try:
+            for chunk in template.generate(**context):
+                data = chunk.encode('utf-8')
+                write_start = clock()
+                size += f.write(data)
+                write_time += clock() - write_start
+        finally:
+            close_start = clock()
+            f.close()
+            write_time += clock() - close_start
+        stats["write_ms"] = write_time * 1000.0
+        stats["total_ms"] = (clock() - start) * 1000.0
+        return size
+    except Exception:
+        try:
+            os.remove(file_path)
+        except OSError:
+            pass
+        raise
+
+
+def preload_templates(families: Optional[List[str]] = None) -> Dict[str, int]:
+    """
+    Compile all known templates up front so later renders skip compilation.
+
+    Args:
+        families: Template families to preload, or None for all of them
+
+    Returns:
+        Dict mapping each family to the number of templates loaded
+    """
+    loaded = {}
+    for family in families or list(TEMPLATE_DIRS):
+        count = 0
+        try:
+            env = get_template_env(family)
+            for template_name in env.list_templates(filter_func=_is_template_file):
+                try:
+                    env.get_template(template_name)
+                    count += 1
+                except jinja2.exceptions.TemplateError as e:
+                    logger.warning(f"Could not preload template {family}/{template_name}: {e}")
+        except Exception as e:
+            logger.warning(f"Could not preload '{family}' templates: {e}")
+        loaded[family] = count
+
+    logger.info(f"Preloaded templates: {loaded}")
+    return loaded
+
+
+def _is_template_file(template_name: str) -> bool:
+    """Only HTML and Jinja files are templates; skip images and stylesheets."""
+    return template_name.lower().endswith((".html", ".htm", ".jinja2"))
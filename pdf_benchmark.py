@@ -0,0 +1,497 @@
+#!/usr/bin/env python
+"""
+PDF Benchmark - Time PDF conversion on synthetic payment advices.
+
+Renders the payment advice template for N synthetic records and converts them
+with each available generator (wkhtmltopdf, WeasyPrint, and a stub converter
+for machines without either) in each execution mode:
+
+- sequential: one document after the other in this process
+- pool:       the fixed multiprocessing pool, once per worker count
+- adaptive:   the adaptive scheduler, up to the largest worker count
+- batch:      wkhtmltopdf batches (``--read-args-from-stdin``) on the fixed pool
+
+Every scenario runs in a fresh interpreter, so its memory figures are its own. The
+report lists docs/sec, CPU utilisation (CPU seconds of the run and all its
+worker processes over wall time x cores), the peak summed RSS of the whole
+process tree (sampled; needs psutil) and the peak RSS of the largest single
+process. Results can be saved
+and compared with a saved baseline; a scenario that got slower than the
+tolerance allows makes the run exit with code 1.
+
+Usage:
+    python pdf_benchmark.py run --sizes 100,1000,10000
+    python pdf_benchmark.py run --generators stub --workers 1,2,4 --output bench.json
+    python pdf_benchmark.py run --generators stub --baseline bench.json
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import random
+import logging
+import importlib
+import tempfile
+import threading
+import subprocess
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Dict, List, Any, Optional
+
+import typer
+from rich.console import Console
+from rich.table import Table
+from jinja2 import Environment, FileSystemLoader
+
+# resource is POSIX only; CPU and memory figures are left out without it
+try:
+    import resource
+    RESOURCE_AVAILABLE = True
+except ImportError:
+    resource = None
+    RESOURCE_AVAILABLE = False
+
+# psutil is optional; without it the summed RSS of the process tree is not sampled
+try:
+    import psutil
+    PSUTIL_AVAILABLE = True
+except ImportError:
+    psutil = None
+    PSUTIL_AVAILABLE = False
+
+from core.pdf_generator import (
+    resolve_pdf_settings, process_pdf_task, run_pdf_tasks_fixed, run_pdf_tasks_adaptive
+)
+from core.pdf_scheduler import available_cores
+from core.session import load_config
+
+# Configure logging
+logging.basicConfig(level=logging.WARNING, stream=sys.stderr)
+logger = logging.getLogger(__name__)
+
+PROJECT_ROOT_DIR = Path(__file__).resolve().parent
+TEMPLATE_DIR = PROJECT_ROOT_DIR / "templates" / "html"
+TEMPLATE_NAME = "payment_advice.html"
+
+GENERATORS = ["wkhtmltopdf", "weasyprint", "stub"]
+MODES = ["sequential", "pool", "adaptive", "batch"]
+
+# Stand-in for wkhtmltopdf: burns CPU for a fixed start-up cost per process and
+# a fixed cost per document, then writes a small valid-looking PDF. For tests,
+# PDF_STUB_FAIL skips inputs whose path contains it, PDF_STUB_BATCH_EXIT is the
+# exit code of batch runs and PDF_STUB_LOG gets one line per invocation.
+STUB_CONVERTER = '''
+import os, sys, time, shlex
+STARTUP = float(os.environ.get("PDF_STUB_STARTUP_MS", "0")) / 1000
+PER_DOC = float(os.environ.get("PDF_STUB_MS", "0")) / 1000
+FAIL = os.environ.get("PDF_STUB_FAIL")
+PDF = b"%PDF-1.4\\n" + b"%" + b"0" * 256 + b"\\n%%EOF\\n"
+
+def burn(seconds):
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+def convert(args):
+    burn(PER_DOC)
+    if FAIL and FAIL in args[-2]:
+        return
+    with open(args[-1], "wb") as f:
+        f.write(PDF)
+
+burn(STARTUP)
+batch = "--read-args-from-stdin" in sys.argv
+if os.environ.get("PDF_STUB_LOG"):
+    with open(os.environ["PDF_STUB_LOG"], "a") as log:
+        log.write(("batch" if batch else os.path.basename(sys.argv[-2])) + "\\n")
+if batch:
+    for line in sys.stdin:
+        if line.strip():
+            convert(shlex.split(line))
+    sys.exit(int(os.environ.get("PDF_STUB_BATCH_EXIT", "0")))
+else:
+    convert(sys.argv[1:])
+'''
+
+app = typer.Typer(help="Benchmark PDF conversion on synthetic payment advices.", add_completion=False)
+console = Console()
+
+
+def synthetic_record(index: int, rng: random.Random) -> Dict[str, str]:
+    """One payment advice record with plausible field values."""
+    first = rng.choice(["Thandi", "Pieter", "Aisha", "Johan", "Lerato", "Megan", "Sipho", "Anke"])
+    last = rng.choice(["Nkosi", "van der Merwe", "Patel", "Botha", "Mokoena", "Smith", "Dlamini", "Naidoo"])
+    return {
+        "Shareholder Full Name": f"{first} {last}",
+        "Shareholder Number": f"{rng.randrange(10**12, 10**13):013d}",
+        "Company Name": rng.choice(["Acme Holdings Ltd", "Karoo Mining Corp", "Cape Agri Group"]),
+        "Address 1": f"{rng.randint(1, 999)} {rng.choice(['Main', 'Church', 'Long', 'Oak'])} Street",
+        "Address 2": rng.choice(["Gardens", "Rosebank", "Hatfield", "Umhlanga"]),
+        "Address 3": rng.choice(["Cape Town", "Johannesburg", "Pretoria", "Durban"]),
+        "Address 4": "",
+        "Address 5": "South Africa",
+        "Postal Code": f"{rng.randint(1, 9999):04d}",
+        "Bank Name": rng.choice(["First National Bank", "Standard Bank", "Absa", "Nedbank"]),
+        "Bank Account Number": f"{rng.randrange(10**9, 10**10)}",
+        "Payment Reference": f"PA{index:08d}",
+        "Payment Date": (date(2025, 1, 1) + timedelta(days=rng.randint(0, 364))).isoformat(),
+        "Amount Paid": f"{rng.uniform(10, 250000):,.2f}",
+    }
+
+
+def render_synthetic_html(html_dir: str, count: int, seed: int = 1) -> List[str]:
+    """
+    Render ``count`` payment advices from the real template into ``html_dir``.
+
+    Returns:
+        The HTML file names, in order
+    """
+    os.makedirs(html_dir, exist_ok=True)
+    for asset in ("payment_advice_styles.css", "banner.png"):
+        if (TEMPLATE_DIR / asset).exists():
+            shutil.copy(TEMPLATE_DIR / asset, html_dir)
+
+    template = Environment(loader=FileSystemLoader(str(TEMPLATE_DIR))).get_template(TEMPLATE_NAME)
+    rng = random.Random(seed)
+    html_files = []
+    for index in range(1, count + 1):
+        html_file = f"payment_advice_{index:06d}.html"
+        with open(os.path.join(html_dir, html_file), "w", encoding="utf-8") as f:
+            f.write(template.render(record=synthetic_record(index, rng)))
+        html_files.append(html_file)
+    return html_files
+
+
+def write_stub_converter(work_dir: str) -> str:
+    """Write the stub converter and return the path to run it as wkhtmltopdf."""
+    script = os.path.join(work_dir, "pdf_stub.py")
+    with open(script, "w", encoding="utf-8") as f:
+        f.write(STUB_CONVERTER)
+    if os.name == "nt":
+        launcher = os.path.join(work_dir, "pdf_stub.bat")
+        with open(launcher, "w", encoding="utf-8") as f:
+            f.write(f'@"{sys.executable}" "{script}" %*\n')
+        return launcher
+    launcher = os.path.join(work_dir, "pdf_stub")
+    with open(launcher, "w", encoding="utf-8") as f:
+        f.write(f"#!{sys.executable}\n{STUB_CONVERTER}")
+    os.chmod(launcher, 0o755)
+    return launcher
+
+
+def _usage() -> Dict[str, float]:
+    """
+    CPU seconds of this process and its finished children, and the peak RSS
+    (MB) of the largest single one of them; ru_maxrss is per process, so it
+    says nothing about the pool as a whole.
+    """
+    if not RESOURCE_AVAILABLE:
+        return {"cpu": 0.0, "max_process_rss_mb": 0.0}
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "cpu": own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime,
+        "max_process_rss_mb": max(own.ru_maxrss, children.ru_maxrss) / scale,
+    }
+
+
+class TreeRssSampler:
+    """
+    Sample the summed RSS of this process and all its descendants (pool
+    workers and their converters) in a background thread and keep the peak.
+
+    Usage:
+        with TreeRssSampler() as sampler:
+            run()
+        sampler.peak_mb  # None without psutil
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak_mb: Optional[float] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def sample(self) -> None:
+        """Take one sample of the process tree."""
+        root = psutil.Process()
+        total = 0
+        for process in [root] + root.children(recursive=True):
+            try:
+                total += process.memory_info().rss
+            except (psutil.NoSuchProcess, psutil.AccessDenied):
+                continue
+        total_mb = total / (1024 * 1024)
+        self.peak_mb = total_mb if self.peak_mb is None else max(self.peak_mb, total_mb)
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.sample()
+
+    def __enter__(self) -> "TreeRssSampler":
+        if PSUTIL_AVAILABLE:
+            self.sample()
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        if self._thread:
+            self._stop.set()
+            self._thread.join()
+
+
+def run_scenario(scenario: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Convert the first ``size`` documents of ``html_dir`` as the scenario describes.
+
+    Args:
+        scenario: Dict with generator, mode, size, workers, batch_size,
+            html_dir, pdf_dir, and for wkhtmltopdf/stub the converter path
+
+    Returns:
+        The scenario plus wall time, docs/sec, CPU utilisation, memory and failures
+    """
+    html_dir, pdf_dir = scenario["html_dir"], scenario["pdf_dir"]
+    os.makedirs(pdf_dir, exist_ok=True)
+    html_files = sorted(f for f in os.listdir(html_dir) if f.endswith(".html"))[:scenario["size"]]
+
+    generator = "weasyprint" if scenario["generator"] == "weasyprint" else "wkhtmltopdf"
+    workers = scenario.get("workers") or 1
+    pdf_config = {
+        "generator": generator,
+        "wkhtmltopdf": scenario.get("converter", "wkhtmltopdf"),
+        "wkhtmltopdf_batch_size": scenario.get("batch_size") or 1,
+        "timeout": scenario.get("timeout", 60),
+        "multiprocessing_workers": workers,
+        "weasyprint_workers": workers,
+        "multiprocessing_threshold": 0,
+        "max_workers": workers,
+        "min_pool_seconds": 0,
+        "max_retries": 0,
+    }
+    settings = resolve_pdf_settings({"pdf": pdf_config}, None, html_dir)
+    if scenario["mode"] == "batch":
+        tasks = [(html_files[i:i + settings.batch_size], html_dir, pdf_dir, settings)
+                 for i in range(0, len(html_files), settings.batch_size)]
+    else:
+        tasks = [(html_file, html_dir, pdf_dir, settings) for html_file in html_files]
+
+    before = _usage()
+    start = time.perf_counter()
+    with TreeRssSampler() as sampler:
+        if scenario["mode"] == "sequential":
+            results = [result for task in tasks for result in process_pdf_task(task)]
+        elif scenario["mode"] == "adaptive":
+            results = run_pdf_tasks_adaptive(tasks, settings, pdf_config)
+        else:
+            results = run_pdf_tasks_fixed(tasks, settings, pdf_config)
+    wall = time.perf_counter() - start
+    after = _usage()
+
+    converted = sum(1 for result in results if result["success"])
+    failures = [result.get("error") for result in results if not result["success"]]
+    return {
+        **{key: scenario[key] for key in ("generator", "mode", "size", "workers", "batch_size")},
+        "wall_seconds": round(wall, 3),
+        "docs_per_sec": round(converted / wall, 2) if wall > 0 else 0.0,
+        "cpu_utilisation": round((after["cpu"] - before["cpu"]) / (wall * available_cores()), 3) if wall > 0 else 0.0,
+        "peak_tree_rss_mb": round(sampler.peak_mb, 1) if sampler.peak_mb is not None else None,
+        "max_process_rss_mb": round(after["max_process_rss_mb"], 1),
+        "converted": converted,
+        "failed": len(failures),
+        "first_error": failures[0] if failures else None,
+    }
+
+
+def scenario_key(result: Dict[str, Any]) -> str:
+    """Identity of a scenario for comparing runs."""
+    return (f"{result['generator']}/{result['mode']}/n={result['size']}"
+            f"/w={result.get('workers') or 1}/b={result.get('batch_size') or 1}")
+
+
+def compare_with_baseline(results: List[Dict[str, Any]], baseline: List[Dict[str, Any]],
+                          tolerance: float) -> List[Dict[str, Any]]:
+    """
+    Find scenarios whose throughput dropped by more than ``tolerance`` (a fraction).
+
+    Returns:
+        One entry per regression with the key, baseline and current docs/sec
+    """
+    previous = {scenario_key(result): result for result in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get(scenario_key(result))
+        if before and before["docs_per_sec"] and result["docs_per_sec"] < before["docs_per_sec"] * (1 - tolerance):
+            regressions.append({
+                "scenario": scenario_key(result),
+                "baseline": before["docs_per_sec"],
+                "current": result["docs_per_sec"],
+                "change": round(result["docs_per_sec"] / before["docs_per_sec"] - 1, 3),
+            })
+    return regressions
+
+
+def _available_generators(requested: List[str], work_dir: str) -> Dict[str, Optional[str]]:
+    """Map each usable generator to its converter path (None for WeasyPrint)."""
+    available: Dict[str, Optional[str]] = {}
+    for generator in requested:
+        if generator == "stub":
+            available["stub"] = write_stub_converter(work_dir)
+        elif generator == "wkhtmltopdf":
+            path = _configured_wkhtmltopdf()
+            if path:
+                available["wkhtmltopdf"] = path
+            else:
+                console.print("[yellow]wkhtmltopdf not found (pdf.wkhtmltopdf or PATH), skipping it[/yellow]")
+        elif generator == "weasyprint":
+            try:
+                importlib.import_module("weasyprint")
+                available["weasyprint"] = None
+            except Exception as e:
+                console.print(f"[yellow]WeasyPrint not usable ({e}), skipping it[/yellow]")
+        else:
+            console.print(f"[yellow]Unknown generator '{generator}', skipping it[/yellow]")
+    return available
+
+
+def _configured_wkhtmltopdf() -> Optional[str]:
+    """The wkhtmltopdf from ``pdf.wkhtmltopdf`` in the config if it exists, else the one on PATH."""
+    try:
+        configured = load_config().get("pdf", {}).get("wkhtmltopdf")
+    except Exception:
+        configured = None
+    if configured and os.path.isfile(configured):
+        return configured
+    return shutil.which(configured or "wkhtmltopdf") or shutil.which("wkhtmltopdf")
+
+
+def _plan(generators: Dict[str, Optional[str]], modes: List[str], sizes: List[int],
+          workers: List[int], batch_size: int) -> List[Dict[str, Any]]:
+    scenarios = []
+    for generator, converter in generators.items():
+        for size in sizes:
+            for mode in modes:
+                if mode == "batch" and generator == "weasyprint":
+                    continue
+                base = {"generator": generator, "mode": mode, "size": size, "converter": converter,
+                        "workers": None, "batch_size": None}
+                if mode == "pool":
+                    scenarios.extend({**base, "workers": count} for count in workers)
+                elif mode == "adaptive":
+                    scenarios.append({**base, "workers": max(workers)})
+                elif mode == "batch":
+                    scenarios.append({**base, "workers": max(workers), "batch_size": batch_size})
+                else:
+                    scenarios.append(base)
+    return scenarios
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(part) for part in value.split(",") if part.strip()]
+
+
+@app.command()
+def run(
+    sizes: str = typer.Option("100,1000,10000", "--sizes", help="Comma-separated document counts"),
+    generators: str = typer.Option("wkhtmltopdf,weasyprint,stub", "--generators", help="Generators to try; unavailable ones are skipped"),
+    modes: str = typer.Option(",".join(MODES), "--modes", help="Execution modes to time"),
+    workers: str = typer.Option("", "--workers", help="Worker counts for pool mode (default: 1, half and all cores)"),
+    batch_size: int = typer.Option(25, "--batch-size", help="Documents per wkhtmltopdf process in batch mode"),
+    stub_ms: float = typer.Option(20.0, "--stub-ms", help="CPU time the stub converter spends per document"),
+    stub_startup_ms: float = typer.Option(150.0, "--stub-startup-ms", help="CPU time the stub converter spends starting up"),
+    work_dir: Optional[str] = typer.Option(None, "--work-dir", help="Where to write the HTML and PDFs (default: a temporary directory)"),
+    output: Optional[str] = typer.Option(None, "--output", "-o", help="Save the results as JSON"),
+    baseline: Optional[str] = typer.Option(None, "--baseline", help="Compare with results saved earlier with --output"),
+    tolerance: float = typer.Option(0.10, "--tolerance", help="Allowed drop in docs/sec against the baseline"),
+):
+    """
+    Run the benchmark and print a report.
+    """
+    size_list = sorted(set(_int_list(sizes)))
+    cores = available_cores()
+    worker_list = sorted(set(_int_list(workers))) if workers else sorted({1, max(1, cores // 2), cores})
+
+    temp_dir = None
+    if work_dir is None:
+        temp_dir = work_dir = tempfile.mkdtemp(prefix="pdf_benchmark_")
+    os.makedirs(work_dir, exist_ok=True)
+
+    try:
+        html_dir = os.path.join(work_dir, "html")
+        console.print(f"Rendering {max(size_list)} synthetic payment advices into {html_dir}...")
+        render_synthetic_html(html_dir, max(size_list))
+
+        available = _available_generators([g.strip() for g in generators.split(",") if g.strip()], work_dir)
+        scenarios = _plan(available, [m.strip() for m in modes.split(",") if m.strip()],
+                          size_list, worker_list, batch_size)
+        env = {**os.environ, "PDF_STUB_MS": str(stub_ms), "PDF_STUB_STARTUP_MS": str(stub_startup_ms)}
+
+        results = []
+        for index, scenario in enumerate(scenarios, start=1):
+            scenario = {**scenario, "html_dir": html_dir, "pdf_dir": os.path.join(work_dir, f"pdf_{index}")}
+            console.print(f"[{index}/{len(scenarios)}] {scenario_key(scenario)}")
+            process = subprocess.run(
+                [sys.executable, __file__, "scenario", json.dumps(scenario)],
+                capture_output=True, text=True, env=env, cwd=str(PROJECT_ROOT_DIR)
+            )
+            shutil.rmtree(scenario["pdf_dir"], ignore_errors=True)
+            if process.returncode != 0:
+                console.print(f"[red]Scenario failed:[/red] {process.stderr.strip()[-500:]}")
+                continue
+            results.append(json.loads(process.stdout.strip().splitlines()[-1]))
+    finally:
+        if temp_dir:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+
+    _print_report(results, cores)
+
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump({"cores": cores, "results": results}, f, indent=2)
+        console.print(f"Results saved to {output}")
+
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            regressions = compare_with_baseline(results, json.load(f).get("results", []), tolerance)
+        if regressions:
+            for regression in regressions:
+                console.print(f"[bold red]Regression[/bold red] {regression['scenario']}: "
+                              f"{regression['baseline']} -> {regression['current']} docs/sec ({regression['change']:+.0%})")
+            raise typer.Exit(code=1)
+        console.print(f"[green]No scenario is more than {tolerance:.0%} slower than the baseline[/green]")
+
+
+@app.command("scenario", hidden=True)
+def scenario_command(scenario_json: str):
+    """
+    Run one scenario and print its result as JSON (used by ``run``).
+    """
+    print(json.dumps(run_scenario(json.loads(scenario_json))))
+
+
+def _print_report(results: List[Dict[str, Any]], cores: int) -> None:
+    table = Table(title=f"PDF conversion ({cores} cores)")
+    for column in ("Generator", "Mode", "Docs", "Workers", "Batch", "Wall (s)", "Docs/sec", "CPU util",
+                   "Peak total RSS (MB)", "Max process RSS (MB)", "Failed"):
+        table.add_column(column, justify="left" if column in ("Generator", "Mode") else "right")
+    for result in results:
+        table.add_row(
+            result["generator"], result["mode"], str(result["size"]), str(result["workers"] or 1),
+            str(result["batch_size"] or 1), f"{result['wall_seconds']:.2f}", f"{result['docs_per_sec']:.1f}",
+            f"{result['cpu_utilisation']:.0%}",
+            "-" if result.get("peak_tree_rss_mb") is None else f"{result['peak_tree_rss_mb']:.0f}",
+            f"{result['max_process_rss_mb']:.0f}", str(result["failed"])
+        )
+    console.print(table)
+    for result in results:
+        if result["first_error"]:
+            console.print(f"[yellow]{scenario_key(result)}: {result['failed']} failed, e.g. {result['first_error'][:200]}[/yellow]")
+
+
+if __name__ == "__main__":
+    app()
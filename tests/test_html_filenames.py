@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Tests for compiled output filename templates and in-memory uniqueness.
+"""
+
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.html_generator import FilenameTemplate, UniqueFilenameAllocator, sanitize_filename_value
+
+PATTERN = "{datetime}_{SHAREHOLDER_ID_NUMBER}_payment_advice_{PAYMENT_REFERENCE}.{HTML|PDF}"
+
+
+def test_template_formats_placeholders():
+    template = FilenameTemplate(PATTERN, "payment_advice", timestamp="20250101120000")
+    record = {"SHAREHOLDER_ID_NUMBER": " 8001015009087 ", "PAYMENT_REFERENCE": "1520641161/OML"}
+
+    assert template.format(record, 1) == "20250101120000_8001015009087_payment_advice_1520641161-OML.html"
+
+
+def test_template_marks_missing_and_empty_values():
+    template = FilenameTemplate(PATTERN, "payment_advice", timestamp="20250101120000")
+
+    assert template.format({"PAYMENT_REFERENCE": "///"}, 7) == (
+        "20250101120000_SHAREHOLDER_ID_NUMBER_MISSING_payment_advice_PAYMENT_REFERENCE_EMPTY.html"
+    )
+
+
+def test_template_without_pattern_uses_row_number():
+    template = FilenameTemplate.from_schema(None, "payment_advice")
+
+    assert template.format({}, 12) == "payment_advice_0012.html"
+
+
+def test_sanitize_collapses_invalid_runs():
+    assert sanitize_filename_value("  A/B  C--D.  ") == "A-B-C-D"
+    assert sanitize_filename_value("ABC123") == "ABC123"
+
+
+def test_allocator_resolves_collisions_in_memory(tmp_path):
+    (tmp_path / "doc.html").write_text("existing")
+    allocator = UniqueFilenameAllocator(str(tmp_path))
+
+    assert allocator.claim("doc.html") == "doc_1.html"
+    assert allocator.claim("doc.html") == "doc_2.html"
+    assert allocator.claim("other.html") == "other.html"
+    assert allocator.collisions == 2
+
+    allocator.release("other.html")
+    assert allocator.claim("other.html") == "other.html"
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+"""
+Tests for row selection and output cleanup used by targeted HTML generation.
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import functools
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.html_generator import (
+    UniqueFilenameAllocator, _manifest_from_generated, _remove_row_output, parse_row_spec, select_target_rows
+)
+
+
+def test_parse_row_spec_accepts_ranges_and_lists():
+    assert parse_row_spec("1-3, 7,10-10") == {1, 2, 3, 7, 10}
+    assert parse_row_spec([4, "8-9"]) == {4, 8, 9}
+    assert parse_row_spec(5) == {5}
+
+
+@pytest.mark.parametrize("spec", ["0", "5-2", "a-b", "3,x"])
+def test_parse_row_spec_rejects_malformed_selections(spec):
+    with pytest.raises(ValueError):
+        parse_row_spec(spec)
+
+
+def test_select_target_rows_ignores_rows_past_the_end():
+    assert select_target_rows(5, rows="4-9") == {4, 5}
+
+
+def test_parse_row_spec_clamps_ranges_to_the_table():
+    assert parse_row_spec("3-2000000000", max_row=5) == {3, 4, 5}
+    assert select_target_rows(3, rows="1-2000000000") == {1, 2, 3}
+
+
+def _imported_table(path):
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE imported_t ("Payment Ref" TEXT, "Note" TEXT, "Amount" REAL)')
+    conn.executemany("INSERT INTO imported_t VALUES (?, ?, ?)", [
+        ("REF1", "a;b", 10.0), ("REF2", "plain", 250.0), ("REF3", "a;b", 300.0),
+    ])
+    conn.commit()
+    conn.close()
+
+
+def test_where_filter_selects_rows_by_mapped_and_original_names(tmp_path):
+    db_path = str(tmp_path / "data.db")
+    _imported_table(db_path)
+    select = functools.partial(select_target_rows, 3, db_path=db_path, table_name="imported_t",
+                               reverse_mapping={"Payment Ref": "PAYMENT_REFERENCE"})
+
+    assert select(where="PAYMENT_REFERENCE IN ('REF1', 'REF3')") == {1, 3}
+    assert select(where='"Amount" > 100') == {2, 3}
+    assert select(where="Note = 'a;b'") == {1, 3}
+    assert select(rows="1-2", where="Note = 'a;b'") == {1}
+
+
+@pytest.mark.parametrize("where", [
+    "1 = 1; DELETE FROM imported_t",
+    "(SELECT COUNT(*) FROM sqlite_master) > 0",
+    "NO_SUCH_COLUMN = 1",
+])
+def test_where_filter_rejects_writes_other_tables_and_unknown_columns(tmp_path, where):
+    db_path = str(tmp_path / "data.db")
+    _imported_table(db_path)
+
+    with pytest.raises(ValueError):
+        select_target_rows(3, where=where, db_path=db_path, table_name="imported_t")
+    assert sqlite3.connect(db_path).execute("SELECT COUNT(*) FROM imported_t").fetchone()[0] == 3
+
+
+def _generated_table(conn, rows):
+    conn.execute(
+        "CREATE TABLE generated_t (id INTEGER PRIMARY KEY AUTOINCREMENT, document_type TEXT NOT NULL, "
+        "mime_type TEXT NOT NULL, input_file TEXT NOT NULL, row INTEGER NOT NULL, data TEXT NOT NULL)"
+    )
+    for row_number, data in rows:
+        conn.execute("INSERT INTO generated_t (document_type, mime_type, input_file, row, data) "
+                     "VALUES ('payment_advice', 'text/html', 'in.csv', ?, ?)", (row_number, json.dumps(data)))
+    # A PDF entry of a targeted row stays
+    conn.execute("INSERT INTO generated_t (document_type, mime_type, input_file, row, data) "
+                 "VALUES ('payment_advice', 'application/pdf', 'in.csv', 2, '{}')")
+
+
+def test_targeted_cleanup_without_manifest_uses_generated_rows(tmp_path):
+    schema = {"output_doc_name": "{datetime}_{REF}.{HTML|PDF}"}
+    conn = sqlite3.connect(":memory:")
+    # Rows 2 and 3 share a reference, so row 3's file got a _1 suffix
+    _generated_table(conn, [(1, {"REF": "A"}), (2, {"REF": "B"}), (3, {"REF": "B"})])
+    for name in ("20240101120000_A.html", "20240101120000_B.html", "20240101120000_B_1.html", "notes.html"):
+        (tmp_path / name).write_text("old")
+
+    manifest = _manifest_from_generated(str(tmp_path), conn, "generated_t", "in.csv", schema, "payment_advice")
+    assert manifest == {
+        "20240101120000_A.html": {"row": 1, "generated_id": 1},
+        "20240101120000_B.html": {"row": 2, "generated_id": 2},
+        "20240101120000_B_1.html": {"row": 3, "generated_id": 3},
+    }
+
+    removed = _remove_row_output(str(tmp_path), manifest, {3}, conn, "generated_t", "in.csv")
+
+    assert removed == ["20240101120000_B_1.html"]
+    assert sorted(os.listdir(tmp_path)) == ["20240101120000_A.html", "20240101120000_B.html", "notes.html"]
+    assert set(manifest) == {"20240101120000_A.html", "20240101120000_B.html"}
+    assert conn.execute("SELECT row, mime_type FROM generated_t ORDER BY id").fetchall() == [
+        (1, "text/html"), (2, "text/html"), (2, "application/pdf")
+    ]
+    # The regenerated file takes the freed name instead of a new suffix
+    assert UniqueFilenameAllocator(str(tmp_path)).claim("20240101120000_B.html") == "20240101120000_B_1.html"
@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+"""
+Tests for batched lookups against tenant databases, using the SQLite backend as the stand-in for MySQL.
+"""
+
+import os
+import sys
+import sqlite3
+import threading
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.lookup_backends import (
+    ConnectionPool, LookupBackends, LookupBackendError, SqliteLookupBackend, create_lookup_backend
+)
+
+
+def _tenant_db(tmp_path):
+    path = str(tmp_path / "tenant.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (email TEXT)")
+    conn.executemany("INSERT INTO users VALUES (?)",
+                     [(f"user{i}@example.com",) for i in range(10)] + [("Dup@example.com",), ("dup@example.com",)])
+    conn.commit()
+    conn.close()
+    return path
+
+
+def test_values_are_matched_in_batches(tmp_path):
+    backend = SqliteLookupBackend("tenant", _tenant_db(tmp_path), batch_size=4)
+    values = [f"user{i}@example.com" for i in range(10)] + ["user3@example.com", "nobody@example.com"]
+
+    found = backend.match_values("users", "email", values)
+
+    assert found["user3@example.com"] == (1, "user3@example.com")
+    assert "nobody@example.com" not in found
+    # 11 distinct values in batches of 4
+    assert backend.stats() == {"queries": 3, "values": 11, "cached": 0, "connections": 1}
+
+
+def test_case_folding_matches_case_insensitive_columns(tmp_path):
+    # A NOCASE column compares like MySQL's default *_ci collations
+    path = str(tmp_path / "ci.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE people (email TEXT COLLATE NOCASE)")
+    conn.executemany("INSERT INTO people VALUES (?)", [("Ann@example.com",), ("Dup@example.com",), ("dup@EXAMPLE.com",)])
+    conn.commit()
+    conn.close()
+    folded = SqliteLookupBackend("tenant", path, fold_case=True)
+
+    found = folded.match_values("people", "email", ["ann@example.com", "DUP@example.com"])
+
+    assert found[folded.normalise("ann@example.com")] == (1, "Ann@example.com")
+    assert found[folded.normalise("DUP@example.com")][0] == 2
+
+
+def test_both_drivers_ignore_case_unless_case_sensitive(tmp_path):
+    path = _tenant_db(tmp_path)
+    folded = create_lookup_backend("tenant", {"driver": "sqlite", "path": path})
+    exact = create_lookup_backend("tenant", {"driver": "sqlite", "path": path, "case_sensitive": True})
+
+    # users.email is a plain (binary) column
+    assert folded.match_values("users", "email", ["USER1@example.com"]) == {"user1@example.com": (1, "user1@example.com")}
+    assert folded.match_values("users", "email", ["DUP@example.com"])["dup@example.com"][0] == 2
+    assert exact.match_values("users", "email", ["USER1@example.com"]) == {}
+    assert exact.match_values("users", "email", ["Dup@example.com"]) == {"Dup@example.com": (1, "Dup@example.com")}
+
+
+class FakeConnection:
+    def __init__(self, number):
+        self.number = number
+        self.alive = True
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def test_pool_replaces_idle_connections_that_fail_validation():
+    opened = []
+
+    def connect():
+        opened.append(FakeConnection(len(opened) + 1))
+        return opened[-1]
+
+    def validate(conn):
+        if not conn.alive:
+            raise ConnectionError("server has gone away")
+
+    pool = ConnectionPool(connect, size=1, validate=validate)
+    with pool.connection() as conn:
+        assert conn.number == 1
+    opened[0].alive = False
+
+    with pool.connection() as conn:
+        assert conn.number == 2
+    assert opened[0].closed and pool.opened == 2
+    with pool.connection() as conn:
+        assert conn.number == 2
+
+
+def test_pool_reuses_connections_across_threads(tmp_path):
+    backend = SqliteLookupBackend("tenant", _tenant_db(tmp_path), pool_size=2)
+    errors = []
+
+    def work():
+        try:
+            for _ in range(20):
+                backend.match_values("users", "email", ["user1@example.com"])
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert backend.stats()["queries"] == 80
+    assert backend.pool.opened <= 2
+    backend.close()
+
+
+def test_failed_query_discards_connection(tmp_path):
+    backend = SqliteLookupBackend("tenant", _tenant_db(tmp_path), pool_size=1)
+    try:
+        backend.match_values("missing_table", "email", ["x"])
+    except sqlite3.OperationalError:
+        pass
+    assert backend.match_values("users", "email", ["user0@example.com"])
+    assert backend.pool.opened == 2
+
+
+def test_registry_creates_backends_and_remembers_failures(tmp_path):
+    backends = LookupBackends({"archive": {"driver": "sqlite", "path": _tenant_db(tmp_path)},
+                               "legacy": {"driver": "oracle"}})
+    assert isinstance(backends.get("archive"), SqliteLookupBackend)
+    for name in ("legacy", "unknown"):
+        try:
+            backends.get(name)
+            assert False, f"{name} should not be usable"
+        except LookupBackendError:
+            pass
+
+    assert backends.fail("archive", LookupBackendError("down")) is True
+    assert backends.fail("archive", LookupBackendError("down")) is False
+    try:
+        backends.get("archive")
+        assert False, "a failed connection should stay disabled"
+    except LookupBackendError:
+        pass
+
+
+def test_mysql_is_the_default_driver_when_a_host_is_given():
+    try:
+        backend = create_lookup_backend("local_mysql", {"host": "localhost", "pool_size": 2, "batch_size": 250})
+    except LookupBackendError:
+        return  # pymysql not installed
+    assert (backend.placeholder, backend.batch_size, backend.fold_case, backend.pool.size) == ("%s", 250, True, 2)
+
+
+def test_unknown_settings_are_rejected():
+    try:
+        create_lookup_backend("aws", {"river": "mysql", "host": "db.example.com"})
+        assert False, "a misspelt driver should not fall back to the default"
+    except LookupBackendError as e:
+        assert "'aws'" in str(e) and "river" in str(e)
+
+
+def test_check_names_every_unusable_connection(tmp_path):
+    backends = LookupBackends({"archive": {"driver": "sqlite", "path": _tenant_db(tmp_path)},
+                               "legacy": {"driver": "oracle"},
+                               "moved": {"driver": "sqlite", "path": str(tmp_path / "missing" / "tenant.db")}})
+    backends.check(["archive"])
+    try:
+        backends.check(["archive", "legacy", "moved", "unknown"])
+        assert False, "unusable connections should fail the check"
+    except LookupBackendError as e:
+        assert all(f"'{name}'" in str(e) for name in ("legacy", "moved", "unknown"))
+        assert "'archive'" not in str(e)
+    # The check opened one connection, which the run reuses
+    assert backends.stats()["archive"]["connections"] == 1
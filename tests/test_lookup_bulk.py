@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Tests that set-based and concurrent lookup resolution write the same results as the per-record path.
+"""
+
+import os
+import sys
+import json
+import sqlite3
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.lookup_audit import create_lookup_audit
+from core.lookup_backends import LookupBackends, SqliteLookupBackend
+from core.lookup_resolver import (
+    _ensure_tables_exist, _resolve_records_async, _resolve_records_bulk, _resolve_records_per_record,
+    compile_lookup_plans
+)
+
+TABLES = ("generated_t", "tenant_lookup_t", "tenant_lookup_exceptions_t")
+
+MAPPINGS = {
+    "column_to_column": [
+        "local_sqlite:imported_t:'ID Number' = local_sqlite:users:id_number",
+        "local_sqlite:imported_t:Email = local_sqlite:users:email",
+        "broken mapping",
+    ],
+    "type_to_column": [
+        "local_sqlite:imported_t:ACCOUNT = local_mysql:accounts:number",
+    ],
+}
+
+RECORDS = [
+    {"ID Number": "8001015009087", "Email": "a@example.com"},   # first mapping
+    {"ID Number": "0000000000000", "Email": "b@example.com"},   # second mapping
+    {"ID Number": "7001015009081"},                             # ambiguous, nothing else
+    {"ID Number": 9001015009089},                               # integer against a TEXT column
+    {"Email": ["not", "bindable"], "ACCOUNT": "12345"},         # falls through to the MySQL mapping
+    {"Email": "nobody@example.com"},                            # no match anywhere
+    "not json",
+]
+
+
+def _database():
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute(
+        "CREATE TABLE generated_t (id INTEGER PRIMARY KEY AUTOINCREMENT, document_type TEXT NOT NULL, "
+        "mime_type TEXT NOT NULL, input_file TEXT NOT NULL, row INTEGER NOT NULL, data TEXT NOT NULL, "
+        "lookup_type TEXT, lookup TEXT, lookup_match TEXT, lookup_value TEXT)"
+    )
+    cursor.execute("CREATE TABLE users (id_number TEXT, email TEXT)")
+    cursor.executemany("INSERT INTO users VALUES (?, ?)", [
+        ("8001015009087", "x@example.com"),
+        ("1111111111111", "b@example.com"),
+        ("7001015009081", "c@example.com"),
+        ("7001015009081", "d@example.com"),
+        ("9001015009089", "e@example.com"),
+    ])
+    for row, record in enumerate(RECORDS, start=1):
+        data = record if isinstance(record, str) else json.dumps(record)
+        cursor.execute("INSERT INTO generated_t (document_type, mime_type, input_file, row, data) "
+                       "VALUES ('payment_advice', 'text/html', 'in.csv', ?, ?)", (row, data))
+    _ensure_tables_exist(cursor, *TABLES)
+    cursor.execute("SELECT id, document_type, mime_type, input_file, row, data FROM generated_t")
+    return conn, cursor.fetchall()
+
+
+def _backends(path):
+    """A SQLite stand-in for the tenant's MySQL database."""
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE accounts (number TEXT)")
+    conn.executemany("INSERT INTO accounts VALUES (?)", [("ACC-12345",), ("12345",), ("777",), ("777",)])
+    conn.commit()
+    conn.close()
+    backends = LookupBackends()
+    backends.register("local_mysql", SqliteLookupBackend("local_mysql", path, batch_size=2))
+    return backends
+
+
+def _dump(conn):
+    return {
+        "generated": conn.execute("SELECT id, lookup_type, lookup, lookup_match, lookup_value FROM generated_t ORDER BY id").fetchall(),
+        "attempts": conn.execute("SELECT id, generated_id, action, tenant_lookup_exceptions_id FROM tenant_lookup_t ORDER BY id").fetchall(),
+        "exceptions": conn.execute("SELECT id, action, exception_message, input_file, row, data FROM tenant_lookup_exceptions_t ORDER BY id").fetchall(),
+    }
+
+
+def test_bulk_resolution_matches_per_record_resolution(tmp_path):
+    plans, invalid = compile_lookup_plans(MAPPINGS)
+    assert [entry["mapping"] for entry in invalid] == ["broken mapping"]
+
+    per_record_conn, records = _database()
+    per_record_counts = _resolve_records_per_record(per_record_conn.cursor(), TABLES, records, plans,
+                                                    "payment_advice", _backends(str(tmp_path / "per_record.db")))
+    bulk_conn, records = _database()
+    bulk_counts = _resolve_records_bulk(bulk_conn.cursor(), TABLES, records, plans,
+                                        "payment_advice", _backends(str(tmp_path / "bulk.db")))
+
+    assert bulk_counts == per_record_counts == (4, 3)
+    assert _dump(bulk_conn) == _dump(per_record_conn)
+
+    resolved = {row[0]: row[4] for row in _dump(bulk_conn)["generated"]}
+    assert resolved == {1: "8001015009087", 2: "b@example.com", 3: None, 4: "9001015009089",
+                        5: "12345", 6: None, 7: None}
+
+
+def test_concurrent_resolution_matches_bulk_resolution(tmp_path):
+    plans, _ = compile_lookup_plans(MAPPINGS)
+
+    bulk_conn, records = _database()
+    bulk_counts = _resolve_records_bulk(bulk_conn.cursor(), TABLES, records, plans,
+                                        "payment_advice", _backends(str(tmp_path / "bulk.db")))
+    concurrent_conn, records = _database()
+    concurrent_counts = _resolve_records_async(concurrent_conn.cursor(), TABLES, records, plans,
+                                               "payment_advice", _backends(str(tmp_path / "concurrent.db")),
+                                               concurrency=2)
+
+    assert concurrent_counts == bulk_counts
+    assert _dump(concurrent_conn) == _dump(bulk_conn)
+
+
+def test_compact_audit_views_rebuild_the_full_audit(tmp_path):
+    plans, _ = compile_lookup_plans(MAPPINGS)
+
+    for resolve in (_resolve_records_bulk, _resolve_records_per_record):
+        full_conn, records = _database()
+        resolve(full_conn.cursor(), TABLES, records, plans, "payment_advice",
+                _backends(str(tmp_path / f"{resolve.__name__}_full.db")))
+        compact_conn, records = _database()
+        cursor = compact_conn.cursor()
+        audit = create_lookup_audit(cursor, TABLES, plans, "compact")
+        resolve(cursor, TABLES, records, plans, "payment_advice",
+                _backends(str(tmp_path / f"{resolve.__name__}_compact.db")), audit=audit)
+
+        assert compact_conn.execute("SELECT COUNT(*) FROM tenant_lookup_t").fetchone()[0] == 0
+        assert compact_conn.execute("SELECT COUNT(*) FROM tenant_lookup_log_t").fetchone()[0] == len(RECORDS)
+        assert (compact_conn.execute("SELECT id, generated_id, action, tenant_lookup_exceptions_id "
+                                     "FROM tenant_lookup_view_t ORDER BY id").fetchall()
+                == _dump(full_conn)["attempts"])
+        assert (compact_conn.execute("SELECT id, action, exception_message, input_file, row, data "
+                                     "FROM tenant_lookup_exceptions_view_t ORDER BY id").fetchall()
+                == _dump(full_conn)["exceptions"])
+        assert _dump(compact_conn)["generated"] == _dump(full_conn)["generated"]
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+"""
+Tests for the persistent lookup cache.
+"""
+
+import os
+import sys
+import sqlite3
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.lookup_cache import LookupCache, lookup_cache_from_config
+from core.lookup_backends import LookupBackends, SqliteLookupBackend
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_hits_misses_and_ttl(tmp_path):
+    clock = Clock()
+    cache = LookupCache(str(tmp_path / "cache.db"), ttl_hours=2, negative_ttl_hours=1, clock=clock)
+    cache.put_many("tenant", "users", "email", {"a@x": (1, "a@x"), "gone@x": (0, None), "dup@x": (2, "dup@x")})
+
+    assert cache.get_many("tenant", "users", "email", ["a@x", "gone@x", "dup@x", "new@x"]) == {
+        "a@x": (1, "a@x"), "gone@x": (0, None), "dup@x": (2, "dup@x")}
+    assert cache.get_many("tenant", "users", "id_number", ["a@x"]) == {}
+
+    # Misses expire after the negative TTL, matches after the TTL
+    clock.now += 90 * 60
+    assert set(cache.get_many("tenant", "users", "email", ["a@x", "gone@x"])) == {"a@x"}
+    clock.now += 60 * 60
+    assert cache.get_many("tenant", "users", "email", ["a@x"]) == {}
+
+    assert cache.stats() == {"hits": 4, "misses": 4, "hit_rate": 0.5, "stored": 3, "evicted": 0}
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    clock = Clock()
+    cache = LookupCache(str(tmp_path / "cache.db"), max_entries=2, clock=clock)
+    cache.put_many("tenant", "users", "email", {"a": (1, "a")})
+    clock.now += 1
+    cache.put_many("tenant", "users", "email", {"b": (1, "b")})
+    clock.now += 1
+    cache.get_many("tenant", "users", "email", ["a"])
+    clock.now += 1
+    cache.put_many("tenant", "users", "email", {"c": (1, "c")})
+
+    assert set(cache.get_many("tenant", "users", "email", ["a", "b", "c"])) == {"a", "c"}
+    assert cache.stats()["evicted"] == 1
+
+
+def test_invalidate_by_connection_and_table(tmp_path):
+    cache = LookupCache(str(tmp_path / "cache.db"))
+    cache.put_many("tenant", "users", "email", {"a": (1, "a")})
+    cache.put_many("tenant", "accounts", "number", {"1": (1, "1")})
+    cache.put_many("archive", "users", "email", {"a": (1, "a")})
+
+    assert cache.invalidate("tenant", "users") == 1
+    assert cache.invalidate("tenant") == 1
+    assert cache.get_many("archive", "users", "email", ["a"]) == {"a": (1, "a")}
+    assert cache.invalidate() == 1
+
+
+def test_backend_queries_only_uncached_values(tmp_path):
+    path = str(tmp_path / "tenant.db")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE users (email TEXT)")
+    conn.executemany("INSERT INTO users VALUES (?)", [("a@x",), ("b@x",)])
+    conn.commit()
+    conn.close()
+    cache = lookup_cache_from_config({"cache": {"enabled": True, "path": str(tmp_path / "cache.db")}})
+
+    # First session queries everything, the next one only the new value
+    for values in (["a@x", "nobody@x"], ["a@x", "nobody@x", "b@x"]):
+        backends = LookupBackends(cache=cache)
+        backends.register("tenant", SqliteLookupBackend("tenant", path))
+        found = backends.get("tenant").match_values("users", "email", values)
+        stats = backends.stats()["tenant"]
+        backends.close()
+
+    assert found == {"a@x": (1, "a@x"), "b@x": (1, "b@x")}
+    assert (stats["values"], stats["cached"]) == (1, 2)
+    assert lookup_cache_from_config({}) is None
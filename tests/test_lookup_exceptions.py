@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+"""
+Tests for resolving lookup exceptions in bulk.
+"""
+
+import os
+import sys
+import sqlite3
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import core.lookup_resolver as lookup_resolver
+from core.lookup_resolver import _ensure_tables_exist, resolve_exception, resolve_exceptions
+
+
+def _session(tmp_path, monkeypatch):
+    conn = sqlite3.connect(str(tmp_path / "data.db"))
+    conn.execute(
+        "CREATE TABLE generated_t (id INTEGER PRIMARY KEY AUTOINCREMENT, document_type TEXT NOT NULL, "
+        "mime_type TEXT NOT NULL, input_file TEXT NOT NULL, row INTEGER NOT NULL, data TEXT NOT NULL, "
+        "lookup_type TEXT, lookup TEXT, lookup_match TEXT, lookup_value TEXT)"
+    )
+    conn.executemany("INSERT INTO generated_t (document_type, mime_type, input_file, row, data) "
+                     "VALUES ('payment_advice', 'text/html', 'in.csv', ?, '{}')", [(row,) for row in range(1, 5)])
+    _ensure_tables_exist(conn.cursor(), "generated_t", "tenant_lookup_t", "tenant_lookup_exceptions_t")
+    conn.executemany("INSERT INTO tenant_lookup_exceptions_t (action, exception_message, input_file, row, data, created_at) "
+                     "VALUES ('Invalid JSON data', 'bad', 'in.csv', ?, '{}', 0)", [(row,) for row in range(1, 5)])
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(lookup_resolver, "get_table_name", lambda session_hash: "t")
+    monkeypatch.setattr(lookup_resolver, "get_session_dir", lambda session_hash: str(tmp_path))
+    return str(tmp_path / "data.db")
+
+
+def test_bulk_resolution_reports_each_entry(tmp_path, monkeypatch):
+    db_path = _session(tmp_path, monkeypatch)
+
+    result = resolve_exceptions("session", [
+        {"exception_id": 1, "accept": True, "lookup_value": "FK-1"},
+        {"exception_id": 2, "accept": False},
+        {"exception_id": 3, "accept": True},
+        {"exception_id": 99, "accept": False},
+        {"exception_id": 1, "accept": False},
+        {"exception_id": "4", "accept": False},
+        {"exception_id": 4, "accept": "false", "lookup_value": "FK-4"},
+        {"exception_id": 4, "accept": 1, "lookup_value": "FK-4"},
+        {"exception_id": 4, "lookup_value": "FK-4"},
+    ])
+
+    assert (result["status"], result["resolved"], result["failed"]) == ("success", 2, 7)
+    assert [(item["exception_id"], item["status"]) for item in result["results"]] == [
+        (1, "resolved"), (2, "resolved"), (3, "error"), (99, "error"), (1, "error"), ("4", "error"),
+        (4, "error"), (4, "error"), (4, "error")]
+    assert {item["message"] for item in result["results"][6:]} == {"accept must be true or false"}
+    assert result["results"][0]["generated_id"] == 1
+    assert result["results"][4]["message"] == "Exception with ID 1 is already resolved"
+
+    conn = sqlite3.connect(db_path)
+    assert conn.execute("SELECT id, lookup_type, lookup_value FROM generated_t WHERE lookup_value IS NOT NULL").fetchall() == [
+        (1, "manual_resolution", "FK-1")]
+    assert conn.execute("SELECT id, accept_action, status FROM tenant_lookup_exceptions_t ORDER BY id").fetchall() == [
+        (1, 1, 1), (2, 0, 1), (3, None, 0), (4, None, 0)]
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT id FROM generated_t WHERE input_file = 'in.csv' AND row = 1").fetchall()
+    assert "idx_generated_t_input_row" in plan[0][3]
+
+
+def test_single_resolution_keeps_its_messages(tmp_path, monkeypatch):
+    _session(tmp_path, monkeypatch)
+
+    assert resolve_exception("session", 4, True, "FK-4") == {
+        "status": "success", "message": "Exception 4 resolved with action: accept"}
+    assert resolve_exception("session", 4, True, "FK-4") == {
+        "status": "error", "message": "Exception with ID 4 is already resolved"}
+
+
+def test_accepting_updates_the_record_the_exception_was_raised_for(tmp_path, monkeypatch):
+    db_path = _session(tmp_path, monkeypatch)
+    conn = sqlite3.connect(db_path)
+    # Row 5's PDF record is older than its HTML record, as after regenerating the HTML
+    conn.execute("INSERT INTO generated_t (document_type, mime_type, input_file, row, data) "
+                 "VALUES ('payment_advice', 'application/pdf', 'in.csv', 5, '{\"file\": \"doc_5.html\"}')")
+    conn.execute("INSERT INTO generated_t (document_type, mime_type, input_file, row, data) "
+                 "VALUES ('payment_advice', 'text/html', 'in.csv', 5, '{\"REF\": \"5\"}')")
+    conn.execute("INSERT INTO tenant_lookup_exceptions_t (action, exception_message, input_file, row, data, created_at) "
+                 "VALUES ('No match', 'none', 'in.csv', 5, '{\"REF\": \"5\"}', 0)")
+    conn.commit()
+
+    result = resolve_exceptions("session", [{"exception_id": 5, "accept": True, "lookup_value": "FK-5"}])
+
+    assert result["results"][0]["generated_id"] == 6
+    assert conn.execute("SELECT mime_type FROM generated_t WHERE lookup_value = 'FK-5'").fetchall() == [("text/html",)]
@@ -0,0 +1,161 @@
+#!/usr/bin/env python
+"""
+Tests for normalised and fuzzy lookup matching.
+"""
+
+import os
+import sys
+import json
+import sqlite3
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import core.lookup_matching as lookup_matching
+from core.lookup_matching import CandidateIndex, MatchRule, compile_match_rule, levenshtein
+from core.lookup_backends import LookupBackends, SqliteLookupBackend
+from core.lookup_resolver import (
+    _ensure_tables_exist, _resolve_records_async, _resolve_records_bulk, _resolve_records_per_record,
+    compile_lookup_plan, compile_lookup_plans
+)
+
+TABLES = ("generated_t", "tenant_lookup_t", "tenant_lookup_exceptions_t")
+
+
+def test_normalisers_and_unique_matches():
+    index = CandidateIndex(MatchRule(("trim", "digits", "strip_zeros")),
+                           [("800101 5009 087", 1), ("ACC-00042", 1), ("42", 1), ("777", 2)])
+    assert index.match("8001015009087") == ("800101 5009 087", 0)
+    # "ACC-00042" and "42" share a key, as do the two "777" rows
+    assert index.match("0042") is None
+    assert index.match(" 777 ") is None
+    assert index.match("no digits") is None
+
+    emails = CandidateIndex(MatchRule(("trim", "casefold")), [("Jane@Example.com", 1)])
+    assert emails.match("  jane@example.COM ") == ("Jane@Example.com", 0)
+
+    # trim keeps inner whitespace, no_spaces drops it
+    names = [("Van der Merwe", 1)]
+    assert CandidateIndex(MatchRule(("trim",)), names).match(" Van der Merwe ") == ("Van der Merwe", 0)
+    assert CandidateIndex(MatchRule(("trim",)), names).match("Vander Merwe") is None
+    assert CandidateIndex(MatchRule(("no_spaces",)), names).match("Vander  Merwe") == ("Van der Merwe", 0)
+
+
+def test_fuzzy_match_takes_the_closest_unique_key():
+    index = CandidateIndex(MatchRule(("casefold",), 2), [("smith", 1), ("smyth", 1), ("jones", 1), ("johnson", 1)])
+    assert index.match("Jonse") == ("jones", 2)
+    assert index.match("jone") == ("jones", 1)
+    # Equally close to smith and smyth
+    assert index.match("smoth") is None
+    assert index.match("williams") is None
+
+
+def test_fuzzy_match_compares_only_candidates():
+    index = CandidateIndex(MatchRule((), 1), [(f"user{number}@example.com", 1) for number in range(20000)])
+    assert index.match("usr1234@example.com") == ("user1234@example.com", 1)
+    assert index.comparisons < 10
+
+
+def test_pure_python_distance_matches_levenshtein(monkeypatch):
+    pairs = [("kitten", "sitting"), ("", "abc"), ("flaw", "lawn"), ("same", "same"), ("abcdef", "azcdxf")]
+    expected = [levenshtein(a, b, 2) for a, b in pairs]
+    monkeypatch.setattr(lookup_matching, "LEVENSHTEIN_AVAILABLE", False)
+    assert [levenshtein(a, b, 2) for a, b in pairs] == expected == [3, 3, 2, 0, 2]
+
+
+def test_mapping_options_are_compiled():
+    plan = compile_lookup_plan("column_to_column", {
+        "mapping": "local_sqlite:imported_t:Email = local_sqlite:users:email",
+        "normalise": ["trim", "casefold"],
+        "max_distance": 1,
+    })
+    assert plan.match == MatchRule(("trim", "casefold"), 1)
+    assert plan.mapping == "local_sqlite:imported_t:Email = local_sqlite:users:email [trim, casefold, max_distance 1]"
+    assert compile_match_rule({"mapping": "a = b"}) is None
+
+    _, invalid = compile_lookup_plans({"column_to_column": [
+        {"mapping": "local_sqlite:imported_t:Email = local_sqlite:users:email", "normalise": "soundex"},
+        {"mapping": "local_sqlite:imported_t:Email = local_sqlite:users:email", "max_distance": 5},
+    ]})
+    assert [entry["error"].split(" ")[0] for entry in invalid] == ["unknown", "max_distance"]
+
+
+MAPPINGS = {
+    "column_to_column": [
+        {"mapping": "local_sqlite:imported_t:'ID Number' = local_sqlite:users:id_number",
+         "normalise": ["digits"]},
+        {"mapping": "local_sqlite:imported_t:Email = local_sqlite:users:email",
+         "normalise": ["trim", "casefold"], "max_distance": 1},
+    ],
+    "type_to_column": [
+        {"mapping": "local_sqlite:imported_t:ACCOUNT = local_mysql:accounts:number",
+         "normalise": ["trim", "strip_zeros"]},
+    ],
+}
+
+RECORDS = [
+    {"ID Number": "800101 5009 087"},               # whitespace in the ID number
+    {"Email": " Jane@Example.com"},                 # case and whitespace
+    {"Email": "jane@exampel.com"},                  # a typo is too far off
+    {"Email": "bob@exmple.com"},                    # one letter missing
+    {"ACCOUNT": "0012345"},                         # leading zeros, on the MySQL stand-in
+    {"Email": "nobody@example.com"},
+]
+
+
+def _database():
+    conn = sqlite3.connect(":memory:")
+    cursor = conn.cursor()
+    cursor.execute(
+        "CREATE TABLE generated_t (id INTEGER PRIMARY KEY AUTOINCREMENT, document_type TEXT NOT NULL, "
+        "mime_type TEXT NOT NULL, input_file TEXT NOT NULL, row INTEGER NOT NULL, data TEXT NOT NULL, "
+        "lookup_type TEXT, lookup TEXT, lookup_match TEXT, lookup_value TEXT)"
+    )
+    cursor.execute("CREATE TABLE users (id_number TEXT, email TEXT)")
+    cursor.executemany("INSERT INTO users VALUES (?, ?)", [
+        ("8001015009087", "jane@example.com"),
+        ("7001015009081", "bob@example.com"),
+    ])
+    for row, record in enumerate(RECORDS, start=1):
+        cursor.execute("INSERT INTO generated_t (document_type, mime_type, input_file, row, data) "
+                       "VALUES ('payment_advice', 'text/html', 'in.csv', ?, ?)", (row, json.dumps(record)))
+    _ensure_tables_exist(cursor, *TABLES)
+    cursor.execute("SELECT id, document_type, mime_type, input_file, row, data FROM generated_t")
+    return conn, cursor.fetchall()
+
+
+def _backends(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE accounts (number TEXT)")
+    conn.executemany("INSERT INTO accounts VALUES (?)", [("12345",), ("777",)])
+    conn.commit()
+    conn.close()
+    backends = LookupBackends()
+    backends.register("local_mysql", SqliteLookupBackend("local_mysql", path))
+    return backends
+
+
+@pytest.mark.parametrize("resolve", [_resolve_records_per_record, _resolve_records_bulk, _resolve_records_async])
+def test_resolution_with_normalised_and_fuzzy_mappings(tmp_path, resolve):
+    plans, invalid = compile_lookup_plans(MAPPINGS)
+    assert invalid == []
+    conn, records = _database()
+    backends = _backends(str(tmp_path / "mysql.db"))
+
+    counts = resolve(conn.cursor(), TABLES, records, plans, "payment_advice", backends)
+
+    assert counts == (4, 2)
+    resolved = conn.execute("SELECT id, lookup_match, lookup_value FROM generated_t ORDER BY id").fetchall()
+    assert resolved == [
+        (1, "800101 5009 087:8001015009087", "8001015009087"),
+        (2, " Jane@Example.com:jane@example.com", "jane@example.com"),
+        (3, None, None),
+        (4, "bob@exmple.com:bob@example.com (distance 1)", "bob@example.com"),
+        (5, "0012345:12345", "12345"),
+        (6, None, None),
+    ]
+    # Each destination column is read once, whatever the number of records
+    assert backends.stats()["local_mysql"]["queries"] == 1
+    assert len(backends.match_index_stats()) == 3
@@ -0,0 +1,51 @@
+#!/usr/bin/env python
+"""
+Tests for compiling tenant lookup mappings into plans.
+"""
+
+import os
+import sys
+import sqlite3
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.lookup_resolver import compile_lookup_plans, prepare_lookup_indexes
+
+
+def test_mappings_are_parsed_once_in_order_and_bad_ones_reported():
+    plans, invalid = compile_lookup_plans({
+        "type_to_column": ["local_sqlite:imported_t:SA_ID_NUMBER = local_mysql:users:email"],
+        "column_to_column": [
+            "local_sqlite:imported_t:'Shareholder ID Number' = local_sqlite:users:id_number",
+            "local_sqlite:imported_t:Email = remote:users:email",
+            "local_sqlite:imported_t:Email = local_sqlite:users:email; DROP TABLE users",
+            "no equals sign",
+        ],
+    })
+
+    assert [(p.lookup_type, p.source_key, p.dest_connection, p.dest_table, p.dest_column) for p in plans] == [
+        ("column_to_column", "Shareholder ID Number", "local_sqlite", "users", "id_number"),
+        ("type_to_column", "SA_ID_NUMBER", "local_mysql", "users", "email"),
+    ]
+    assert [entry["mapping"] for entry in invalid] == [
+        "local_sqlite:imported_t:Email = remote:users:email",
+        "local_sqlite:imported_t:Email = local_sqlite:users:email; DROP TABLE users",
+        "no equals sign",
+    ]
+    assert "unsupported destination connection 'remote'" in invalid[0]["error"]
+
+
+def test_destination_columns_are_indexed_and_lookups_hit_the_index():
+    plans, _ = compile_lookup_plans({"column_to_column": ["local_sqlite:imported_t:Email = local_sqlite:users:email"]})
+    cursor = sqlite3.connect(":memory:").cursor()
+    cursor.execute("CREATE TABLE users (id INTEGER PRIMARY KEY, email TEXT)")
+
+    recommended = prepare_lookup_indexes(cursor, plans, create=False)
+    assert recommended[0]["recommendation"] == "CREATE INDEX IF NOT EXISTS idx_lookup_users_email ON users (email)"
+    assert not recommended[0]["index_hit"]
+
+    for bulk in (True, False):
+        report = prepare_lookup_indexes(cursor, plans, bulk=bulk)
+        assert report[0]["index"] == "idx_lookup_users_email"
+        assert report[0]["index_hit"], report[0]["query_plan"]
@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+"""
+Tests that resolve_lookups streams unresolved records in pages through separate read and write connections.
+"""
+
+import os
+import sys
+import json
+import sqlite3
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import core.lookup_resolver as lookup_resolver
+
+MAPPINGS = {"column_to_column": ["local_sqlite:imported_t:Email = local_sqlite:users:email"]}
+CONFIG_PATH = os.path.join(os.path.dirname(__file__), '..', 'config', 'dev.json')
+
+
+@pytest.fixture
+def session(tmp_path, monkeypatch):
+    conn = sqlite3.connect(str(tmp_path / "data.db"))
+    conn.execute(
+        "CREATE TABLE generated_t (id INTEGER PRIMARY KEY AUTOINCREMENT, document_type TEXT NOT NULL, "
+        "mime_type TEXT NOT NULL, input_file TEXT NOT NULL, row INTEGER NOT NULL, data TEXT NOT NULL, "
+        "lookup_type TEXT, lookup TEXT, lookup_match TEXT, lookup_value TEXT)"
+    )
+    conn.execute("CREATE TABLE users (email TEXT)")
+    # Every third record has a matching user
+    conn.executemany("INSERT INTO users VALUES (?)", [(f"user{row}@example.com",) for row in range(0, 25, 3)])
+    conn.executemany("INSERT INTO generated_t (document_type, mime_type, input_file, row, data) "
+                     "VALUES ('payment_advice', 'text/html', 'in.csv', ?, ?)",
+                     [(row, json.dumps({"Email": f"user{row}@example.com"})) for row in range(25)])
+    conn.commit()
+    conn.close()
+
+    with open(tmp_path / "status.json", "w") as f:
+        json.dump({"current_state": {"document_type": "payment_advice"}}, f)
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(lookup_resolver, "get_table_name", lambda session_hash: "t")
+    monkeypatch.setattr(lookup_resolver, "get_session_dir", lambda session_hash: str(tmp_path))
+    monkeypatch.setattr(lookup_resolver, "_load_tenant_mappings", lambda document_type: MAPPINGS)
+    monkeypatch.setattr(lookup_resolver, "_load_tenant_databases", lambda: {})
+    return tmp_path
+
+
+@pytest.mark.parametrize("options", [
+    {"bulk": True},
+    {"bulk": False},
+    {"concurrent": True},
+    {"bulk": True, "audit": "compact"},
+])
+def test_pages_are_resolved_and_committed(session, monkeypatch, options):
+    monkeypatch.setattr(lookup_resolver, "_load_lookups_config", lambda: {"page_size": 4})
+
+    result = lookup_resolver.resolve_lookups("session", **options)
+
+    assert (result["records_processed"], result["successful_lookups"], result["exceptions"]) == (25, 9, 16)
+    conn = sqlite3.connect(str(session / "data.db"))
+    assert conn.execute("SELECT COUNT(*) FROM generated_t WHERE lookup_type IS NULL").fetchone()[0] == 16
+    plan = conn.execute("EXPLAIN QUERY PLAN SELECT id FROM generated_t "
+                        "WHERE lookup_type IS NULL AND id > 0 ORDER BY id LIMIT 4").fetchall()
+    assert "idx_generated_t_unresolved" in plan[0][3]
+
+    # A second run only revisits the records that are still unresolved
+    again = lookup_resolver.resolve_lookups("session", **options)
+    assert (again["records_processed"], again["successful_lookups"]) == (16, 0)
+
+
+def test_unusable_connection_fails_before_any_record_is_resolved(session, monkeypatch):
+    monkeypatch.setattr(lookup_resolver, "_load_tenant_mappings", lambda document_type: {
+        "column_to_column": ["local_sqlite:imported_t:Email = local_mysql:users:email"]
+    })
+
+    with pytest.raises(ValueError, match="local_mysql"):
+        lookup_resolver.resolve_lookups("session", bulk=True)
+
+    conn = sqlite3.connect(str(session / "data.db"))
+    assert conn.execute("SELECT COUNT(*) FROM tenant_lookup_t").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM tenant_lookup_exceptions_t").fetchone()[0] == 0
+
+
+def test_tenant_connections_are_read_from_the_config(monkeypatch):
+    with open(CONFIG_PATH) as f:
+        config = json.load(f)
+    monkeypatch.setattr(lookup_resolver, "load_config", lambda: config)
+
+    connections = lookup_resolver._load_tenant_databases()
+
+    assert connections == config["tenant"]["connections"]
+    assert {"local_sqlite", "local_mysql"} <= set(connections)
+    plans, _ = lookup_resolver.compile_lookup_plans(config["tenant"]["mappings"]["payment_advice"], connections)
+    assert any(plan.dest_connection == "local_mysql" for plan in plans)
+
+    # Older configs name the section tenant.databases
+    legacy = {"tenant": {"databases": {"archive": {"driver": "sqlite", "path": "archive.db"}}}}
+    monkeypatch.setattr(lookup_resolver, "load_config", lambda: legacy)
+    assert lookup_resolver._load_tenant_databases() == legacy["tenant"]["databases"]
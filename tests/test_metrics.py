@@ -0,0 +1,34 @@
+#!/usr/bin/env python
+"""
+Tests for stage profiling helpers.
+"""
+
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.metrics import StageProfiler, percentile, summarize
+
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 95) == 95
+    assert percentile([], 95) == 0.0
+
+
+def test_profiler_summary_reports_phases_samples_and_counters():
+    profiler = StageProfiler("html")
+    for elapsed in (1.0, 2.0, 3.0):
+        profiler.add_timing("render", elapsed)
+    profiler.sample("bytes_written", 100)
+    profiler.count("collisions", 2)
+
+    summary = profiler.summary()
+
+    assert summary["phases_ms"]["render"] == summarize([1.0, 2.0, 3.0])
+    assert summary["phases_ms"]["render"]["p50"] == 2.0
+    assert summary["samples"]["bytes_written"]["max"] == 100
+    assert summary["counters"] == {"collisions": 2}
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+"""
+Tests for the adaptive PDF loop recovering chunks whose worker died.
+"""
+
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.pdf_generator import RetryQueue, resolve_pdf_settings, run_pdf_tasks_adaptive
+
+# Kills the pool worker that runs it the first time it sees doc_3, as the OOM killer would
+KILLING_CONVERTER = '''
+import os, sys, signal
+html, pdf = sys.argv[-2], sys.argv[-1]
+marker = os.path.join(os.path.dirname(os.path.dirname(pdf)), "killed")
+if "doc_3" in html and not os.path.exists(marker):
+    open(marker, "w").close()
+    os.kill(os.getppid(), signal.SIGKILL)
+    sys.exit(1)
+with open(pdf, "wb") as f:
+    f.write(b"%PDF-1.4\\n" + b"%" * 256 + b"\\n%%EOF\\n")
+'''
+
+
+def test_chunk_of_a_killed_worker_is_retried(tmp_path):
+    converter = tmp_path / "converter"
+    converter.write_text(f"#!{sys.executable}\n{KILLING_CONVERTER}")
+    converter.chmod(0o755)
+    (tmp_path / "html").mkdir()
+    (tmp_path / "pdf").mkdir()
+    names = [f"doc_{number}.html" for number in range(1, 7)]
+    for name in names:
+        (tmp_path / "html" / name).write_text("<p>doc</p>")
+
+    pdf_config = {"wkhtmltopdf": str(converter), "max_workers": 2, "memory_reserve_mb": 0,
+                  "min_pool_seconds": 0, "stall_timeout": 2}
+    settings = resolve_pdf_settings({"pdf": pdf_config})
+    tasks = [(name, str(tmp_path / "html"), str(tmp_path / "pdf"), settings) for name in names]
+    retries = RetryQueue(max_retries=1)
+
+    start = time.monotonic()
+    results = run_pdf_tasks_adaptive(tasks, settings, pdf_config, retries=retries)
+
+    assert (tmp_path / "killed").exists()
+    assert time.monotonic() - start < 30
+    assert sorted(result["html_file"] for result in results) == names
+    assert all(result["success"] for result in results)
+    assert retries.retried >= 1
+    assert len(os.listdir(tmp_path / "pdf")) == len(names)
@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+"""
+Tests for batched wkhtmltopdf conversion and its per-file fallback, using the benchmark's stub converter.
+"""
+
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.pdf_generator import generate_pdf_wkhtmltopdf_batch, resolve_pdf_settings
+from pdf_benchmark import write_stub_converter
+
+
+def _jobs(tmp_path, names):
+    (tmp_path / "html").mkdir()
+    (tmp_path / "pdf").mkdir()
+    jobs = []
+    for name in names:
+        (tmp_path / "html" / f"{name}.html").write_text(f"<p>{name}</p>")
+        jobs.append((str(tmp_path / "html" / f"{name}.html"), str(tmp_path / "pdf" / f"{name}.pdf")))
+    return jobs
+
+
+def _setup(tmp_path, monkeypatch, names):
+    log = tmp_path / "invocations.log"
+    monkeypatch.setenv("PDF_STUB_LOG", str(log))
+    settings = resolve_pdf_settings({"pdf": {"wkhtmltopdf": write_stub_converter(str(tmp_path)), "timeout": 30}})
+    return _jobs(tmp_path, names), settings, log
+
+
+def test_missing_output_is_converted_on_its_own_and_reported(tmp_path, monkeypatch):
+    jobs, settings, log = _setup(tmp_path, monkeypatch, ["a", "bad", "c"])
+    monkeypatch.setenv("PDF_STUB_FAIL", "bad")
+
+    results = generate_pdf_wkhtmltopdf_batch(jobs, settings)
+
+    assert [result["success"] for result in results] == [True, False, True]
+    assert "bad.pdf" in results[1]["error"]
+    # One batch, then only the document without a PDF on its own
+    assert log.read_text().split() == ["batch", "bad.html"]
+    assert sorted(os.listdir(tmp_path / "pdf")) == ["a.pdf", "c.pdf"]
+
+
+def test_failed_batch_converts_every_document_on_its_own(tmp_path, monkeypatch):
+    jobs, settings, log = _setup(tmp_path, monkeypatch, ["a", "b", "c"])
+    monkeypatch.setenv("PDF_STUB_BATCH_EXIT", "2")
+
+    results = generate_pdf_wkhtmltopdf_batch(jobs, settings)
+
+    assert [result["success"] for result in results] == [True, True, True]
+    assert log.read_text().split() == ["batch", "a.html", "b.html", "c.html"]
+    assert sorted(os.listdir(tmp_path / "pdf")) == ["a.pdf", "b.pdf", "c.pdf"]
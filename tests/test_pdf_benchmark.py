@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+"""
+Tests for the PDF benchmark harness, using its stub converter.
+"""
+
+import os
+import sys
+import time
+import subprocess
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from pdf_benchmark import (
+    TreeRssSampler, render_synthetic_html, write_stub_converter, run_scenario, compare_with_baseline
+)
+
+
+def test_stub_scenarios_convert_every_document(tmp_path):
+    html_dir = str(tmp_path / "html")
+    assert len(render_synthetic_html(html_dir, 5)) == 5
+    converter = write_stub_converter(str(tmp_path))
+
+    for mode, batch_size in (("sequential", None), ("batch", 2)):
+        result = run_scenario({
+            "generator": "stub", "mode": mode, "size": 4, "workers": 1, "batch_size": batch_size,
+            "converter": converter, "html_dir": html_dir, "pdf_dir": str(tmp_path / f"pdf_{mode}"),
+        })
+        assert (result["converted"], result["failed"]) == (4, 0)
+        assert result["docs_per_sec"] > 0
+        assert result["max_process_rss_mb"] > 0
+        assert len(os.listdir(tmp_path / f"pdf_{mode}")) == 4
+
+
+def test_compare_with_baseline_flags_slower_scenarios():
+    scenario = {"generator": "stub", "mode": "pool", "size": 100, "workers": 2, "batch_size": None}
+    baseline = [{**scenario, "docs_per_sec": 50.0}]
+
+    assert compare_with_baseline([{**scenario, "docs_per_sec": 46.0}], baseline, 0.10) == []
+    regressions = compare_with_baseline([{**scenario, "docs_per_sec": 40.0}], baseline, 0.10)
+    assert [(r["scenario"], r["change"]) for r in regressions] == [("stub/pool/n=100/w=2/b=1", -0.2)]
+
+
+def test_tree_rss_adds_up_child_processes():
+    psutil = pytest.importorskip("psutil")
+    own_mb = psutil.Process().memory_info().rss / (1024 * 1024)
+    child = subprocess.Popen([sys.executable, "-c", "import time; data = bytearray(50 * 1024 * 1024); time.sleep(30)"])
+    try:
+        child_process = psutil.Process(child.pid)
+        deadline = time.monotonic() + 10
+        while child_process.memory_info().rss < 50 * 1024 * 1024 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        sampler = TreeRssSampler()
+        sampler.sample()
+    finally:
+        child.kill()
+        child.wait()
+
+    assert sampler.peak_mb > own_mb + 45
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Tests for appending converted PDFs to print bundles.
+"""
+
+import os
+import sys
+import json
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.pdf_bundler import PdfBundler, BundleSettings, bundle_settings_from_config
+
+
+class FakeBundleWriter:
+    """Counts one page per 100 bytes of source PDF instead of parsing it."""
+    written = []
+
+    def __init__(self, path):
+        self.path = path
+        self.pages = 0
+        self.sources = []
+
+    def append(self, pdf_path):
+        pages = max(1, os.path.getsize(pdf_path) // 100)
+        self.pages += pages
+        self.sources.append(os.path.basename(pdf_path))
+        return pages
+
+    def close(self):
+        with open(self.path, "w") as f:
+            f.write("\n".join(self.sources))
+        FakeBundleWriter.written.append((os.path.basename(self.path), self.sources))
+
+
+def _make_pdfs(pdf_dir, sizes):
+    html_files = []
+    for index, size in enumerate(sizes, start=1):
+        with open(os.path.join(pdf_dir, f"doc_{index}.pdf"), "wb") as f:
+            f.write(b"x" * size)
+        html_files.append(f"doc_{index}.html")
+    return html_files
+
+
+def _result(html_file, success=True):
+    return {"html_file": html_file, "pdf_file": html_file.replace(".html", ".pdf") if success else None,
+            "success": success}
+
+
+def test_bundles_follow_row_order_when_results_arrive_out_of_order(tmp_path):
+    FakeBundleWriter.written = []
+    html_files = _make_pdfs(str(tmp_path), [100, 200, 100, 100, 100])
+    rows = {html_file: index for index, html_file in enumerate(html_files, start=1)}
+    bundler = PdfBundler(str(tmp_path), html_files, rows, BundleSettings(max_documents=2),
+                         writer_factory=FakeBundleWriter)
+
+    for index in (4, 2, 3, 0, 1):
+        bundler.add(_result(html_files[index]))
+    summary = bundler.finish()
+
+    assert FakeBundleWriter.written == [
+        ("bundle_0001.pdf", ["doc_1.pdf", "doc_2.pdf"]),
+        ("bundle_0002.pdf", ["doc_3.pdf", "doc_4.pdf"]),
+        ("bundle_0003.pdf", ["doc_5.pdf"]),
+    ]
+    assert summary["num_documents"] == 5
+    with open(summary["manifest"]) as f:
+        manifest = json.load(f)
+    second = manifest["documents"][1]
+    assert (second["row"], second["bundle"], second["first_page"], second["page_count"]) == (2, "bundle_0001.pdf", 2, 2)
+    assert [bundle["pages"] for bundle in manifest["bundles"]] == [3, 2, 1]
+
+
+def test_size_limit_failures_and_missing_results(tmp_path):
+    FakeBundleWriter.written = []
+    html_files = _make_pdfs(str(tmp_path), [600 * 1024, 600 * 1024, 100, 100])
+    bundler = PdfBundler(str(tmp_path), html_files, {}, BundleSettings(max_documents=10, max_mb=1),
+                         writer_factory=FakeBundleWriter)
+
+    bundler.add(_result(html_files[0]))
+    bundler.add(_result(html_files[2], success=False))
+    bundler.add(_result(html_files[1]))
+    summary = bundler.finish()
+
+    assert [sources for _, sources in FakeBundleWriter.written] == [["doc_1.pdf"], ["doc_2.pdf"]]
+    assert summary["skipped"] == ["doc_3.html", "doc_4.html"]
+
+
+def test_bundle_settings_from_config():
+    assert bundle_settings_from_config({}) is None
+    assert bundle_settings_from_config({"bundle": {"enabled": True}}, enabled=False) is None
+    settings = bundle_settings_from_config({"bundle": {"max_documents": 50, "max_mb": 20}}, enabled=True)
+    assert (settings.max_documents, settings.max_mb, settings.keep_documents) == (50, 20.0, True)
+    assert bundle_settings_from_config({"bundle": {}}, enabled=True).max_mb == 100.0
+
+
+@pytest.mark.parametrize("limits", [{"max_documents": 0}, {"max_mb": 0}, {"max_documents": -1, "max_mb": 20}])
+def test_bundle_settings_require_both_limits(limits):
+    with pytest.raises(ValueError):
+        bundle_settings_from_config({"bundle": limits}, enabled=True)
@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+"""
+Tests for checkpointing PDF results and retrying transient failures.
+"""
+
+import os
+import sys
+import sqlite3
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.pdf_generator import PdfCheckpoint, RetryQueue
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+
+def _failure(html_file, transient=True):
+    return {"html_file": html_file, "pdf_file": None, "success": False, "error": "timed out", "transient": transient}
+
+
+def test_retry_queue_backs_off_exponentially_up_to_the_limit():
+    clock = FakeClock()
+    retries = RetryQueue(max_retries=2, backoff=1.0, clock=clock)
+    task = ("a.html", "html", "pdf", None)
+
+    assert retries.offer(_failure("a.html"), task)
+    assert retries.ready() == []
+    assert retries.wait_time() == 1.0
+    clock.now += 1.0
+    assert retries.ready() == [task]
+
+    assert retries.offer(_failure("a.html"), task)
+    assert retries.wait_time() == 2.0
+    clock.now += 2.0
+    assert retries.ready() == [task]
+
+    assert not retries.offer(_failure("a.html"), task)
+    assert retries.retried == 2
+    assert retries.wait_time() is None
+
+
+def test_retry_queue_ignores_permanent_failures_and_successes():
+    retries = RetryQueue(max_retries=3, backoff=0.0)
+
+    assert not retries.offer(_failure("a.html", transient=False), ("a.html",))
+    assert not retries.offer({"html_file": "b.html", "success": True}, ("b.html",))
+    assert len(retries) == 0
+
+
+def test_checkpoint_commits_in_groups_and_on_close(tmp_path):
+    db_path = str(tmp_path / "data.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE generated_t (id INTEGER PRIMARY KEY, document_type TEXT, mime_type TEXT, "
+                 "input_file TEXT, row INTEGER, data TEXT)")
+    conn.commit()
+
+    checkpoint = PdfCheckpoint(db_path, "generated_t", "doc", "in.csv", flush_every=2, flush_seconds=3600)
+    for i in range(3):
+        checkpoint.add({"html_file": f"{i}.html", "pdf_file": f"{i}.pdf", "success": True},
+                       row_number=i + 1, html_id=10 + i)
+
+    # The first two are committed already and visible to other connections
+    assert conn.execute("SELECT COUNT(*) FROM generated_t").fetchone()[0] == 2
+
+    checkpoint.close()
+    assert conn.execute("SELECT row, json_extract(data, '$.html_id') FROM generated_t ORDER BY id").fetchall() == [
+        (1, 10), (2, 11), (3, 12)
+    ]
+    assert checkpoint.recorded == 3
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+"""
+Tests for deciding which HTML files an incremental PDF run converts.
+"""
+
+import os
+import sys
+import sqlite3
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core.pdf_generator import (
+    select_pdf_work, prune_orphan_pdfs, record_pdf_result, load_pdf_state, _html_fingerprint
+)
+
+
+def _converted(tmp_path, name, content="<p>doc</p>"):
+    html = tmp_path / "html" / f"{name}.html"
+    html.write_text(content)
+    (tmp_path / "pdf" / f"{name}.pdf").write_bytes(b"%PDF")
+    return {"status": "success", **_html_fingerprint(str(html))}
+
+
+def _dirs(tmp_path):
+    (tmp_path / "html").mkdir()
+    (tmp_path / "pdf").mkdir()
+    return str(tmp_path / "html"), str(tmp_path / "pdf")
+
+
+def test_only_new_changed_and_failed_files_are_converted(tmp_path):
+    html_dir, pdf_dir = _dirs(tmp_path)
+    state = {
+        "same.html": _converted(tmp_path, "same"),
+        "changed.html": _converted(tmp_path, "changed"),
+        "failed.html": {"status": "failed", "error": "boom"},
+        "no_pdf.html": _converted(tmp_path, "no_pdf"),
+    }
+    (tmp_path / "html" / "changed.html").write_text("<p>fixed</p>")
+    (tmp_path / "html" / "failed.html").write_text("<p>doc</p>")
+    (tmp_path / "html" / "new.html").write_text("<p>doc</p>")
+    os.remove(os.path.join(pdf_dir, "no_pdf.pdf"))
+
+    files = ["same.html", "changed.html", "failed.html", "no_pdf.html", "new.html"]
+    to_convert, up_to_date = select_pdf_work(files, html_dir, pdf_dir, state)
+
+    assert up_to_date == ["same.html"]
+    assert to_convert == ["changed.html", "failed.html", "no_pdf.html", "new.html"]
+
+
+def test_rewritten_html_with_same_content_is_up_to_date(tmp_path):
+    html_dir, pdf_dir = _dirs(tmp_path)
+    state = {"doc.html": _converted(tmp_path, "doc")}
+    html_path = os.path.join(html_dir, "doc.html")
+    os.utime(html_path, (state["doc.html"]["html_mtime"] + 60,) * 2)
+
+    assert select_pdf_work(["doc.html"], html_dir, pdf_dir, state) == ([], ["doc.html"])
+
+
+def test_prune_removes_pdfs_without_html(tmp_path):
+    _, pdf_dir = _dirs(tmp_path)
+    (tmp_path / "pdf" / "keep.pdf").write_bytes(b"%PDF")
+    (tmp_path / "pdf" / "gone.pdf").write_bytes(b"%PDF")
+
+    assert prune_orphan_pdfs(pdf_dir, ["keep.html"]) == 1
+    assert os.listdir(pdf_dir) == ["keep.pdf"]
+
+
+def test_state_keeps_latest_result_and_all_record_ids():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE generated_t (id INTEGER PRIMARY KEY, document_type TEXT, mime_type TEXT, "
+                 "input_file TEXT, row INTEGER, data TEXT)")
+    cursor = conn.cursor()
+    failed = {"html_file": "a.html", "pdf_file": "a.pdf", "success": False, "error": "boom"}
+    ok = {"html_file": "a.html", "pdf_file": "a.pdf", "success": True, "html_sha256": "abc", "html_mtime": 1.5}
+    first = record_pdf_result(cursor, "generated_t", "doc", "in.csv", failed, row_number=1)
+    second = record_pdf_result(cursor, "generated_t", "doc", "in.csv", ok, row_number=1)
+
+    state = load_pdf_state(cursor, "generated_t")
+
+    assert state["a.html"]["status"] == "success"
+    assert state["a.html"]["html_sha256"] == "abc"
+    assert state["a.html"]["ids"] == [first, second]
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+"""
+Tests for whole PDF runs of generate_pdfs, on a small session converted with the benchmark's stub converter.
+"""
+
+import os
+import sys
+import json
+import sqlite3
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import core.pdf_generator as pdf_generator
+from core.pdf_generator import PDF_RUN_MARKER, generate_pdfs
+from core.html_generator import save_html_manifest
+from pdf_benchmark import write_stub_converter
+
+SESSION_HASH = "abcdef1234567890"
+TABLE = f"generated_imported_{SESSION_HASH[:10]}"
+# Named so that their directory order differs from their row order
+DOCUMENTS = {"c_first.html": 1, "a_second.html": 2, "b_third.html": 3}
+
+
+@pytest.fixture
+def session(monkeypatch, tmp_path):
+    """A session with three rendered HTML documents, status.json and a stub converter, under tmp_path."""
+    (tmp_path / "status.json").write_text(json.dumps({
+        "active_session": True,
+        "session_hash": SESSION_HASH,
+        "current_state": {"hash": SESSION_HASH, "document_type": "payment_advice", "imported_file": "in.csv"},
+    }))
+    (tmp_path / "schemas").mkdir()
+    (tmp_path / "schemas" / "payment_advice.json").write_text(json.dumps({"type": "payment_advice"}))
+
+    session_dir = tmp_path / "output" / SESSION_HASH
+    (session_dir / "html").mkdir(parents=True)
+    (session_dir / "pdf").mkdir()
+    conn = sqlite3.connect(session_dir / "data.db")
+    conn.execute(f"CREATE TABLE imported_{SESSION_HASH[:10]} (id INTEGER PRIMARY KEY, reference TEXT)")
+    conn.execute(f"CREATE TABLE {TABLE} (id INTEGER PRIMARY KEY AUTOINCREMENT, document_type TEXT NOT NULL, "
+                 "mime_type TEXT NOT NULL, input_file TEXT NOT NULL, row INTEGER NOT NULL, data TEXT NOT NULL, "
+                 "lookup_type TEXT, lookup TEXT, lookup_match TEXT, lookup_value TEXT, "
+                 "created_at DATETIME DEFAULT CURRENT_TIMESTAMP)")
+    for html_file, row in DOCUMENTS.items():
+        conn.execute(f"INSERT INTO imported_{SESSION_HASH[:10]} (reference) VALUES (?)", (f"REF{row}",))
+        conn.execute(f"INSERT INTO {TABLE} (document_type, mime_type, input_file, row, data) "
+                     "VALUES ('payment_advice', 'text/html', 'in.csv', ?, ?)", (row, json.dumps({"file": html_file})))
+        (session_dir / "html" / html_file).write_text(f"<p>{row}</p>")
+    conn.commit()
+    conn.close()
+
+    log = tmp_path / "invocations.log"
+    monkeypatch.setenv("PDF_STUB_LOG", str(log))
+    config = {"pdf": {"wkhtmltopdf": write_stub_converter(str(tmp_path)), "scheduler": "fixed",
+                      "generate_summary_logs": False}}
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(pdf_generator, "PROJECT_ROOT_DIR", tmp_path)
+    monkeypatch.setattr(pdf_generator, "load_config", lambda: config)
+    return session_dir, log
+
+
+def test_full_run_ignores_a_stale_run_marker(session):
+    session_dir, log = session
+    pdf_dir = session_dir / "pdf"
+    # Left behind by an interrupted run: one PDF done, and one that no longer has its HTML
+    (pdf_dir / "c_first.pdf").write_bytes(b"%PDF old")
+    (pdf_dir / "gone.pdf").write_bytes(b"%PDF old")
+    (pdf_dir / PDF_RUN_MARKER).write_text("{}")
+
+    result = generate_pdfs(incremental=False)
+
+    assert not result["resumed"] and not result["incremental"]
+    assert sorted(log.read_text().split()) == sorted(DOCUMENTS)
+    assert sorted(os.listdir(pdf_dir)) == ["a_second.pdf", "b_third.pdf", "c_first.pdf"]
+    assert (pdf_dir / "c_first.pdf").read_bytes() != b"%PDF old"
+
+
+def test_interrupted_run_is_resumed_by_default(session):
+    session_dir, log = session
+    pdf_dir = session_dir / "pdf"
+    assert generate_pdfs()["num_files"] == 3
+    (pdf_dir / "a_second.pdf").unlink()
+    (pdf_dir / PDF_RUN_MARKER).write_text("{}")
+    log.unlink()
+
+    result = generate_pdfs()
+
+    assert result["resumed"] and result["up_to_date"] == 2
+    assert log.read_text().split() == ["a_second.html"]
+
+
+def _pdf_records(session_dir):
+    conn = sqlite3.connect(session_dir / "data.db")
+    try:
+        return conn.execute(
+            f"SELECT row, json_extract(data, '$.file'), json_extract(data, '$.html_id') FROM {TABLE} "
+            "WHERE mime_type = 'application/pdf' ORDER BY row, id"
+        ).fetchall()
+    finally:
+        conn.close()
+
+
+def test_documents_come_from_the_html_manifest(session):
+    session_dir, log = session
+    save_html_manifest(str(session_dir / "html"), {
+        html_file: {"row": row, "generated_id": row} for html_file, row in DOCUMENTS.items()
+    })
+    # Not in the manifest, so not part of the run
+    (session_dir / "html" / "stray.html").write_text("<p>stray</p>")
+
+    result = generate_pdfs()
+
+    assert result["num_files"] == 3
+    # Converted in source row order, not directory order
+    assert log.read_text().split() == list(DOCUMENTS)
+    assert _pdf_records(session_dir) == [(row, html_file, row) for html_file, row in DOCUMENTS.items()]
+
+
+def test_without_a_manifest_the_directory_is_listed(session, caplog):
+    session_dir, log = session
+
+    with caplog.at_level("WARNING", logger="core.pdf_generator"):
+        result = generate_pdfs()
+
+    assert "No HTML manifest" in caplog.text
+    assert result["num_files"] == 3
+    assert log.read_text().split() == sorted(DOCUMENTS)
+    # Without source rows the PDFs are recorded as row 0, with no HTML id
+    assert _pdf_records(session_dir) == [(0, html_file, None) for html_file in sorted(DOCUMENTS)]
+
+
+def test_runs_are_not_incremental_when_bundled_pdfs_are_deleted(session):
+    session_dir, log = session
+    config = pdf_generator.load_config()
+    config["pdf"]["bundle"] = {"keep_documents": False}
+    (session_dir / "pdf" / "c_first.pdf").write_bytes(b"%PDF old")
+    (session_dir / "pdf" / PDF_RUN_MARKER).write_text("{}")
+
+    result = generate_pdfs(incremental=True, bundle=True)
+
+    assert not result["incremental"] and not result["resumed"]
+    assert sorted(log.read_text().split()) == sorted(DOCUMENTS)
@@ -0,0 +1,91 @@
+#!/usr/bin/env python
+"""
+Tests for PDF pool sizing and the adaptive in-flight limit.
+"""
+
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from core import pdf_scheduler
+from core.pdf_scheduler import AdaptiveScheduler, plan_pool
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def _no_memory_limit(monkeypatch):
+    monkeypatch.setattr(pdf_scheduler, "available_memory_mb", lambda: None)
+
+
+def test_plan_is_limited_by_cores_memory_and_tasks(monkeypatch):
+    monkeypatch.setattr(pdf_scheduler, "available_cores", lambda: 8)
+    monkeypatch.setattr(pdf_scheduler, "available_memory_mb", lambda: 1112.0)
+
+    assert plan_pool("wkhtmltopdf", {}, 1000) == (4, 8, 1112.0, "memory")
+    assert plan_pool("wkhtmltopdf", {"worker_memory_mb": 50}, 1000).limited_by == "cores"
+    assert plan_pool("wkhtmltopdf", {"worker_memory_mb": 50}, 3).workers == 3
+    assert plan_pool("weasyprint", {"worker_memory_mb": 50, "weasyprint_workers": 2}, 1000).workers == 2
+    assert plan_pool("wkhtmltopdf", {"worker_memory_mb": 50, "max_workers": 12}, 1000).workers == 12
+
+
+def test_chunks_follow_latency_and_remaining_work(monkeypatch):
+    _no_memory_limit(monkeypatch)
+    scheduler = AdaptiveScheduler(4, target_chunk_seconds=0.5)
+    assert scheduler.chunk_size(100) == 1  # Nothing measured yet
+
+    scheduler.record(0.05)
+    assert scheduler.chunk_size(1000) == 10
+    assert scheduler.chunk_size(40) == 3
+    assert scheduler.chunk_size(0) == 0
+
+
+def _run_windows(scheduler, clock, throughput_for_limit, windows):
+    limits = []
+    for _ in range(windows):
+        documents = scheduler.window_size
+        clock.now += documents / throughput_for_limit(scheduler.limit)
+        for _ in range(documents):
+            scheduler.record(0.1)
+        limits.append(scheduler.limit)
+    return limits
+
+
+def test_backs_off_when_fewer_workers_are_faster(monkeypatch):
+    _no_memory_limit(monkeypatch)
+    clock = FakeClock()
+    scheduler = AdaptiveScheduler(8, clock=clock)
+
+    # Throughput peaks at 3 in flight and drops off above that
+    limits = _run_windows(scheduler, clock, lambda n: 10.0 * min(n, 3) - 2.0 * max(0, n - 3), 30)
+
+    assert limits[-1] <= 4
+    assert min(limits[-10:]) >= 2
+
+
+def test_stays_near_maximum_when_scaling_is_linear(monkeypatch):
+    _no_memory_limit(monkeypatch)
+    clock = FakeClock()
+    scheduler = AdaptiveScheduler(4, clock=clock)
+
+    limits = _run_windows(scheduler, clock, lambda n: 10.0 * n, 30)
+
+    assert min(limits[-10:]) >= 3
+    assert limits.count(4) > limits.count(3)
+
+
+def test_low_memory_reduces_in_flight_limit(monkeypatch):
+    monkeypatch.setattr(pdf_scheduler, "available_memory_mb", lambda: 100.0)
+    clock = FakeClock()
+    scheduler = AdaptiveScheduler(4, memory_reserve_mb=512, clock=clock)
+
+    _run_windows(scheduler, clock, lambda n: 10.0 * n, 3)
+
+    assert scheduler.limit == 1
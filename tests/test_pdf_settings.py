@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+"""
+Tests for resolving the PDF settings of a run.
+"""
+
+import os
+import sys
+import json
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import core.pdf_generator as pdf_generator
+from core.pdf_generator import PdfMargins, read_session_state, resolve_pdf_settings
+
+
+@pytest.fixture
+def project_root(monkeypatch, tmp_path):
+    """A project root with one schema and a status.json, instead of the real one."""
+    (tmp_path / "schemas").mkdir()
+    (tmp_path / "schemas" / "payment_advice.json").write_text(json.dumps(
+        {"type": "payment_advice", "layout": {"margins": {"top": "25mm", "left": "5mm"}}}
+    ))
+    (tmp_path / "status.json").write_text(json.dumps(
+        {"current_state": {"hash": "abc", "document_type": "payment_advice", "imported_file": "in.csv"}}
+    ))
+    monkeypatch.setattr(pdf_generator, "PROJECT_ROOT_DIR", tmp_path)
+    return tmp_path
+
+
+def test_defaults(project_root):
+    settings = resolve_pdf_settings({})
+
+    assert settings.generator == "wkhtmltopdf"
+    assert settings.wkhtmltopdf_path == "wkhtmltopdf"
+    assert (settings.page_size, settings.orientation, settings.timeout, settings.batch_size) == ("A4", "Portrait", 60, 1)
+    assert settings.margins == PdfMargins("10mm", "10mm", "10mm", "10mm")
+    assert settings.extra_options == () and settings.css_files == ()
+
+
+def test_schema_margins_override_config(project_root):
+    config = {"pdf": {"margin": "15mm", "margin_bottom": "20mm", "wkhtmltopdf_options": ["--dpi", 300]}}
+    settings = resolve_pdf_settings(config, "payment_advice")
+
+    assert settings.margins == PdfMargins(top="25mm", bottom="20mm", left="5mm", right="15mm")
+    assert settings.extra_options == ("--dpi", "300")
+    args = settings.wkhtmltopdf_args()
+    assert args[args.index("--margin-top") + 1] == "25mm"
+    # Frozen all the way down, so workers can't change each other's settings
+    with pytest.raises(AttributeError):
+        settings.margins.top = "0mm"
+
+
+def test_default_css_next_to_the_html(project_root, tmp_path):
+    html_dir = tmp_path / "html"
+    html_dir.mkdir()
+    (html_dir / "style.css").write_text("p {}")
+
+    assert resolve_pdf_settings({}, html_dir=str(html_dir)).css_files == (str(html_dir / "style.css"),)
+
+
+def test_session_state_comes_from_the_project_status_file(project_root):
+    assert read_session_state() == ("payment_advice", "in.csv")
+    assert read_session_state("abc") == ("payment_advice", "in.csv")
+    assert read_session_state("other") == (None, "")
+
+    (project_root / "status.json").unlink()
+    assert read_session_state() == (None, "")
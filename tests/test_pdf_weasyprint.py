@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+"""
+Tests for the warm WeasyPrint worker pool, using a stub renderer.
+"""
+
+import os
+import sys
+import multiprocessing
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import core.pdf_generator as pdf_generator
+from core.pdf_generator import create_pdf_pool, generate_pdf_weasyprint, process_pdf_task, resolve_pdf_settings
+
+
+class StubRenderer:
+    """Stands in for WeasyPrintRenderer; the PDF records which process and warm-up made it."""
+
+    created = 0
+    fail_next = 0
+
+    def __init__(self, css_files):
+        if StubRenderer.fail_next:
+            StubRenderer.fail_next -= 1
+            raise OSError("cannot load library 'pango'")
+        StubRenderer.created += 1
+        self.css_files = css_files
+        self.stylesheets = []
+        self.font_config = None
+        self.warm_up = StubRenderer.created
+        renderer = self
+
+        class HTML:
+            def __init__(self, filename, base_url):
+                pass
+
+            def write_pdf(self, target, stylesheets=None, font_config=None):
+                with open(target, "w") as f:
+                    f.write(f"{os.getpid()}:{renderer.warm_up}".ljust(200))
+
+        self.HTML = HTML
+
+
+@pytest.fixture
+def stub_renderer(monkeypatch):
+    monkeypatch.setattr(pdf_generator, "WeasyPrintRenderer", StubRenderer)
+    monkeypatch.setattr(pdf_generator, "_weasyprint_renderer", None)
+    monkeypatch.setattr(pdf_generator, "_weasyprint_error", None)
+    monkeypatch.setattr(StubRenderer, "created", 0)
+    monkeypatch.setattr(StubRenderer, "fail_next", 0)
+
+
+def _html_files(tmp_path, count):
+    (tmp_path / "html").mkdir()
+    (tmp_path / "pdf").mkdir()
+    names = [f"doc{number}.html" for number in range(count)]
+    for name in names:
+        (tmp_path / "html" / name).write_text("<p>doc</p>")
+    return str(tmp_path / "html"), str(tmp_path / "pdf"), names
+
+
+def test_failed_warm_up_is_retried_by_the_next_document(tmp_path, stub_renderer):
+    html_dir, pdf_dir, _ = _html_files(tmp_path, 2)
+    settings = resolve_pdf_settings({"pdf": {"generator": "weasyprint"}})
+    StubRenderer.fail_next = 1
+
+    pdf_generator._init_weasyprint_worker(settings)
+    assert pdf_generator._weasyprint_renderer is None
+
+    result = generate_pdf_weasyprint(os.path.join(html_dir, "doc0.html"), os.path.join(pdf_dir, "doc0.pdf"), settings)
+    assert result == {"success": True}
+    assert pdf_generator._weasyprint_error is None
+    # The warm renderer is reused for the next document
+    generate_pdf_weasyprint(os.path.join(html_dir, "doc1.html"), os.path.join(pdf_dir, "doc1.pdf"), settings)
+    assert StubRenderer.created == 1
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="the stub reaches workers by forking")
+def test_pool_warms_each_worker_once_and_recycles_it(tmp_path, stub_renderer):
+    html_dir, pdf_dir, names = _html_files(tmp_path, 6)
+    pdf_config = {"generator": "weasyprint", "weasyprint_workers": 1, "multiprocessing_workers": 4,
+                  "weasyprint_max_tasks_per_worker": 2}
+    settings = resolve_pdf_settings({"pdf": pdf_config})
+
+    pool = create_pdf_pool(settings, pdf_config)
+    try:
+        assert pool._processes == 1
+        results = [result for task_results in pool.imap(process_pdf_task,
+                                                        [(name, html_dir, pdf_dir, settings) for name in names],
+                                                        chunksize=1)
+                   for result in task_results]
+    finally:
+        pool.close()
+        pool.join()
+
+    assert all(result["success"] for result in results)
+    stamps = [(tmp_path / "pdf" / name.replace(".html", ".pdf")).read_text().split() for name in names]
+    # One warm-up per worker, and a fresh worker every two documents
+    assert all(stamp[0].endswith(":1") for stamp in stamps)
+    assert len({stamp[0] for stamp in stamps}) == 3
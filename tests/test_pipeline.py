@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+"""
+Tests for the fused HTML→PDF pipeline, run in-process on a small session.
+"""
+
+import os
+import sys
+import json
+import sqlite3
+
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import core.html_generator as html_generator
+import core.pdf_generator as pdf_generator
+import core.pipeline as pipeline
+import core.template_service as template_service
+from pdf_benchmark import write_stub_converter
+
+SESSION_HASH = "abcdef1234567890"
+ROWS = 5
+
+
+@pytest.fixture
+def session(monkeypatch, tmp_path):
+    """A session with five imported rows, status.json and a mapping, under tmp_path."""
+    status = {
+        "active_session": True,
+        "session_hash": SESSION_HASH,
+        "current_state": {"hash": SESSION_HASH, "document_type": "payment_advice", "imported_file": "in.csv"},
+    }
+    (tmp_path / "status.json").write_text(json.dumps(status))
+    (tmp_path / "schemas").mkdir()
+    (tmp_path / "schemas" / "payment_advice.json").write_text(json.dumps({"type": "payment_advice"}))
+
+    session_dir = tmp_path / "output" / SESSION_HASH
+    (session_dir / "mappings").mkdir(parents=True)
+    (session_dir / "mappings" / f"{SESSION_HASH}_mapping.json").write_text(json.dumps(
+        {"Reference": {"type": "PAYMENT_REFERENCE"}}
+    ))
+    conn = sqlite3.connect(session_dir / "data.db")
+    conn.execute(f'CREATE TABLE imported_{SESSION_HASH[:10]} (id INTEGER PRIMARY KEY, "Reference" TEXT)')
+    conn.executemany(f"INSERT INTO imported_{SESSION_HASH[:10]} (\"Reference\") VALUES (?)",
+                     [(f"REF{row}",) for row in range(1, ROWS + 1)])
+    conn.commit()
+    conn.close()
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(html_generator, "PROJECT_ROOT_DIR", tmp_path)
+    monkeypatch.setattr(pdf_generator, "PROJECT_ROOT_DIR", tmp_path)
+    monkeypatch.setattr(template_service, "_environments", {})
+    monkeypatch.setattr(template_service, "_bytecode_cache", None)
+    monkeypatch.setattr(template_service, "load_config",
+                        lambda: {"templates": {"bytecode_cache_dir": str(tmp_path / "jinja_cache")}})
+    return session_dir
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_pipeline_writes_html_pdf_and_checkpoint_rows(monkeypatch, tmp_path, caplog, session, max_workers):
+    converter = write_stub_converter(str(tmp_path))
+    config = {"pdf": {"wkhtmltopdf": converter, "max_workers": max_workers,
+                      "memory_reserve_mb": 0, "generate_summary_logs": False}}
+    monkeypatch.setattr(pipeline, "load_config", lambda: config)
+
+    with caplog.at_level("INFO", logger="core.pipeline"):
+        result = pipeline.generate_html_and_pdfs()
+    # The adaptive plan decides on the pool, even for a run below multiprocessing_threshold
+    assert ("pool not used" in caplog.text) == (max_workers == 1)
+
+    names = [f"payment_advice_{row:04d}" for row in range(1, ROWS + 1)]
+    assert sorted(result["html"]["html_files"]) == [f"{name}.html" for name in names]
+    assert sorted(result["pdf"]["pdf_files"]) == [f"{name}.pdf" for name in names]
+    assert result["pdf"]["errors"] == []
+    assert sorted(os.listdir(session / "pdf")) == [f"{name}.pdf" for name in names]
+
+    conn = sqlite3.connect(session / "data.db")
+    table = f"generated_imported_{SESSION_HASH[:10]}"
+    html_ids = dict(conn.execute(f"SELECT row, id FROM {table} WHERE mime_type = 'text/html'").fetchall())
+    pdf_rows = conn.execute(
+        f"SELECT row, json_extract(data, '$.converted_to'), json_extract(data, '$.html_id') FROM {table} "
+        "WHERE mime_type = 'application/pdf' ORDER BY row"
+    ).fetchall()
+    assert pdf_rows == [(row, f"{name}.pdf", html_ids[row]) for row, name in enumerate(names, start=1)]
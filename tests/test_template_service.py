@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+"""
+Tests for the shared template environments, streamed renders and image inlining.
+"""
+
+import os
+import sys
+
+import jinja2
+import pytest
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import core.template_service as template_service
+from core.template_service import AssetInliningLoader, get_template_env, render_to_file
+
+
+@pytest.fixture
+def fresh_environments(monkeypatch, tmp_path):
+    """Empty environment registry with the bytecode cache configured under tmp_path."""
+    cache_dir = tmp_path / "jinja_cache"
+    monkeypatch.setattr(template_service, "_environments", {})
+    monkeypatch.setattr(template_service, "_bytecode_cache", None)
+    monkeypatch.setattr(template_service, "load_config",
+                        lambda: {"templates": {"bytecode_cache_dir": str(cache_dir)}})
+    return cache_dir
+
+
+def test_environment_is_shared_and_bytecode_cached(fresh_environments):
+    env = get_template_env("reports")
+
+    assert get_template_env("reports") is env
+    assert env.auto_reload is True
+    assert env.bytecode_cache.directory == str(fresh_environments)
+    # A second family shares the bytecode cache
+    assert get_template_env("logs").bytecode_cache is env.bytecode_cache
+
+    env.get_template("base.jinja2")
+    assert os.listdir(fresh_environments)
+    with pytest.raises(ValueError):
+        get_template_env("unknown")
+
+
+def test_render_to_file_matches_render(tmp_path):
+    env = jinja2.Environment()
+    template = env.from_string("{% for row in rows %}<p>{{ row }} – ü</p>\n{% endfor %}")
+    rows = [f"row {number}" for number in range(2000)]
+    path = tmp_path / "out.html"
+
+    stats = {}
+    size = render_to_file(template, str(path), stats, rows=rows)
+
+    expected = template.render(rows=rows)
+    assert path.read_text(encoding="utf-8") == expected
+    assert size == len(expected.encode("utf-8")) == path.stat().st_size
+    assert set(stats) == {"write_ms", "total_ms"}
+    assert render_to_file(template, str(tmp_path / "plain.html"), rows=rows) == size
+
+
+def test_render_to_file_removes_partial_file(tmp_path):
+    env = jinja2.Environment(undefined=jinja2.StrictUndefined)
+    template = env.from_string("{% for row in rows %}{{ row }}{% endfor %}{{ missing }}")
+    path = tmp_path / "out.html"
+
+    with pytest.raises(jinja2.UndefinedError):
+        render_to_file(template, str(path), rows=range(100000))
+    assert not path.exists()
+
+
+def test_images_are_inlined_and_changes_reload(tmp_path):
+    (tmp_path / "doc.html").write_text('<img src="logo.png"><img src=\'logo.png\'>')
+    image = tmp_path / "logo.png"
+    image.write_bytes(b"first")
+    env = jinja2.Environment(loader=AssetInliningLoader(str(tmp_path)), auto_reload=True)
+
+    source, _, uptodate = env.loader.get_source(env, "doc.html")
+    assert source == '<img src="data:image/png;base64,Zmlyc3Q="><img src="data:image/png;base64,Zmlyc3Q=">'
+    assert uptodate()
+
+    first = env.get_template("doc.html")
+    assert env.get_template("doc.html") is first
+
+    image.write_bytes(b"second")
+    mtime = os.path.getmtime(image) + 10
+    os.utime(image, (mtime, mtime))
+    assert not uptodate()
+    assert "c2Vjb25k" in env.get_template("doc.html").render()